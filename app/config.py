@@ -2,6 +2,8 @@
 Setup Configuration for Application
 """
 
+from typing import Dict
+
 from pydantic_settings import BaseSettings
 
 
@@ -12,6 +14,11 @@ class Settings(BaseSettings):
     DB_USER: str
     DB_PASSWORD: str
     DB_NAME: str
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_PRE_PING: bool = True
+    DB_POOL_RECYCLE: int = 1800
+    DB_ECHO: bool = False
     PROJECT_ID: str
     LOCATION: str
     JOB_REQUEST_SUBSCRIPTION_ID: str
@@ -23,16 +30,85 @@ class Settings(BaseSettings):
     ALLOWED_ROLES: str
     PROJECT_NAME: str
     MAX_WORKERS: int
+    # Start the Pub/Sub consumers inside the API process; set false when they run via `python -m app.worker`
+    RUN_CONSUMERS: bool = True
+    # Flow control of each streaming pull; max messages 0 means twice the subscription's max in-flight callbacks
+    SUBSCRIBER_MAX_MESSAGES: int = 0
+    SUBSCRIBER_MAX_BYTES: int = 100 * 1024 * 1024
+    SUBSCRIBER_MAX_LEASE_DURATION_SECONDS: int = 3600
+    SUBSCRIBER_MAX_LEASE_EXTENSION_SECONDS: int = 0
+    # Per-subscription overrides as JSON, e.g. {"job_request": {"max_messages": 20}}
+    SUBSCRIBER_FLOW_CONTROL: Dict[str, Dict[str, int]] = {}
+    # Admission control of each subscription from downstream capacity; see app/consumers/backpressure.py
+    BACKPRESSURE_INTERVAL_SECONDS: float = 1.0
+    # How often app.worker logs its subscriptions' stats; 0 turns it off
+    WORKER_STATS_INTERVAL_SECONDS: float = 60.0
+    BACKPRESSURE_KEY_SERVER_LATENCY_MS: float = 2000.0
+    BLOCKING_IO_WORKERS: int = 16
     ROUTE_PREFIX: str
     API_VERSION: str
     SECRET_ID: str
     KEY_SERVER_URL: str
+    KEY_SERVER_CONNECT_TIMEOUT: float = 3.0
+    KEY_SERVER_READ_TIMEOUT: float = 10.0
+    KEY_SERVER_MAX_RETRIES: int = 3
+    KEY_SERVER_BACKOFF_BASE: float = 0.2
+    KEY_SERVER_MAX_CONCURRENCY: int = 10
+    KEY_SERVER_MAX_CONNECTIONS: int = 20
+    KEY_CACHE_TTL_SECONDS: int = 300
+    KEY_CACHE_MAX_SIZE: int = 1024
     SECRET_VERSION: int
     ENV: str
     CLOUD_STORAGE_TRIGGER_SUBSCRIPTION: str
     PROJECT_NAME_TOFFEE: str
     OUTPUT_BUCKET_TOFFEE: str
     MEDIA_CDN_BASE: str
+    SERVICE_ACCOUNT_FILE: str = "./key.json"
+    JOB_CONFIG_CACHE_SIZE: int = 64
+    STORAGE_EXISTS_CACHE_TTL_SECONDS: int = 300
+    COMPLETION_BATCH_MAX_SIZE: int = 100
+    COMPLETION_BATCH_MAX_WAIT_SECONDS: float = 0.2
+    DURATION_LIST_PAGE_SIZE: int = 100
+    DURATION_LOOKUP_CONCURRENCY: int = 4
+    DISPATCH_DEDUP_CACHE_SIZE: int = 10000
+    # A crashed worker's claim can be taken over after the lease; dispatched claims are kept for the retention
+    DISPATCH_CLAIM_LEASE_SECONDS: float = 900.0
+    DISPATCH_CLAIM_RETENTION_HOURS: int = 168
+    PUBLISH_BATCH_MAX_MESSAGES: int = 100
+    PUBLISH_BATCH_MAX_BYTES: int = 1000000
+    PUBLISH_BATCH_MAX_LATENCY_SECONDS: float = 0.05
+    OUTBOX_BATCH_SIZE: int = 500
+    OUTBOX_POLL_INTERVAL_SECONDS: float = 0.5
+    OUTBOX_LEASE_SECONDS: float = 60.0
+    OUTBOX_RETENTION_HOURS: int = 72
+    RETRY_MAX_ATTEMPTS: int = 5
+    RETRY_BASE_DELAY_SECONDS: float = 30.0
+    RETRY_MIN_DELAY_SECONDS: float = 5.0
+    RETRY_MAX_DELAY_SECONDS: float = 1800.0
+    RETRY_BATCH_SIZE: int = 20
+    RETRY_MAX_CONCURRENCY: int = 4
+    RETRY_POLL_INTERVAL_SECONDS: float = 5.0
+    RETRY_LEASE_SECONDS: float = 600.0
+    DISPATCH_MAX_CONCURRENCY: int = 10
+    DISPATCH_INTERACTIVE_WEIGHT: int = 8
+    DISPATCH_INTERACTIVE_MAX_CONCURRENCY: int = 8
+    DISPATCH_STANDARD_WEIGHT: int = 3
+    DISPATCH_STANDARD_MAX_CONCURRENCY: int = 6
+    DISPATCH_BULK_WEIGHT: int = 1
+    DISPATCH_BULK_MAX_CONCURRENCY: int = 4
+    # create_job pacing and concurrency window, per Transcoder location
+    TRANSCODER_CREATE_JOB_QPS: float = 5.0
+    TRANSCODER_CREATE_JOB_BURST: int = 10
+    DISPATCH_WINDOW_MIN: int = 1
+    DISPATCH_WINDOW_DECREASE_FACTOR: float = 0.5
+    DISPATCH_THROTTLE_RETRIES: int = 3
+    DISPATCH_THROTTLE_BACKOFF_SECONDS: float = 2.0
+    # Comma-separated Transcoder locations to spread jobs over; empty means LOCATION only
+    TRANSCODER_LOCATIONS: str = ""
+    # Data residency: "bucket=loc1|loc2,other-bucket=loc3"; unlisted buckets may use any location
+    BUCKET_ALLOWED_LOCATIONS: str = ""
+    TRANSCODER_LOCATION_MAX_IN_FLIGHT: int = 0
+    LOCATION_LOAD_REFRESH_SECONDS: float = 5.0
 
     class Config:
         env_file = ".env"
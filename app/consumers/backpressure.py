@@ -0,0 +1,94 @@
+"""
+Admission control of consumer runtimes from downstream capacity
+"""
+import asyncio
+from typing import Callable, Optional, Sequence
+
+from app.config import settings
+from app.consumers.runtime import ConsumerRuntime
+from app.custom_logger import logger
+from app.database import async_pool_usage
+from app.dispatch_scheduler import dispatch_scheduler
+from app.key_server import key_server_client
+
+# Returns why a downstream dependency has no room for more work, or None if it has
+CapacityCheck = Callable[[], Optional[str]]
+
+
+def db_pool_check() -> Optional[str]:
+    """Every connection of the runtime loop's pool is checked out; must run on that loop."""
+    usage = async_pool_usage()
+    if usage is not None and usage[0] >= usage[1]:
+        return f"db pool exhausted ({usage[0]}/{usage[1]})"
+    return None
+
+
+def key_server_check() -> Optional[str]:
+    latency = key_server_client.recent_latency_ms()
+    if latency is not None and latency > settings.BACKPRESSURE_KEY_SERVER_LATENCY_MS:
+        return f"key server p95 {latency:.0f}ms"
+    return None
+
+
+def transcoder_check(lane: str) -> CapacityCheck:
+    """Dispatch capacity as seen by one priority lane, so a bulk backlog does not throttle interactive work."""
+
+    def check() -> Optional[str]:
+        headroom = dispatch_scheduler.lane_headroom(lane)
+        if headroom <= 0:
+            return f"transcoder dispatch saturated for {lane} (headroom {headroom})"
+        return None
+
+    return check
+
+
+def dispatch_checks(lane: str) -> Sequence[CapacityCheck]:
+    """Checks of a runtime that dispatches Transcoder jobs, mostly through ``lane``."""
+    return db_pool_check, key_server_check, transcoder_check(lane)
+
+
+DB_CHECKS = (db_pool_check,)
+
+
+class AdmissionController:
+    """Moves a runtime's concurrency limit with downstream capacity (AIMD).
+
+    Every ``interval`` seconds the checks are run on the runtime loop. If any
+    reports pressure, the limit is halved; if none does and the runtime is
+    using its whole limit, the limit grows by one, up to ``max_in_flight``.
+    Callback threads held back by a lower limit keep their messages leased,
+    and with max_messages tied to ``max_in_flight`` the subscriber then stops
+    pulling, instead of leasing work that would expire before it runs.
+    """
+
+    def __init__(self, runtime: ConsumerRuntime, checks: Sequence[CapacityCheck], interval: float = 1.0):
+        self.runtime = runtime
+        self.checks = list(checks)
+        self.interval = interval
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.adjust()
+            except Exception as e:
+                logger.error(f"Admission control of '{self.runtime.name}' failed: {e}")
+
+    def adjust(self) -> None:
+        pressure = [reason for reason in (check() for check in self.checks) if reason]
+        limit = self.runtime.limit
+        if pressure:
+            self.runtime.set_limit(limit // 2)
+            if not self.runtime.pressure or self.runtime.limit != limit:
+                logger.warning(f"Consumer '{self.runtime.name}' limit {limit} -> {self.runtime.limit}: "
+                               f"{', '.join(pressure)}")
+        elif self.runtime.in_flight >= limit:
+            self.runtime.set_limit(limit + 1)
+        self.runtime.pressure = pressure
+
+
+def add_admission_control(runtime: ConsumerRuntime, checks: Sequence[CapacityCheck]) -> AdmissionController:
+    """Runs an AdmissionController on ``runtime``'s loop for as long as the runtime runs."""
+    controller = AdmissionController(runtime, checks, interval=settings.BACKPRESSURE_INTERVAL_SECONDS)
+    runtime.add_background_task(controller.run)
+    return controller
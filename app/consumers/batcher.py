@@ -0,0 +1,103 @@
+"""
+Size / latency bounded micro-batching for consumer callbacks
+"""
+import asyncio
+import threading
+import time
+from typing import Awaitable, Callable, Generic, List, Optional, Set, Tuple, TypeVar
+
+from app.custom_logger import logger
+
+T = TypeVar("T")
+
+
+class MicroBatcher(Generic[T]):
+    """Collects items from concurrent callbacks and flushes them together.
+
+    A batch is flushed once it holds ``max_size`` items or ``max_wait``
+    seconds after its first item arrived, whichever comes first. ``submit``
+    returns once the batch containing the item has been flushed and re-raises
+    the flush error otherwise, so callers can ack / nack their message only
+    after the batch was applied. A batcher belongs to the loop it is used on.
+    """
+
+    def __init__(self, name: str, flush: Callable[[List[T]], Awaitable[None]], max_size: int = 100,
+                 max_wait: float = 0.2):
+        self.name = name
+        self.max_size = max_size
+        self.max_wait = max_wait
+        self._flush = flush
+        self._pending: List[Tuple[T, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flushing: Set[asyncio.Task] = set()
+
+        self._metrics_lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+        self._failed_batches = 0
+        self._flush_seconds = 0.0
+
+    async def submit(self, item: T) -> None:
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        self._pending.append((item, waiter))
+        if len(self._pending) >= self.max_size:
+            self._start_flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._start_flush)
+        await waiter
+
+    def _start_flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        task = asyncio.ensure_future(self._run(batch))
+        self._flushing.add(task)
+        task.add_done_callback(self._flushing.discard)
+
+    async def _run(self, batch: List[Tuple[T, asyncio.Future]]) -> None:
+        start = time.perf_counter()
+        try:
+            await self._flush([item for item, _ in batch])
+        except Exception as e:
+            logger.error(f"Batch '{self.name}' of {len(batch)} items failed: {e}")
+            error = e
+        else:
+            error = None
+        elapsed = time.perf_counter() - start
+
+        with self._metrics_lock:
+            self._batches += 1
+            self._items += len(batch)
+            self._flush_seconds += elapsed
+            if error is not None:
+                self._failed_batches += 1
+
+        for _, waiter in batch:
+            if waiter.done():
+                continue
+            if error is None:
+                waiter.set_result(None)
+            else:
+                waiter.set_exception(error)
+
+    async def close(self) -> None:
+        """Flushes whatever is still pending and waits for running flushes."""
+        self._start_flush()
+        if self._flushing:
+            await asyncio.gather(*self._flushing, return_exceptions=True)
+
+    def stats(self) -> dict:
+        with self._metrics_lock:
+            return {
+                "batches": self._batches,
+                "items": self._items,
+                "failed_batches": self._failed_batches,
+                "avg_batch_size": self._items / self._batches if self._batches else 0.0,
+                "avg_flush_ms": self._flush_seconds * 1000 / self._batches if self._batches else 0.0,
+                "max_size": self.max_size,
+                "max_wait_seconds": self.max_wait,
+            }
@@ -2,124 +2,148 @@ import asyncio
 import json
 # import logging
 import threading
-from concurrent.futures import ThreadPoolExecutor
+from collections import defaultdict
+from typing import Dict, List, Optional
 
-from google.cloud import pubsub_v1
 from google.cloud.pubsub_v1.subscriber.message import Message
-from google.cloud.video.transcoder_v1.services.transcoder_service import (
-    TranscoderServiceClient,
-)
 
 from app.exceptions import CustomException
 from app.config import settings
-from app.consumers.job_request import data_to_json
-from app.crud import async_update_job_state, async_get_job
+from app.consumers.notifications import completion_outbox_entry
+from app.crud import (
+    JobStateUpdate,
+    async_record_transcode_results,
+    async_get_names_missing_duration,
+    async_update_job_states,
+)
+from app.gcp_clients import GCPClients
 from app.gcp_utils import delete_secret
+from app.consumers.batcher import MicroBatcher
+from app.consumers.backpressure import DB_CHECKS, add_admission_control
+from app.consumers.runtime import ConsumerRuntime, run_subscription
 from app.custom_logger import logger
-from app.utils import remove_bucket_name
-
-
-async def consume_message_on_job_completion(t_client: TranscoderServiceClient, subscriber, subscription_path,
-                                            credentials):
+from app.loop_local import close_loop_resources
+from app.outbox import wake_outbox_drainer
+from app.utils import get_video_duration, list_video_durations, payload_duration_seconds, run_blocking
+
+
+# Completion notifications of the running consumer, for /metrics
+completion_batches: Optional[MicroBatcher] = None
+
+
+async def fetch_video_duration(clients: GCPClients, name: str) -> Optional[float]:
+    try:
+        return await run_blocking(get_video_duration, clients.transcoder, name)
+    except Exception as e:
+        # The state change matters more than the duration; leave it empty
+        logger.error(f"Could not read the duration of {name}: {e}")
+        return None
+
+
+async def list_durations(clients: GCPClients, parent: str, names: List[str]) -> Dict[str, Optional[float]]:
+    try:
+        return await run_blocking(list_video_durations, clients.transcoder, parent, names,
+                                  settings.DURATION_LIST_PAGE_SIZE)
+    except Exception as e:
+        logger.error(f"Could not list the jobs of {parent}: {e}")
+        return {}
+
+
+async def lookup_missing_durations(clients: GCPClients, completions: List[JobStateUpdate]) -> List[JobStateUpdate]:
+    """Fills in durations that neither dispatch nor the notification provided, before any transaction opens.
+
+    Durations come first from the notification, then from the Transcoder
+    response stored at dispatch. The jobs still missing one are looked up with
+    one ListJobs call per location over its newest jobs, which holds the jobs
+    that just completed. Only jobs older than that page fall back to a GetJob
+    each, at most DURATION_LOOKUP_CONCURRENCY at a time.
+    """
+    candidates = [name for name, _, duration in completions if duration is None]
+    missing = await async_get_names_missing_duration(candidates)
+    if not missing:
+        return completions
+
+    by_parent: Dict[str, List[str]] = defaultdict(list)
+    for name in missing:
+        by_parent[name.rsplit("/jobs/", 1)[0]].append(name)
+    durations: Dict[str, Optional[float]] = {}
+    for listed in await asyncio.gather(*(list_durations(clients, parent, names)
+                                         for parent, names in by_parent.items())):
+        durations.update(listed)
+
+    unlisted = [name for name in missing if name not in durations]
+    if unlisted:
+        lookups = asyncio.Semaphore(settings.DURATION_LOOKUP_CONCURRENCY)
+
+        async def fetch(name: str) -> Optional[float]:
+            async with lookups:
+                return await fetch_video_duration(clients, name)
+
+        durations.update(zip(unlisted, await asyncio.gather(*(fetch(name) for name in unlisted))))
+    return [(name, state, duration if duration is not None else durations.get(name))
+            for name, state, duration in completions]
+
+
+async def apply_job_completions(clients: GCPClients, completions: List[JobStateUpdate]) -> None:
+    """Writes one batch of (job name, Transcoder state, duration) completions with their outbox notifications."""
+    completions = await lookup_missing_durations(clients, completions)
+    # State change and notification commit together; the outbox drainer publishes them
+    jobs = await async_update_job_states(completions, notify=completion_outbox_entry)
+    wake_outbox_drainer()
+    try:
+        await async_record_transcode_results([job.fully_qualified_name for job in jobs])
+    except Exception as e:
+        # Only costs a future reuse; the completion itself is committed
+        logger.error(f"Recording transcode results failed: {e}")
+
+    for job in jobs:
+        logger.info(f"Updated job: {job.job_id}, state: {job.state}, status: {job.status}, "
+                    f"timestamp: {job.updated_at}")
+        # delete_secret(job.version)
+
+
+async def consume_message_on_job_completion(clients: GCPClients, subscriber, subscription_path,
+                                            flow_overrides: Optional[dict] = None):
     # logging.basicConfig(level=logging.INFO, filename="py_log.log", filemode="w")
+    global completion_batches
+
+    batcher = MicroBatcher("job_completion", lambda batch: apply_job_completions(clients, batch),
+                           max_size=settings.COMPLETION_BATCH_MAX_SIZE,
+                           max_wait=settings.COMPLETION_BATCH_MAX_WAIT_SECONDS)
+    completion_batches = batcher
 
     async def callback(message: Message) -> None:
-        # print(f"Received {message}.")
         # the message data from Pub/Sub is received in a binary format (as a byte string).
-        # When you receive this binary data in Python, it's represented as a byte string (bytes type).
         # To convert this byte string into a human-readable string (a str type in Python), you need to decode it.
+        if message is None:
+            logger.warning("Received None message. Skipping.")
+            return
         try:
-            if message is None:
-                logger.warning("Received None message. Skipping.")
-                return
-
             message_data = json.loads(message.data.decode('utf-8'))
 
             logger.info(f"{message_data}")
-            # Access and print each element
             if 'job' in message_data:
                 job_data = message_data['job']
                 logger.info(f"{job_data['name']} state is {job_data['state']}")
-
-                await async_update_job_state(t_client, job_data['name'], job_data["state"])
-
-                job = await async_get_job(job_data['name'])
-
-                if job is not None:
-                    logger.info(f"timestamp: {job.updated_at}")
-                    # delete_secret(job.version)
-                    data = {
-                        "success": True,
-                        "message": "Job Final Status",
-                        "data": [
-                            {
-                                "fully_qualified_name": job.fully_qualified_name,
-                                "job_id": job.job_id,
-                                "url": job.input_uri,
-                                "description": job.description,
-                                "state": job.state,
-                                "status": job.status,
-                                "custom_name": job.custom_name,
-                                "output_location": job.output_uri,
-                                "job_start_time": job.created_at,
-                                "job_end_time": job.updated_at,
-                                "duration": job.duration_in_sec,
-                                "dash_media_cdn": settings.MEDIA_CDN_BASE + remove_bucket_name(
-                                    job.output_uri) + "manifest_dash.mpd",
-                                "hls_media_cdn": settings.MEDIA_CDN_BASE + remove_bucket_name(
-                                    job.output_uri) + "manifest_hls.m3u8"
-                            }
-                        ]
-                    }
-
-                    logger.info(data)
-
-                    # Convert data to JSON string
-                    message_data = data_to_json(data)
-
-                    # Initialize a PublisherClient
-                    publisher = pubsub_v1.PublisherClient(credentials=credentials)
-
-                    # publisher = pubsub_v1.PublisherClient()
-
-                    # project_id = 'your-project-id'
-                    # topic_id = 'your-topic-id'
-                    # topic_path = publisher.topic_path(project_id, topic_id)
-
-                    # Publish the message
-                    future = publisher.publish(settings.JOB_START_TOPIC_PATH, message_data.encode('utf-8'))
-                    print(f"Published message ID: {future.result()}")
-
-                else:
-                    print("Job not found or failed to update")
-                    raise CustomException(code=404, status_code=20404, detail="Job not found or failed to update")
-
+                # Returns once the batch holding this completion is committed
+                await batcher.submit((job_data['name'], job_data["state"], payload_duration_seconds(job_data)))
         except Exception as e:
             print(e)
             logger.error(f"{e}")
+            # Not committed: let Pub/Sub redeliver it
+            message.nack()
             raise CustomException(code=500, status_code=20500, detail=str(e))
-        finally:
-            if message is not None:
-                message.ack()
-
-    def sync_wrapper(message):
-        asyncio.run(callback(message))
-
-    streaming_pull_future = subscriber.subscribe(subscription_path, callback=sync_wrapper)
-
-    print(f"Listening for messages on {subscription_path}")
+        message.ack()
 
-    # Wrap subscriber in a 'with' block to automatically call close() when done.
-    async with subscriber:
-        try:
-            # When `timeout` is not set, result() will block indefinitely,
-            # unless an exception is encountered first.
-            # streaming_pull_future.result()
-            executor = ThreadPoolExecutor(max_workers=settings.MAX_WORKERS)
-            await asyncio.get_running_loop().run_in_executor(executor, streaming_pull_future.result)
-        except TimeoutError:
-            streaming_pull_future.cancel()  # Trigger the shutdown.
-            await streaming_pull_future.result()  # Block until the shutdown is complete.
+    # One long-lived loop serves every message of this subscription. Every
+    # message waits for its batch, so the runtime must admit a full batch.
+    runtime = ConsumerRuntime("completion",
+                              max_in_flight=max(settings.MAX_WORKERS, settings.COMPLETION_BATCH_MAX_SIZE))
+    runtime.add_shutdown_hook(batcher.close)
+    runtime.add_shutdown_hook(close_loop_resources)
+    # Fewer callbacks run while the DB pool is exhausted
+    add_admission_control(runtime, DB_CHECKS)
+    await run_subscription(subscriber, subscription_path, callback, runtime, flow_overrides)
 
 
 async def dummy_func(subscriber, subscription_path):
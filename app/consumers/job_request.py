@@ -1,35 +1,48 @@
-import asyncio
 import json
-from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
 
 from google.cloud.pubsub_v1.subscriber.message import Message
-from google.cloud.video.transcoder_v1.services.transcoder_service import (
-    TranscoderServiceClient,
-)
 
 from app.config import settings
-from app.crud import async_create_job, async_update_job_id
+from app.dispatch_scheduler import STANDARD, dispatch_scheduler
+from app.crud import async_add_finished_job, async_create_job, async_delete_job_by_custom_name, async_update_job_id
+from app.gcp_clients import GCPClients
 from app.gcp_utils import get_secret_from_key_server, create_secret
+from app.idempotency import dispatch_deduplicator, request_fingerprint
 from app.mapper import map_into_create_job
-from app.models import JobStatusEnum, JobStateEnum
 from app.routers.job import create_job_from_ad_hoc
 from app.schemas import AdocJobRequest
-from app.utils import check_file_or_directory, create_directory
+from app.pipeline import StagePipeline, StageTimings
+from app.retries import RetryHandler, handle_failed_request
+from app.storage_uris import parse_storage_url
+from app.transcoder_locations import location_pool
+from app.transcode_reuse import compute_result_fingerprint, transcode_reuse
+from app.utils import job_duration_seconds, run_blocking
 from app.exceptions import CustomException
+from app.consumers.notifications import completion_outbox_entry
+from app.consumers.backpressure import add_admission_control, dispatch_checks
+from app.consumers.runtime import ConsumerRuntime, run_subscription
 from app.custom_logger import logger
+from app.loop_local import close_loop_resources
+from app.outbox import wake_outbox_drainer
 
+# Shared by every message so /metrics can report where dispatch time goes
+job_request_timings = StageTimings()
 
-async def consume_job_request(subscriber, subscription_path, credentials, t_client: TranscoderServiceClient):
+
+async def consume_job_request(subscriber, subscription_path, clients: GCPClients,
+                              flow_overrides: Optional[dict] = None):
     # logging.basicConfig(level=logging.INFO, filename="py_log.log", filemode="w")
 
     async def callback(message: Message) -> None:
+        if message is None:
+            logger.warning("Received None message. Skipping.")
+            return
+        message_id = f"job_request:{message.message_id}"
+        payload = message.data.decode('utf-8')
         try:
-            if message is None:
-                logger.warning("Received None message. Skipping.")
-                return
             # Decode and parse the message payload as JSON
-            request_data = json.loads(message.data.decode('utf-8'))
+            request_data = json.loads(payload)
 
             logger.info(f"custom_name: {request_data['custom_name']}, content_id:{request_data['content_id']}, "
                         f"provider_id:{request_data['provider_id']}, description:{request_data['description']}, "
@@ -43,36 +56,57 @@ async def consume_job_request(subscriber, subscription_path, credentials, t_clie
             job_request = AdocJobRequest(**request_data)
 
             # Process the JobRequest object
-            await process_job_request(job_request, t_client, credentials)
+            await process_job_request(job_request, clients, message_id)
 
         except Exception as e:
             logger.error(f"{e}")
-        finally:
-            if message is not None:
-                message.ack()
+            try:
+                # Retried from the database with backoff, or dead-lettered
+                await handle_failed_request("job_request", message_id, payload, e)
+            except Exception as store_error:
+                logger.error(f"Could not store failed job request: {store_error}")
+                message.nack()
+                return
+        message.ack()
 
-    def sync_wrapper(message):
-        asyncio.run(callback(message))
+    # One long-lived loop serves every message of this subscription.
+    runtime = ConsumerRuntime("job_request", max_in_flight=settings.MAX_WORKERS)
+    runtime.add_shutdown_hook(close_loop_resources)
+    # Fewer callbacks run while the DB pool, key server or Transcoder dispatch is saturated
+    add_admission_control(runtime, dispatch_checks(STANDARD))
+    await run_subscription(subscriber, subscription_path, callback, runtime, flow_overrides)
 
-    streaming_pull_future = subscriber.subscribe(subscription_path, callback=sync_wrapper)
 
-    print(f"Listening for messages on {subscription_path}")
+def job_request_retry_handler(clients: GCPClients) -> RetryHandler:
+    """Re-runs a stored job request payload; used by the retry scheduler."""
 
-    # Wrap subscriber in a 'with' block to automatically call close() when done.
-    async with subscriber:
-        try:
-            # When `timeout` is not set, result() will block indefinitely,
-            # unless an exception is encountered first.
-            # streaming_pull_future.result()
-            executor = ThreadPoolExecutor(max_workers=settings.MAX_WORKERS)
-            await asyncio.get_running_loop().run_in_executor(executor, streaming_pull_future.result)
-        except TimeoutError:
-            streaming_pull_future.cancel()  # Trigger the shutdown.
-            await streaming_pull_future.result()  # Block until the shutdown is complete.
-
-
-async def process_job_request(request: AdocJobRequest, t_client: TranscoderServiceClient,
-                              credentials):
+    async def retry(payload: str, message_id: Optional[str]) -> None:
+        await process_job_request(AdocJobRequest(**json.loads(payload)), clients, message_id)
+
+    return retry
+
+
+async def process_job_request(request: AdocJobRequest, clients: GCPClients, message_id: Optional[str] = None):
+    # Claimed before anything is dispatched, so redeliveries and repeated requests stop here. A claim
+    # another worker still holds raises DispatchClaimHeld, and the request is retried after its lease.
+    fingerprint = request_fingerprint(request)
+    if not await dispatch_deduplicator.claim(message_id, fingerprint, request.custom_name):
+        logger.info(f"Skipping duplicate job request {request.custom_name} (message {message_id})")
+        return
+
+    try:
+        await dispatch_job_request(request, clients)
+    except BaseException:
+        await dispatch_deduplicator.release(message_id, fingerprint)
+        raise
+    try:
+        await dispatch_deduplicator.mark_dispatched(message_id, fingerprint)
+    except Exception as e:
+        # The job is dispatched; its claim just stays takeable once the lease runs out
+        logger.error(f"Could not mark job request {request.custom_name} dispatched: {e}")
+
+
+async def dispatch_job_request(request: AdocJobRequest, clients: GCPClients):
     jobs = map_into_create_job(request)
 
     # input_exists = check_file_or_directory(jobs.input_uri)
@@ -84,32 +118,71 @@ async def process_job_request(request: AdocJobRequest, t_client: TranscoderServi
     # if not output_exists:
     #    raise CustomException(code=400, status_code=20400, detail="Output directory does not exist.")
 
-    jobs.output_uri = create_directory(jobs.output_uri, jobs.custom_name, jobs.content_id)
+    # The marker upload only needs the normalised output URI, so compute it up front
+    # and let the GCS, key-server and DB steps run concurrently.
+    bucket_name, output_path = parse_storage_url(jobs.output_uri, code=400, status_code=20400)
+    jobs.output_uri = f"gs://{bucket_name}/{output_path}"
 
-    value = get_secret_from_key_server(request.content_id, request.package_id, request.provider_id,
-                                       request.video_quality, request.audio_quality, request.drm_type)
-
-    print("After successful key server response")
     # version = create_secret(value)
-
     version = settings.SECRET_VERSION
     print(f"version: {version}")
-
     jobs.version = version
 
-    # Add job into database
-    await async_create_job(jobs)
+    async with StagePipeline("job_request", job_request_timings) as pipeline:
+        fingerprint = None
+        if request.reuse_existing:
+            fingerprint = await pipeline.stage(
+                "fingerprint", compute_result_fingerprint(clients.storage_uris, request, version))
+            result = await pipeline.stage("reuse_lookup", transcode_reuse.find(fingerprint))
+            if result is not None:
+                # Same source object and config already transcoded: copy it instead of dispatching
+                jobs.output_uri = await pipeline.stage(
+                    "reuse_copy", transcode_reuse.copy_output(clients.storage_uris, result, jobs.output_uri))
+                await pipeline.stage(
+                    "db_insert", async_add_finished_job(transcode_reuse.mark_reused(jobs, result, fingerprint),
+                                                        notify=completion_outbox_entry))
+                wake_outbox_drainer()
+                return
 
-    logger.info("After save the jobs in DB")
-    # Dispatch Job to GCP Transcoder API
-    transcoding_response = create_job_from_ad_hoc(t_client, settings.PROJECT_ID, settings.LOCATION,
-                                                  jobs.input_uri, jobs.output_uri, version, request.image_uri,
-                                                  request.video_quality, request.audio_quality, request.drm_type,
-                                                  request.manifast_type)
-    logger.info(transcoding_response.name)
-    # print(transcoding_response.name)
-    # Update job status and job state
-    job = await async_update_job_id(transcoding_response.name, request)
+        jobs.location = await pipeline.stage("location", location_pool.choose(jobs.input_uri, jobs.output_uri))
+        stages = [
+            ("output_directory", run_blocking(clients.storage_uris.ensure_directory, jobs.output_uri), None),
+            ("key_server", get_secret_from_key_server(request.content_id, request.package_id, request.provider_id,
+                                                      request.video_quality, request.audio_quality,
+                                                      request.drm_type), None),
+            # Add job into database; removed again if a later stage fails
+            ("db_insert", async_create_job(jobs),
+             lambda _: async_delete_job_by_custom_name(request.custom_name)),
+        ]
+        if not request.reuse_existing:
+            # Recorded with the job so a later identical request can reuse its output
+            stages.append(("fingerprint", compute_result_fingerprint(clients.storage_uris, request, version), None))
+        results = await pipeline.fan_out(*stages)
+        value = results[1]
+        if not request.reuse_existing:
+            fingerprint = results[3]
+        print("After successful key server response")
+        logger.info("After save the jobs in DB")
+
+        # Dispatch Job to GCP Transcoder API, through the request's priority lane
+        transcoding_response = await pipeline.stage(
+            "transcoder_dispatch",
+            dispatch_scheduler.run(dispatch_scheduler.lane(request.priority, STANDARD), jobs.location,
+                                   create_job_from_ad_hoc, clients.transcoder, settings.PROJECT_ID, jobs.location,
+                                   jobs.input_uri, jobs.output_uri, version, request.image_uri,
+                                   request.video_quality, request.audio_quality, request.drm_type,
+                                   request.manifast_type),
+            compensate=lambda response: run_blocking(clients.transcoder.delete_job, name=response.name),
+        )
+        logger.info(transcoding_response.name)
+        # print(transcoding_response.name)
+        # Update job status and job state
+        job = await pipeline.stage("db_update", async_update_job_id(transcoding_response.name, request,
+                                                                    job_duration_seconds(transcoding_response),
+                                                                    fingerprint))
+        if not job:
+            print("Job not found or failed to update")
+            raise CustomException(code=404, status_code=20404, detail="Job not found or failed to update")
 
     print("After update the job in DB")
     logger.info("After update the job id")
@@ -145,7 +218,7 @@ async def process_job_request(request: AdocJobRequest, t_client: TranscoderServi
 
         # Initialize a PublisherClient
         # Commented out the following one line temporarily: 03-06-2024
-        # publisher = pubsub_v1.PublisherClient(credentials=credentials)
+        # publisher = clients.publisher
 
         # publisher = pubsub_v1.PublisherClient()
 
@@ -157,22 +230,3 @@ async def process_job_request(request: AdocJobRequest, t_client: TranscoderServi
         # Commented out the following lines temporarily: 03-06-2024
         # future = publisher.publish(settings.JOB_START_TOPIC_PATH, message_data.encode('utf-8'))
         # print(f"Published message ID: {future.result()}")
-
-    else:
-        print("Job not found or failed to update")
-        raise CustomException(code=404, status_code=20404, detail="Job not found or failed to update")
-
-
-class CustomJSONEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, JobStateEnum):
-            return obj.value  # Serialize enum value
-        if isinstance(obj, JobStatusEnum):
-            return obj.value  # Serialize enum value
-        if isinstance(obj, datetime):
-            return obj.isoformat()  # Serialize datetime object
-        return super().default(obj)
-
-
-def data_to_json(data):
-    return json.dumps(data, cls=CustomJSONEncoder)
@@ -0,0 +1,59 @@
+"""
+Job status notifications published for downstream services
+"""
+import json
+from datetime import datetime
+
+from app.config import settings
+from app.models import JobStatusEnum, JobStateEnum
+from app.utils import remove_bucket_name
+
+
+def build_completion_notification(job) -> dict:
+    return {
+        "success": True,
+        "message": "Job Final Status",
+        "data": [
+            {
+                "fully_qualified_name": job.fully_qualified_name,
+                "job_id": job.job_id,
+                "url": job.input_uri,
+                "description": job.description,
+                "state": job.state,
+                "status": job.status,
+                "custom_name": job.custom_name,
+                "output_location": job.output_uri,
+                "job_start_time": job.created_at,
+                "job_end_time": job.updated_at,
+                "duration": job.duration_in_sec,
+                "dash_media_cdn": settings.MEDIA_CDN_BASE + remove_bucket_name(
+                    job.output_uri) + "manifest_dash.mpd",
+                "hls_media_cdn": settings.MEDIA_CDN_BASE + remove_bucket_name(
+                    job.output_uri) + "manifest_hls.m3u8"
+            }
+        ]
+    }
+
+
+def completion_outbox_entry(job) -> dict:
+    """notification_outbox row announcing a job's final status, ordered per content_id."""
+    return {
+        "topic": settings.JOB_START_TOPIC_PATH,
+        "ordering_key": job.content_id or "",
+        "payload": data_to_json(build_completion_notification(job)),
+    }
+
+
+class CustomJSONEncoder(json.JSONEncoder):
+    def default(self, obj):
+        if isinstance(obj, JobStateEnum):
+            return obj.value  # Serialize enum value
+        if isinstance(obj, JobStatusEnum):
+            return obj.value  # Serialize enum value
+        if isinstance(obj, datetime):
+            return obj.isoformat()  # Serialize datetime object
+        return super().default(obj)
+
+
+def data_to_json(data):
+    return json.dumps(data, cls=CustomJSONEncoder)
@@ -1,78 +1,105 @@
-import asyncio
 import json
 import os
 import time
-from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
 
 from google.cloud.pubsub_v1.subscriber.message import Message
-from google.cloud.video.transcoder_v1.services.transcoder_service import (
-    TranscoderServiceClient,
-)
 
 from app.config import settings
 from app.consumers.job_request import process_job_request
+from app.consumers.backpressure import add_admission_control, dispatch_checks
+from app.consumers.runtime import ConsumerRuntime, run_subscription
 from app.custom_logger import logger
+from app.dispatch_scheduler import BULK
+from app.gcp_clients import GCPClients
+from app.loop_local import close_loop_resources
+from app.retries import RetryHandler, handle_failed_request
 from app.schemas import AdocJobRequest
 
 
-async def process_cloud_storage_trigger(subscriber, subscription_path, credentials, t_client: TranscoderServiceClient):
+async def process_cloud_storage_trigger(subscriber, subscription_path, clients: GCPClients,
+                                        flow_overrides: Optional[dict] = None):
     # logging.basicConfig(level=logging.INFO, filename="py_log.log", filemode="w")
 
     async def callback(message: Message) -> None:
+        if message is None:
+            print("Received None message. Skipping.")
+            logger.warning("Received None message. Skipping.")
+            return
+        message_id = f"trigger:{message.message_id}"
+        data, attributes = message.data.decode('utf-8'), dict(message.attributes)
+        failure = None
         try:
-            if message is None:
-                print("Received None message. Skipping.")
-                logger.warning("Received None message. Skipping.")
+            job_request = trigger_job_request(data, attributes)
+        except Exception as e:
+            # Could not even build a job request from the notification
+            failure = ("trigger", json.dumps({"data": data, "attributes": attributes}), e)
+        else:
+            if job_request is not None:
+                # Process the JobRequest object; duplicate GCS notifications of one object generation
+                # share a fingerprint (custom_name is not part of it) and are skipped
+                try:
+                    await process_job_request(job_request, clients, message_id)
+                except Exception as e:
+                    # The prepared request is what gets retried, so its custom_name stays the same
+                    failure = ("job_request", job_request.model_dump_json(), e)
+
+        if failure is not None:
+            source, payload, error = failure
+            print(error)
+            logger.error(error)
+            try:
+                await handle_failed_request(source, message_id, payload, error)
+            except Exception as store_error:
+                logger.error(f"Could not store failed trigger: {store_error}")
+                message.nack()
                 return
-            # Decode and parse the message payload as JSON
-            request_data = json.loads(message.data.decode('utf-8'))
-            name = request_data.get("name")
-            content_type = request_data.get("contentType")
-            bucket = request_data.get("bucket")
-            event_type = message.attributes.get("eventType")
-
-            if name.startswith("input") and content_type == "video/mp4" and event_type == "OBJECT_FINALIZE":
-                data = prepare_job_request(name, bucket)
-                logger.info(f"custom_name: {data['custom_name']}, content_id:{data['content_id']}, "
-                            f"provider_id:{data['provider_id']}, description:{data['description']}, "
-                            f"audio_quality:{data['audio_quality']}, drm_type:{data['drm_type']}, "
-                            f"image_uri:{data['image_uri']}, manifast_type:{data['manifast_type']}, "
-                            f"input_uri:{data['input_uri']}, video_quality:{data['video_quality']}, "
-                            f"package_id:{data['package_id']}, "
-                            f"output_uri:{data['output_uri']}, created_by:{data['created_by']}")
-
-                print(data)
-                # Deserialize the JSON data into a JobRequest object
-                job_request = AdocJobRequest(**data)
-
-                # Process the JobRequest object
-                await process_job_request(job_request, t_client, credentials)
+        message.ack()
 
-        except Exception as e:
-            print(e)
-            logger.error(e)
-        finally:
-            if message is not None:
-                message.ack()
+    # One long-lived loop serves every message of this subscription.
+    runtime = ConsumerRuntime("trigger", max_in_flight=settings.MAX_WORKERS)
+    runtime.add_shutdown_hook(close_loop_resources)
+    # Fewer callbacks run while the DB pool, key server or Transcoder dispatch is saturated
+    add_admission_control(runtime, dispatch_checks(BULK))
+    await run_subscription(subscriber, subscription_path, callback, runtime, flow_overrides)
 
-    def sync_wrapper(message):
-        asyncio.run(callback(message))
 
-    streaming_pull_future = subscriber.subscribe(subscription_path, callback=sync_wrapper)
+def trigger_retry_handler(clients: GCPClients) -> RetryHandler:
+    """Re-runs a stored storage notification ({"data", "attributes"}); used when a dead letter is replayed."""
 
-    print(f"Listening for messages on {subscription_path}")
+    async def retry(payload: str, message_id: Optional[str]) -> None:
+        stored = json.loads(payload)
+        job_request = trigger_job_request(stored["data"], stored["attributes"])
+        if job_request is not None:
+            await process_job_request(job_request, clients, message_id)
 
-    # Wrap subscriber in a 'with' block to automatically call close() when done.
-    async with subscriber:
-        try:
-            # When `timeout` is not set, result() will block indefinitely,
-            # unless an exception is encountered first.
-            # streaming_pull_future.result()
-            executor = ThreadPoolExecutor(max_workers=settings.MAX_WORKERS)
-            await asyncio.get_running_loop().run_in_executor(executor, streaming_pull_future.result)
-        except TimeoutError:
-            streaming_pull_future.cancel()  # Trigger the shutdown.
-            await streaming_pull_future.result()  # Block until the shutdown is complete.
+    return retry
+
+
+def trigger_job_request(data: str, attributes: dict) -> Optional[AdocJobRequest]:
+    """Builds the job request for a finalized input video; None for every other notification."""
+    # Decode and parse the message payload as JSON
+    request_data = json.loads(data)
+    name = request_data.get("name")
+    content_type = request_data.get("contentType")
+    bucket = request_data.get("bucket")
+    event_type = attributes.get("eventType")
+
+    if not (name.startswith("input") and content_type == "video/mp4" and event_type == "OBJECT_FINALIZE"):
+        return None
+
+    data = prepare_job_request(name, bucket, request_data.get("generation"))
+    logger.info(f"custom_name: {data['custom_name']}, content_id:{data['content_id']}, "
+                f"provider_id:{data['provider_id']}, description:{data['description']}, "
+                f"audio_quality:{data['audio_quality']}, drm_type:{data['drm_type']}, "
+                f"image_uri:{data['image_uri']}, manifast_type:{data['manifast_type']}, "
+                f"input_uri:{data['input_uri']}, video_quality:{data['video_quality']}, "
+                f"package_id:{data['package_id']}, "
+                f"output_uri:{data['output_uri']}, created_by:{data['created_by']}")
+
+    print(data)
+    # Deserialize the JSON data into a JobRequest object
+    return AdocJobRequest(**data)
 
 
 def extract_filename(name: str) -> str:
@@ -98,7 +125,7 @@ def get_output_sub_path(name: str) -> str:
     return str(sub_path)
 
 
-def prepare_job_request(name: str, bucket: str):
+def prepare_job_request(name: str, bucket: str, generation: Optional[str] = None):
     return {
         "audio_quality": [
             64
@@ -106,6 +133,7 @@ def prepare_job_request(name: str, bucket: str):
         "content_id": get_content_id(name),
         "created_by": "transcoder_service_internally",
         "input_uri": "gs://" + bucket + "/" + name,
+        "input_generation": generation,
         "custom_name": get_content_id(name) + "_" + str(int(time.time())),
         "description": "Fairplay and Widevine encryption for " + extract_filename(name),
         "drm_type": [
@@ -119,6 +147,7 @@ def prepare_job_request(name: str, bucket: str):
         "output_uri": "gs://" + settings.OUTPUT_BUCKET_TOFFEE + "/output/" + get_output_sub_path(name) + "/",
         "package_id": get_content_id(name),
         "provider_id": "6d0a6365",
+        "priority": "bulk",
         "video_quality": [
             360,
             480,
@@ -0,0 +1,243 @@
+"""
+Long-lived event loop shared by all messages of one Pub/Sub subscription
+"""
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from google.cloud.pubsub_v1.types import FlowControl
+
+from app.config import settings
+from app.custom_logger import logger
+
+
+class ConsumerRuntime:
+    """Runs message callbacks on a single event loop owned by one subscription.
+
+    The Pub/Sub client invokes callbacks on its own thread pool. Instead of
+    creating a fresh loop per message with ``asyncio.run``, the callback
+    threads hand the coroutine to this runtime's loop, which lives for as long
+    as the subscription. Loop-bound resources (engine pools, HTTP sessions,
+    gRPC channels) can therefore be reused across messages.
+
+    At most ``limit`` callbacks run concurrently; further callback threads
+    block until a slot frees up, which pushes back on the subscriber. The
+    limit starts at ``max_in_flight`` and may be lowered and raised again
+    while running (see app/consumers/backpressure.py).
+    """
+
+    def __init__(self, name: str, max_in_flight: int = 10):
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self._limit = max_in_flight
+        self._slots = threading.Condition()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name=f"consumer-{name}", daemon=True)
+        self._shutdown_hooks: List[Callable[[], Awaitable[None]]] = []
+        self._background: List[Callable[[], Awaitable[None]]] = []
+        self._background_futures: List[Future] = []
+        self._in_flight = 0
+        self._leased = 0
+        self._running: Set[Future] = set()
+        self._stopping = False
+        self.flow_control: Optional[FlowControl] = None
+        # Downstream dependencies that lowered the limit at the last check
+        self.pressure: List[str] = []
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        return self._loop
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def limit(self) -> int:
+        return self._limit
+
+    def set_limit(self, limit: int) -> None:
+        """Changes how many callbacks may run at once, between 1 and ``max_in_flight``."""
+        with self._slots:
+            self._limit = max(1, min(self.max_in_flight, limit))
+            self._slots.notify_all()
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    def start(self) -> "ConsumerRuntime":
+        self._thread.start()
+        self._background_futures = [asyncio.run_coroutine_threadsafe(task(), self._loop)
+                                    for task in self._background]
+        logger.info(f"Consumer runtime '{self.name}' started with max_in_flight={self.max_in_flight}")
+        return self
+
+    def add_shutdown_hook(self, hook: Callable[[], Awaitable[None]]) -> None:
+        """Registers a coroutine function to be awaited on the runtime loop during stop()."""
+        self._shutdown_hooks.append(hook)
+
+    def add_background_task(self, task: Callable[[], Awaitable[None]]) -> None:
+        """Registers a coroutine function that runs on the runtime loop from start() until stop()."""
+        self._background.append(task)
+
+    def submit(self, coro: Awaitable) -> Future:
+        """Schedules a coroutine on the runtime loop, waiting for a free slot first."""
+        with self._slots:
+            self._slots.wait_for(lambda: self._stopping or self._in_flight < self._limit)
+            if self._stopping:
+                coro.close()
+                raise RuntimeError(f"Consumer runtime '{self.name}' is stopping")
+            self._in_flight += 1
+        try:
+            future = asyncio.run_coroutine_threadsafe(coro, self._loop)
+        except Exception:
+            self._release()
+            raise
+        with self._slots:
+            self._running.add(future)
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, future: Optional[Future] = None):
+        with self._slots:
+            self._in_flight -= 1
+            self._running.discard(future)
+            # stop() waits on the same condition, so wake every waiter
+            self._slots.notify_all()
+
+    def _settled(self, _=None):
+        with self._slots:
+            self._leased -= 1
+
+    def wrap(self, callback: Callable[..., Awaitable[None]]) -> Callable[..., None]:
+        """Turns an async message callback into the sync callable expected by subscriber.subscribe()."""
+
+        def sync_wrapper(message):
+            # Leased from here on: the client holds the message until the callback acks or nacks it
+            with self._slots:
+                self._leased += 1
+            try:
+                future = self.submit(callback(message))
+            except BaseException:
+                self._settled()
+                raise
+            future.add_done_callback(self._settled)
+            # Surface callback failures in the log; the callback owns ack/nack.
+            future.add_done_callback(self._log_failure)
+
+        return sync_wrapper
+
+    def _log_failure(self, future: Future):
+        if future.cancelled():
+            return
+        exc = future.exception()
+        if exc is not None:
+            logger.error(f"Consumer '{self.name}' callback failed: {exc}")
+
+    async def _run_shutdown_hooks(self):
+        for hook in self._shutdown_hooks:
+            try:
+                await hook()
+            except Exception as e:
+                logger.error(f"Consumer '{self.name}' shutdown hook failed: {e}")
+
+    def stop(self, timeout: float = 30.0) -> None:
+        """Lets running callbacks finish, runs the shutdown hooks on the loop, then stops and closes it.
+
+        Callbacks get up to ``timeout`` seconds to settle their messages; the
+        ones still running after that are cancelled, so the hooks never close
+        DB / HTTP resources under a callback that is still using them.
+        """
+        if not self._thread.is_alive():
+            return
+        for future in self._background_futures:
+            future.cancel()
+        with self._slots:
+            self._stopping = True
+            self._slots.notify_all()
+            drained = self._slots.wait_for(lambda: self._in_flight == 0, timeout)
+            leftover = list(self._running)
+        if not drained:
+            logger.error(f"Consumer '{self.name}' cancelling {len(leftover)} callbacks still running after {timeout}s")
+            for future in leftover:
+                future.cancel()
+            with self._slots:
+                self._slots.wait_for(lambda: self._in_flight == 0, 5.0)
+        try:
+            asyncio.run_coroutine_threadsafe(self._run_shutdown_hooks(), self._loop).result(timeout)
+        except Exception as e:
+            logger.error(f"Consumer '{self.name}' shutdown did not complete: {e}")
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout)
+        if not self._loop.is_running():
+            self._loop.close()
+        logger.info(f"Consumer runtime '{self.name}' stopped")
+
+    def stats(self) -> dict:
+        with self._slots:
+            leased, in_flight, limit = self._leased, self._in_flight, self._limit
+        flow = self.flow_control
+        return {
+            "leased": leased,
+            "in_flight": in_flight,
+            "waiting": max(0, leased - in_flight),
+            "limit": limit,
+            "max_in_flight": self.max_in_flight,
+            "pressure": list(self.pressure),
+            "flow_control": {
+                "max_messages": flow.max_messages,
+                "max_bytes": flow.max_bytes,
+                "max_lease_duration": flow.max_lease_duration,
+                "max_duration_per_lease_extension": flow.max_duration_per_lease_extension,
+            } if flow is not None else None,
+        }
+
+
+# Runtimes of the subscriptions this process is consuming, for /metrics
+subscriptions: Dict[str, ConsumerRuntime] = {}
+
+
+def subscription_flow_control(name: str, max_in_flight: int, **overrides) -> FlowControl:
+    """Flow control of one subscription's streaming pull.
+
+    Starts from the SUBSCRIBER_* settings, where max_messages 0 means twice
+    the runtime's ``max_in_flight``, so the client leases little more than
+    the callbacks can take. SUBSCRIBER_FLOW_CONTROL[name] and then
+    ``overrides`` replace individual fields.
+    """
+    options = {
+        "max_messages": settings.SUBSCRIBER_MAX_MESSAGES or 2 * max_in_flight,
+        "max_bytes": settings.SUBSCRIBER_MAX_BYTES,
+        "max_lease_duration": settings.SUBSCRIBER_MAX_LEASE_DURATION_SECONDS,
+        "max_duration_per_lease_extension": settings.SUBSCRIBER_MAX_LEASE_EXTENSION_SECONDS,
+    }
+    options.update(settings.SUBSCRIBER_FLOW_CONTROL.get(name, {}))
+    options.update({key: value for key, value in overrides.items() if value is not None})
+    return FlowControl(**options)
+
+
+async def run_subscription(subscriber, subscription_path: str, callback: Callable[..., Awaitable[None]],
+                           runtime: ConsumerRuntime, flow_overrides: Optional[dict] = None) -> None:
+    """Streams messages from a subscription into the runtime until cancelled."""
+    runtime.flow_control = subscription_flow_control(runtime.name, runtime.max_in_flight, **(flow_overrides or {}))
+    runtime.start()
+    subscriptions[runtime.name] = runtime
+    streaming_pull_future = subscriber.subscribe(subscription_path, callback=runtime.wrap(callback),
+                                                 flow_control=runtime.flow_control)
+    print(f"Listening for messages on {subscription_path}")
+
+    loop = asyncio.get_running_loop()
+    try:
+        # result() blocks until the stream fails or is cancelled, so wait for it off the loop.
+        await loop.run_in_executor(None, streaming_pull_future.result)
+    except asyncio.CancelledError:
+        logger.info(f"Subscription {subscription_path} cancelled")
+        raise
+    except Exception as e:
+        logger.error(f"Subscription {subscription_path} stopped: {e}")
+    finally:
+        streaming_pull_future.cancel()  # Trigger the shutdown.
+        subscriptions.pop(runtime.name, None)
+        await loop.run_in_executor(None, runtime.stop)
@@ -1,22 +1,30 @@
 #import logging
-from sqlalchemy import select
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import Session
-from sqlalchemy.orm import sessionmaker
+import asyncio
+from sqlalchemy import Row, Select, String, cast, column, delete, insert, select, tuple_, update, values
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, aliased
 from datetime import datetime
+from typing import AsyncIterator, Callable, List, Optional, Sequence, Tuple
 from sqlalchemy.sql import func
-from google.cloud.video.transcoder_v1.services.transcoder_service import (
-    TranscoderServiceClient,
-)
 
 from .exceptions import CustomException
-from .config import settings
-from .mapper import map_into_create_job, map_job_id_and_name
-from .models import Jobs, JobStatusEnum, JobStateEnum
+from .database import async_session
+from .mapper import map_into_create_job
+from .models import (
+    DeadLetters,
+    DispatchClaims,
+    JobRequestRetries,
+    Jobs,
+    JobStatusEnum,
+    JobStateEnum,
+    NotificationOutbox,
+    TranscodeResults,
+)
 from .schemas import AdocJobRequest
-from .utils import check_file_or_directory, create_directory, get_video_duration
+from .storage_uris import StorageUriValidator
+from .utils import encode_job_cursor, run_blocking
 from .custom_logger import logger
-import urllib.parse
 
 
 def add_job(db: Session, job: Jobs):
@@ -38,12 +46,34 @@ def get_job_by_job_id(job_id: str, db: Session):
     return db.query(Jobs).filter(Jobs.job_id == job_id).first()
 
 
-def create_job(request: AdocJobRequest, db: Session, version: int):
-    job = map_into_create_job(request)
+async def async_add_job(session: AsyncSession, job: Jobs):
+    session.add(job)
+    await session.commit()
+    await session.refresh(job)
+    return job
+
+
+async def async_get_job_by_custom_name(name: str, session: AsyncSession):
+    result = await session.execute(select(Jobs).filter(Jobs.custom_name == name))
+    return result.scalars().first()
+
+
+async def async_get_job_by_job_id(job_id: str, session: AsyncSession):
+    logger.info(f"{job_id}")
+    result = await session.execute(select(Jobs).filter(Jobs.job_id == job_id))
+    return result.scalars().first()
+
+
+async def async_create_job_from_request(request: AdocJobRequest, session: AsyncSession, version: int,
+                                        storage_uris: StorageUriValidator, location: Optional[str] = None):
+    job = map_into_create_job(request, location)
     job.version = version
 
-    input_exists = check_file_or_directory(job.input_uri)
-    output_exists = check_file_or_directory(job.output_uri)
+    # One parallel round of GCS lookups; results already known to exist come from the cache
+    input_exists, output_exists = await asyncio.gather(
+        run_blocking(storage_uris.exists, job.input_uri),
+        run_blocking(storage_uris.exists, job.output_uri),
+    )
 
     if not input_exists:
         print("Input file does not exist.")
@@ -53,50 +83,180 @@ def create_job(request: AdocJobRequest, db: Session, version: int):
         print("Output directory does not exist.")
         raise CustomException(code=400, status_code=40400, detail="Output directory does not exist.")
 
-    job.output_uri = create_directory(job.output_uri, job.custom_name, job.content_id)
-    return add_job(db, job)
+    # The output prefix was just confirmed, so this no longer re-uploads the marker
+    job.output_uri = await run_blocking(storage_uris.ensure_directory, job.output_uri)
+    return await async_add_job(session, job)
 
 
-def get_jobs(db: Session):
-    jobs = db.query(Jobs).all()
-    return jobs
+def build_jobs_filter_query(
+        status: Optional[JobStatusEnum] = None,
+        state: Optional[JobStateEnum] = None,
+        content_id: Optional[str] = None,
+        provider_id: Optional[str] = None,
+        created_by: Optional[str] = None,
+        from_date: Optional[datetime] = None,
+        to_date: Optional[datetime] = None,
+        columns=(Jobs,),
+) -> Select:
+    """Builds a SELECT over jobs with the listing filters applied, newest first.
+
+    from_date / to_date bound updated_at, the column the listing is ordered by.
+    """
+    sql = select(*columns)
+    if status is not None:
+        sql = sql.where(Jobs.status == status)
+    if state is not None:
+        sql = sql.where(Jobs.state == state)
+    if content_id is not None:
+        sql = sql.where(Jobs.content_id == content_id)
+    if provider_id is not None:
+        sql = sql.where(Jobs.provider_id == provider_id)
+    if created_by is not None:
+        sql = sql.where(Jobs.created_by == created_by)
+    if from_date is not None:
+        sql = sql.where(Jobs.updated_at >= from_date)
+    if to_date is not None:
+        sql = sql.where(Jobs.updated_at < to_date)
+    return sql.order_by(Jobs.updated_at.desc(), Jobs.id.desc())
+
+
+def build_jobs_page_query(cursor: Optional[Tuple[datetime, int]], limit: int, **filters) -> Select:
+    """Keyset page: rows strictly after the (updated_at, id) cursor, plus one row to detect a next page."""
+    sql = build_jobs_filter_query(**filters)
+    if cursor is not None:
+        sql = sql.where(tuple_(Jobs.updated_at, Jobs.id) < tuple_(*cursor))
+    return sql.limit(limit + 1)
+
+
+async def async_get_jobs_page(session: AsyncSession, cursor: Optional[Tuple[datetime, int]], limit: int, **filters):
+    """Returns (jobs, next_cursor) for one page of the job listing."""
+    result = await session.execute(build_jobs_page_query(cursor, limit, **filters))
+    return paginate_jobs(result.scalars().all(), limit)
+
 
+def paginate_jobs(jobs: List[Jobs], limit: int):
+    if len(jobs) <= limit:
+        return jobs, None
+    jobs = jobs[:limit]
+    return jobs, encode_job_cursor(jobs[-1].updated_at, jobs[-1].id)
 
-def update_job_id(db: Session, request: AdocJobRequest, name: str):
-    job = get_job_by_custom_name(request.custom_name, db)
-    jobs = map_job_id_and_name(job, name)
-    return add_job(db, jobs)
+
+# Columns written by /job/export, in output order
+EXPORT_COLUMNS = (
+    Jobs.id,
+    Jobs.job_id,
+    Jobs.custom_name,
+    Jobs.content_id,
+    Jobs.package_id,
+    Jobs.provider_id,
+    Jobs.created_by,
+    Jobs.status,
+    Jobs.state,
+    Jobs.location,
+    Jobs.input_uri,
+    Jobs.output_uri,
+    Jobs.duration_in_sec,
+    Jobs.created_at,
+    Jobs.updated_at,
+)
+EXPORT_BATCH_SIZE = 1000
 
 
-async def async_update_job_state(t_client: TranscoderServiceClient, name: str, state: str):
-    # URL-encode the password
-    encoded_password = urllib.parse.quote(settings.DB_PASSWORD)
-    database_url = f"postgresql+asyncpg://{settings.DB_USER}:{encoded_password}@{settings.DB_HOSTNAME}:{settings.DB_PORT}/{settings.DB_NAME}"
-    async_engine = create_async_engine(database_url, echo=True)
-    async_session = sessionmaker(bind=async_engine, expire_on_commit=False, class_=AsyncSession)
+async def async_stream_jobs(columns=EXPORT_COLUMNS, **filters) -> AsyncIterator[Sequence[Row]]:
+    """Yields filtered job rows in batches from a server-side cursor; only one batch is held in memory."""
+    sql = build_jobs_filter_query(columns=columns, **filters).execution_options(yield_per=EXPORT_BATCH_SIZE)
+    async with async_session() as session:
+        result = await session.stream(sql)
+        async for rows in result.partitions():
+            yield rows
+
+
+# Columns the completion notification is built from
+NOTIFICATION_COLUMNS = (
+    Jobs.fully_qualified_name,
+    Jobs.job_id,
+    Jobs.input_uri,
+    Jobs.output_uri,
+    Jobs.description,
+    Jobs.state,
+    Jobs.status,
+    Jobs.custom_name,
+    Jobs.content_id,
+    Jobs.created_at,
+    Jobs.updated_at,
+    Jobs.duration_in_sec,
+)
+
+
+JobStateUpdate = Tuple[str, str, Optional[float]]
+
+
+# Builds the notification_outbox row (topic, ordering_key, payload) announcing a changed job
+OutboxEntryBuilder = Callable[[Row], dict]
+
+
+async def async_update_job_states(updates: Sequence[JobStateUpdate],
+                                  notify: Optional[OutboxEntryBuilder] = None) -> List[Row]:
+    """Marks a batch of jobs complete in one UPDATE ... FROM (VALUES ...) RETURNING.
+
+    ``updates`` holds (fully_qualified_name, Transcoder state, duration) tuples;
+    a missing duration keeps the stored one. No remote call is made while the
+    transaction is open. Rows are locked in name order so concurrent batches
+    cannot deadlock. With ``notify``, an outbox row per updated job is written
+    in the same transaction. Returns the notification columns of every job that was found.
+    """
+    latest = {name: (state, duration) for name, state, duration in updates}
+    if not latest:
+        return []
+    changes = values(
+        column("name", String),
+        column("state", Jobs.state.type),
+        column("duration", Jobs.duration_in_sec.type),
+        name="changes",
+    ).data([
+        (name, JobStateEnum.SUCCESS if state == 'SUCCEEDED' else JobStateEnum.FAILED, duration)
+        for name, (state, duration) in sorted(latest.items())
+    ])
     async with async_session() as session:
         async with session.begin():
-            logger.info("Into async_update_job_state")
-            sql = select(Jobs).filter(Jobs.fully_qualified_name == name)
+            sql = (
+                update(Jobs)
+                .where(Jobs.fully_qualified_name == changes.c.name)
+                .values(
+                    status=JobStatusEnum.COMPLETE,
+                    state=cast(changes.c.state, Jobs.state.type),
+                    updated_at=func.now(),
+                    duration_in_sec=func.coalesce(cast(changes.c.duration, Jobs.duration_in_sec.type),
+                                                  Jobs.duration_in_sec),
+                )
+                .returning(*NOTIFICATION_COLUMNS)
+                .execution_options(synchronize_session=False)
+            )
             result = await session.execute(sql)
-            job = result.scalar_one_or_none()
-            if job is None:
-                logger.info(f"Job with name '{name}' not found in the database.")
-                return
-            job.status = JobStatusEnum.COMPLETE
-            job.state = JobStateEnum.SUCCESS if state == 'SUCCEEDED' else JobStateEnum.FAILED
-            job.updated_at = func.now()
-            job.duration_in_sec = get_video_duration(t_client, job.job_id)
-            logger.info(f"Updating job: {job.job_id}, state: {job.state}, status: {job.status}")
-            await session.commit()
-            return job
+            jobs = result.all()
+            if notify is not None and jobs:
+                await session.execute(insert(NotificationOutbox), [notify(job) for job in jobs])
+    if len(jobs) < len(latest):
+        found = {job.fully_qualified_name for job in jobs}
+        for name in latest.keys() - found:
+            logger.info(f"Job with name '{name}' not found in the database.")
+    return jobs
+
+
+async def async_get_names_missing_duration(names: Sequence[str]) -> List[str]:
+    """Which of the given jobs have no duration stored yet; a read only, no lock is held afterwards."""
+    if not names:
+        return []
+    async with async_session() as session:
+        result = await session.execute(
+            select(Jobs.fully_qualified_name)
+            .where(Jobs.fully_qualified_name.in_(names))
+            .where(Jobs.duration_in_sec.is_(None))
+        )
+        return list(result.scalars().all())
 
 
 async def async_get_job(name:str):
-    encoded_password = urllib.parse.quote(settings.DB_PASSWORD)
-    database_url = f"postgresql+asyncpg://{settings.DB_USER}:{encoded_password}@{settings.DB_HOSTNAME}:{settings.DB_PORT}/{settings.DB_NAME}"
-    async_engine = create_async_engine(database_url, echo=True)
-    async_session = sessionmaker(bind=async_engine, expire_on_commit=False, class_=AsyncSession)
     async with async_session() as session:
         async with session.begin():
             logger.info("Into async_get_job")
@@ -110,32 +270,367 @@ async def async_get_job(name:str):
             return job
 
 async def async_create_job(job: Jobs):
-    encoded_password = urllib.parse.quote(settings.DB_PASSWORD)
-    database_url = f"postgresql+asyncpg://{settings.DB_USER}:{encoded_password}@{settings.DB_HOSTNAME}:{settings.DB_PORT}/{settings.DB_NAME}"
-    async_engine = create_async_engine(database_url, echo=True)
-    async_session = sessionmaker(bind=async_engine, expire_on_commit=False, class_=AsyncSession)
     async with async_session() as session:
         async with session.begin():
             session.add(job)
             await session.commit()
 
 
-async def async_update_job_id(name: str, request: AdocJobRequest):
-    encoded_password = urllib.parse.quote(settings.DB_PASSWORD)
-    database_url = f"postgresql+asyncpg://{settings.DB_USER}:{encoded_password}@{settings.DB_HOSTNAME}:{settings.DB_PORT}/{settings.DB_NAME}"
-    async_engine = create_async_engine(database_url, echo=True)
-    async_session = sessionmaker(bind=async_engine, expire_on_commit=False, class_=AsyncSession)
+async def async_add_finished_job(job: Jobs, notify: Optional[OutboxEntryBuilder] = None) -> Jobs:
+    """Inserts a job that needs no dispatch, with its outbox notification, and loads its server-side defaults."""
+    async with async_session() as session:
+        async with session.begin():
+            session.add(job)
+            await session.flush()
+            await session.refresh(job)
+            if notify is not None:
+                await session.execute(insert(NotificationOutbox), [notify(job)])
+    return job
+
+
+async def async_delete_job_by_custom_name(name: str):
+    """Removes a job row that was inserted for a request whose dispatch failed."""
+    async with async_session() as session:
+        async with session.begin():
+            await session.execute(delete(Jobs).where(Jobs.custom_name == name))
+
+
+async def async_update_job_id(name: str, request: AdocJobRequest, duration: Optional[float] = None,
+                              content_fingerprint: Optional[str] = None):
+    """Stores the Transcoder job name, and the input duration when already known, in a single UPDATE ... RETURNING."""
     async with async_session() as session:
         async with session.begin():
             logger.info("Into async_update_job_id")
-            sql = select(Jobs).filter(Jobs.custom_name == request.custom_name)
+            sql = (
+                update(Jobs)
+                .where(Jobs.custom_name == request.custom_name)
+                .values(
+                    fully_qualified_name=name,
+                    job_id=name.split("jobs/")[1],
+                    status=JobStatusEnum.PROCESSING,
+                    duration_in_sec=duration,
+                    content_fingerprint=content_fingerprint,
+                )
+                .returning(*NOTIFICATION_COLUMNS)
+            )
             result = await session.execute(sql)
-            job = result.scalar_one_or_none()
+            job = result.one_or_none()
             if job is None:
                 logger.info(f"Job with name '{name}' not found in the database.")
                 return
-            job.fully_qualified_name = name
-            job.job_id = name.split("jobs/")[1]
-            job.status = JobStatusEnum.PROCESSING
-            await session.commit()
             return job
+
+
+async def async_in_flight_by_location(default_location: str, window_hours: int) -> dict:
+    """Jobs per Transcoder location that are waiting or processing and were touched within ``window_hours``."""
+    location = func.coalesce(Jobs.location, default_location)
+    async with async_session() as session:
+        result = await session.execute(
+            select(location, func.count(Jobs.id))
+            .where(Jobs.status.in_((JobStatusEnum.WAITING, JobStatusEnum.PROCESSING)))
+            .where(Jobs.updated_at >= func.now() - func.make_interval(0, 0, 0, 0, window_hours))
+            .group_by(location)
+        )
+        return {name: count for name, count in result.all()}
+
+
+async def async_claim_dispatch(message_id: Optional[str], fingerprint: str, custom_name: Optional[str],
+                               lease_seconds: float) -> Optional[str]:
+    """Takes the dispatch claim for a request; None when taken, else the state of the claim in the way.
+
+    A 'claimed' row whose lease has run out is deleted first and claimed anew,
+    so a worker that died mid-dispatch does not block the request for good.
+    'dispatched' wins over 'claimed' when the message and the fingerprint are
+    held by different rows.
+    """
+    matches = DispatchClaims.fingerprint == fingerprint
+    if message_id is not None:
+        matches = matches | (DispatchClaims.message_id == message_id)
+    async with async_session() as session:
+        async with session.begin():
+            await session.execute(
+                delete(DispatchClaims)
+                .where(matches)
+                .where(DispatchClaims.state == 'claimed')
+                .where(DispatchClaims.leased_until < func.now())
+            )
+            sql = (
+                pg_insert(DispatchClaims)
+                .values(message_id=message_id, fingerprint=fingerprint, custom_name=custom_name,
+                        state='claimed', leased_until=_seconds_from_now(lease_seconds))
+                .on_conflict_do_nothing()
+                .returning(DispatchClaims.id)
+            )
+            result = await session.execute(sql)
+            if result.scalar_one_or_none() is not None:
+                return None
+            states = set((await session.execute(select(DispatchClaims.state).where(matches))).scalars().all())
+            # A row released since the insert is still treated as held; the caller tries again later
+            return 'dispatched' if 'dispatched' in states else 'claimed'
+
+
+async def async_mark_dispatched(fingerprint: str):
+    """Turns the claim of a successfully dispatched request into a permanent one."""
+    async with async_session() as session:
+        async with session.begin():
+            await session.execute(
+                update(DispatchClaims)
+                .where(DispatchClaims.fingerprint == fingerprint)
+                .values(state='dispatched', dispatched_at=func.now(), leased_until=None)
+            )
+
+
+async def async_release_dispatch_claim(fingerprint: str):
+    """Drops a claim whose dispatch failed so a redelivery can try again."""
+    async with async_session() as session:
+        async with session.begin():
+            await session.execute(
+                delete(DispatchClaims)
+                .where(DispatchClaims.fingerprint == fingerprint)
+                .where(DispatchClaims.state == 'claimed')
+            )
+
+
+async def async_purge_dispatch_claims(retention_hours: int) -> int:
+    """Deletes claims dispatched, or left expired, more than ``retention_hours`` ago."""
+    cutoff = func.now() - func.make_interval(0, 0, 0, 0, retention_hours)
+    async with async_session() as session:
+        async with session.begin():
+            result = await session.execute(
+                delete(DispatchClaims)
+                .where((DispatchClaims.dispatched_at < cutoff) | (DispatchClaims.leased_until < cutoff))
+            )
+            return result.rowcount
+
+
+async def async_get_transcode_result(fingerprint: str) -> Optional[TranscodeResults]:
+    async with async_session() as session:
+        result = await session.execute(select(TranscodeResults).where(TranscodeResults.fingerprint == fingerprint))
+        return result.scalars().first()
+
+
+async def async_record_transcode_results(names: Sequence[str]):
+    """Registers the outputs of the given jobs that SUCCEEDED with a fingerprint; existing entries are kept."""
+    if not names:
+        return
+    succeeded = (
+        select(Jobs.content_fingerprint, Jobs.fully_qualified_name, Jobs.output_uri, Jobs.duration_in_sec)
+        .where(Jobs.fully_qualified_name.in_(names))
+        .where(Jobs.state == JobStateEnum.SUCCESS)
+        .where(Jobs.content_fingerprint.is_not(None))
+    )
+    async with async_session() as session:
+        async with session.begin():
+            await session.execute(
+                pg_insert(TranscodeResults)
+                .from_select(["fingerprint", "fully_qualified_name", "output_uri", "duration_in_sec"], succeeded)
+                .on_conflict_do_nothing()
+            )
+
+
+async def async_lease_outbox(limit: int, lease_seconds: float) -> List[NotificationOutbox]:
+    """Leases the oldest undelivered outbox rows; rows leased by another drainer are skipped.
+
+    A row is held back while an older row with the same ordering key is still
+    leased, so a failed or in-flight publish cannot be overtaken.
+    """
+    earlier = aliased(NotificationOutbox)
+    blocked = (
+        select(earlier.id)
+        .where(earlier.ordering_key == NotificationOutbox.ordering_key)
+        .where(earlier.ordering_key != '')
+        .where(earlier.id < NotificationOutbox.id)
+        .where(earlier.delivered_at.is_(None))
+        .where(earlier.leased_until >= func.now())
+    )
+    due = (
+        select(NotificationOutbox.id)
+        .where(NotificationOutbox.delivered_at.is_(None))
+        .where((NotificationOutbox.leased_until.is_(None)) | (NotificationOutbox.leased_until < func.now()))
+        .where(~blocked.exists())
+        .order_by(NotificationOutbox.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    async with async_session() as session:
+        async with session.begin():
+            result = await session.execute(
+                update(NotificationOutbox)
+                .where(NotificationOutbox.id.in_(due))
+                .values(
+                    leased_until=func.now() + func.make_interval(0, 0, 0, 0, 0, 0, lease_seconds),
+                    attempts=NotificationOutbox.attempts + 1,
+                )
+                .returning(NotificationOutbox)
+                .execution_options(synchronize_session=False)
+            )
+            return sorted(result.scalars().all(), key=lambda row: row.id)
+
+
+async def async_mark_outbox_delivered(ids: Sequence[int]):
+    if not ids:
+        return
+    async with async_session() as session:
+        async with session.begin():
+            await session.execute(
+                update(NotificationOutbox)
+                .where(NotificationOutbox.id.in_(ids))
+                .values(delivered_at=func.now(), leased_until=None)
+            )
+
+
+async def async_purge_outbox(retention_hours: int) -> int:
+    """Deletes rows delivered more than ``retention_hours`` ago."""
+    async with async_session() as session:
+        async with session.begin():
+            result = await session.execute(
+                delete(NotificationOutbox)
+                .where(NotificationOutbox.delivered_at < func.now() - func.make_interval(0, 0, 0, 0, retention_hours))
+            )
+            return result.rowcount
+
+
+async def async_outbox_lag() -> dict:
+    """Number of undelivered notifications and the age of the oldest one."""
+    async with async_session() as session:
+        result = await session.execute(
+            select(
+                func.count(NotificationOutbox.id),
+                func.extract("epoch", func.now() - func.min(NotificationOutbox.created_at)),
+            ).where(NotificationOutbox.delivered_at.is_(None))
+        )
+        pending, oldest_age = result.one()
+        return {"pending": pending, "oldest_pending_age_seconds": float(oldest_age) if oldest_age else 0.0}
+
+
+def _seconds_from_now(seconds: float):
+    return func.now() + func.make_interval(0, 0, 0, 0, 0, 0, seconds)
+
+
+async def async_schedule_retry(source: str, message_id: Optional[str], payload: str, error: str,
+                               delay_seconds: float):
+    """Stores a failed job request for its first retry."""
+    async with async_session() as session:
+        async with session.begin():
+            await session.execute(insert(JobRequestRetries).values(
+                source=source,
+                message_id=message_id,
+                payload=payload,
+                attempts=1,
+                last_error=error,
+                next_attempt_at=_seconds_from_now(delay_seconds),
+            ))
+
+
+async def async_lease_due_retries(limit: int, lease_seconds: float) -> List[JobRequestRetries]:
+    """Leases retries whose next attempt is due; rows leased by another scheduler are skipped."""
+    due = (
+        select(JobRequestRetries.id)
+        .where(JobRequestRetries.next_attempt_at <= func.now())
+        .where((JobRequestRetries.leased_until.is_(None)) | (JobRequestRetries.leased_until < func.now()))
+        .order_by(JobRequestRetries.next_attempt_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    async with async_session() as session:
+        async with session.begin():
+            result = await session.execute(
+                update(JobRequestRetries)
+                .where(JobRequestRetries.id.in_(due))
+                .values(leased_until=_seconds_from_now(lease_seconds))
+                .returning(JobRequestRetries)
+                .execution_options(synchronize_session=False)
+            )
+            return list(result.scalars().all())
+
+
+async def async_complete_retry(retry_id: int):
+    async with async_session() as session:
+        async with session.begin():
+            await session.execute(delete(JobRequestRetries).where(JobRequestRetries.id == retry_id))
+
+
+async def async_reschedule_retry(retry_id: int, error: str, delay_seconds: float):
+    async with async_session() as session:
+        async with session.begin():
+            await session.execute(
+                update(JobRequestRetries)
+                .where(JobRequestRetries.id == retry_id)
+                .values(
+                    attempts=JobRequestRetries.attempts + 1,
+                    last_error=error,
+                    next_attempt_at=_seconds_from_now(delay_seconds),
+                    leased_until=None,
+                    updated_at=func.now(),
+                )
+            )
+
+
+async def async_add_dead_letter(source: str, message_id: Optional[str], payload: str, attempts: int, error: str):
+    async with async_session() as session:
+        async with session.begin():
+            await session.execute(insert(DeadLetters).values(
+                source=source, message_id=message_id, payload=payload, attempts=attempts, last_error=error))
+
+
+async def async_dead_letter_retry(retry_id: int, error: str):
+    """Moves a retry that ran out of attempts, or failed permanently, to dead_letters in one transaction."""
+    async with async_session() as session:
+        async with session.begin():
+            result = await session.execute(
+                delete(JobRequestRetries).where(JobRequestRetries.id == retry_id).returning(JobRequestRetries))
+            retry = result.scalars().first()
+            if retry is None:
+                return
+            await session.execute(insert(DeadLetters).values(
+                source=retry.source,
+                message_id=retry.message_id,
+                payload=retry.payload,
+                attempts=retry.attempts + 1,
+                last_error=error,
+            ))
+
+
+async def async_get_dead_letters(session: AsyncSession, after_id: Optional[int], limit: int,
+                                 source: Optional[str] = None) -> List[DeadLetters]:
+    """Newest first; ``after_id`` continues below the last id of the previous page."""
+    sql = select(DeadLetters).order_by(DeadLetters.id.desc()).limit(limit + 1)
+    if after_id is not None:
+        sql = sql.where(DeadLetters.id < after_id)
+    if source:
+        sql = sql.where(DeadLetters.source == source)
+    result = await session.execute(sql)
+    return list(result.scalars().all())
+
+
+async def async_replay_dead_letter(dead_letter_id: int) -> Optional[int]:
+    """Moves a dead letter back to the retry table, due immediately; returns the new retry id."""
+    async with async_session() as session:
+        async with session.begin():
+            result = await session.execute(
+                delete(DeadLetters).where(DeadLetters.id == dead_letter_id).returning(DeadLetters))
+            dead_letter = result.scalars().first()
+            if dead_letter is None:
+                return None
+            result = await session.execute(
+                insert(JobRequestRetries).values(
+                    source=dead_letter.source,
+                    message_id=dead_letter.message_id,
+                    payload=dead_letter.payload,
+                    attempts=0,
+                    last_error=dead_letter.last_error,
+                ).returning(JobRequestRetries.id)
+            )
+            return result.scalar_one()
+
+
+async def async_retry_backlog() -> dict:
+    async with async_session() as session:
+        retries = await session.execute(
+            select(func.count(JobRequestRetries.id),
+                   func.count(JobRequestRetries.id).filter(JobRequestRetries.next_attempt_at <= func.now())))
+        pending, due = retries.one()
+        dead_letters = await session.execute(select(func.count(DeadLetters.id)))
+        return {"pending_retries": pending, "due_retries": due, "dead_letters": dead_letters.scalar_one()}
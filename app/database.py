@@ -2,20 +2,33 @@
 Database Connections
 """
 
+from typing import Optional, Tuple
 from urllib.parse import quote
 
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
 from .config import settings
+from .loop_local import LoopLocal
 
 # URL-encode the password
 encoded_password = quote(settings.DB_PASSWORD)
 SQLALCHEMY_DATABASE_URL = (f"postgresql://{settings.DB_USER}:{encoded_password}@{settings.DB_HOSTNAME}:"
                            f"{settings.DB_PORT}/{settings.DB_NAME}")
+ASYNC_SQLALCHEMY_DATABASE_URL = (f"postgresql+asyncpg://{settings.DB_USER}:{encoded_password}@{settings.DB_HOSTNAME}:"
+                                 f"{settings.DB_PORT}/{settings.DB_NAME}")
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+POOL_OPTIONS = {
+    "pool_size": settings.DB_POOL_SIZE,
+    "max_overflow": settings.DB_MAX_OVERFLOW,
+    "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    "pool_recycle": settings.DB_POOL_RECYCLE,
+    "echo": settings.DB_ECHO,
+}
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **POOL_OPTIONS)
 
 # used for actually talking to the database
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -24,6 +37,44 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
 
+def _create_async_engine() -> AsyncEngine:
+    return create_async_engine(ASYNC_SQLALCHEMY_DATABASE_URL, **POOL_OPTIONS)
+
+
+async def _dispose_async_engine(async_engine: AsyncEngine) -> None:
+    await async_engine.dispose()
+
+
+# asyncpg connections belong to the loop that opened them, so the API loop and
+# each consumer runtime loop hold their own pool (DB_POOL_SIZE + DB_MAX_OVERFLOW each).
+_async_engines = LoopLocal(_create_async_engine, close=_dispose_async_engine)
+_async_sessions = LoopLocal(lambda: async_sessionmaker(bind=get_async_engine(), expire_on_commit=False))
+
+
+def get_async_engine() -> AsyncEngine:
+    """Returns the pooled async engine of the running event loop."""
+    return _async_engines.get()
+
+
+def async_session() -> AsyncSession:
+    """Opens a session on the pooled async engine of the running event loop."""
+    return _async_sessions.get()()
+
+
+def async_pool_usage() -> Optional[Tuple[int, int]]:
+    """(checked out, capacity) of the running loop's connection pool; None before it was opened."""
+    async_engine = _async_engines.peek()
+    if async_engine is None:
+        return None
+    return async_engine.pool.checkedout(), settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW
+
+
+async def dispose_async_engine() -> None:
+    """Closes the pool of the running event loop; called on shutdown."""
+    await _async_sessions.close()
+    await _async_engines.close()
+
+
 def get_db():
     """Dependency for using ORM"""
     db = SessionLocal()
@@ -31,3 +82,9 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    """Dependency for using the async ORM session"""
+    async with async_session() as session:
+        yield session
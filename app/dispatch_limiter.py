@@ -0,0 +1,174 @@
+"""
+Quota-aware rate limiting of Transcoder create_job calls
+"""
+import asyncio
+import threading
+import time
+from typing import Callable, Dict, TypeVar
+
+from google.api_core import exceptions as google_exceptions
+
+from .config import settings
+from .custom_logger import logger
+from .transcoder_locations import location_pool
+from .utils import run_blocking
+
+T = TypeVar("T")
+
+# RESOURCE_EXHAUSTED maps to ResourceExhausted, a subclass of TooManyRequests
+THROTTLE_ERRORS = (google_exceptions.TooManyRequests,)
+
+
+class TokenBucket:
+    """Paces calls to ``rate`` per second with bursts of up to ``burst``.
+
+    Callers reserve a token and sleep for the returned delay, so tokens may
+    go negative: waiting callers queue in reservation order instead of
+    failing, across every loop and thread that shares the bucket.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Takes a token and returns how many seconds to wait before using it."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"rate": self.rate, "burst": self.burst, "tokens": round(self._tokens, 2)}
+
+
+class AimdWindow:
+    """Concurrency window that grows by one per window's worth of successes and shrinks on throttling.
+
+    Throttles that land within ``cooldown`` of the last decrease come from
+    calls already in flight under the old window and do not shrink it again.
+    """
+
+    def __init__(self, initial: int, minimum: int, maximum: int, decrease_factor: float = 0.5,
+                 cooldown: float = 1.0):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease_factor = decrease_factor
+        self.cooldown = cooldown
+        self._window = float(max(minimum, min(maximum, initial)))
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+        self.increases = 0
+        self.decreases = 0
+
+    @property
+    def size(self) -> int:
+        with self._lock:
+            return int(self._window)
+
+    def on_success(self) -> None:
+        with self._lock:
+            if self._window < self.maximum:
+                self._window = min(self.maximum, self._window + 1 / self._window)
+                self.increases += 1
+
+    def on_throttle(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_decrease < self.cooldown:
+                return
+            self._window = max(self.minimum, self._window * self.decrease_factor)
+            self._last_decrease = now
+            self.decreases += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "window": int(self._window),
+                "minimum": self.minimum,
+                "maximum": self.maximum,
+                "increases": self.increases,
+                "decreases": self.decreases,
+            }
+
+
+class DispatchLimiter:
+    """Runs blocking create_job calls under the token bucket and feeds the outcome to the AIMD window.
+
+    The window itself is enforced by whoever hands out dispatch slots (the
+    dispatch scheduler); this class paces calls and, on a quota error, shrinks
+    the window and retries after a backoff. Only once ``max_retries`` is used
+    up does the error reach the caller, which then goes through the durable
+    retry path. Any callable works, so a fake client that raises
+    ResourceExhausted can stand in for the Transcoder.
+    """
+
+    def __init__(self, bucket: TokenBucket, window: AimdWindow, max_retries: int = 3, backoff: float = 2.0):
+        self.bucket = bucket
+        self.window = window
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._lock = threading.Lock()
+        self.waiting = 0
+        self.calls = 0
+        self.throttled = 0
+
+    def _add(self, counter: str, amount: int = 1) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+    async def call(self, func: Callable[..., T], *args, **kwargs) -> T:
+        attempt = 0
+        while True:
+            delay = self.bucket.reserve()
+            if delay > 0:
+                self._add("waiting")
+                try:
+                    await asyncio.sleep(delay)
+                finally:
+                    self._add("waiting", -1)
+            self._add("calls")
+            try:
+                result = await run_blocking(func, *args, **kwargs)
+            except THROTTLE_ERRORS as e:
+                self._add("throttled")
+                self.window.on_throttle()
+                attempt += 1
+                if attempt > self.max_retries:
+                    raise
+                logger.warning(f"Transcoder quota exceeded ({e}), window now {self.window.size}, "
+                               f"retry {attempt} of {self.max_retries}")
+                await asyncio.sleep(self.backoff * (2 ** (attempt - 1)))
+                continue
+            self.window.on_success()
+            return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = {"waiting_for_token": self.waiting, "calls": self.calls, "throttled": self.throttled}
+        return {**counters, "token_bucket": self.bucket.stats(), "concurrency": self.window.stats()}
+
+
+def build_dispatch_limiter() -> DispatchLimiter:
+    return DispatchLimiter(
+        TokenBucket(settings.TRANSCODER_CREATE_JOB_QPS, settings.TRANSCODER_CREATE_JOB_BURST),
+        AimdWindow(
+            initial=settings.DISPATCH_MAX_CONCURRENCY,
+            minimum=settings.DISPATCH_WINDOW_MIN,
+            maximum=settings.DISPATCH_MAX_CONCURRENCY,
+            decrease_factor=settings.DISPATCH_WINDOW_DECREASE_FACTOR,
+        ),
+        max_retries=settings.DISPATCH_THROTTLE_RETRIES,
+        backoff=settings.DISPATCH_THROTTLE_BACKOFF_SECONDS,
+    )
+
+
+# Transcoder quota is per location, so each one is paced and throttled on its own
+dispatch_limiters: Dict[str, DispatchLimiter] = {location: build_dispatch_limiter()
+                                                 for location in location_pool.locations}
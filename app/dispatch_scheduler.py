@@ -0,0 +1,185 @@
+"""
+Priority lanes in front of Transcoder job dispatch
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Dict, Optional, TypeVar
+
+from .config import settings
+from .dispatch_limiter import DispatchLimiter, dispatch_limiters
+from .utils import run_blocking
+
+T = TypeVar("T")
+
+INTERACTIVE = "interactive"
+STANDARD = "standard"
+BULK = "bulk"
+
+
+class _Lane:
+    def __init__(self, name: str, weight: int, max_concurrency: int):
+        self.name = name
+        self.weight = weight
+        self.max_concurrency = max_concurrency
+        self.waiters: deque = deque()
+        self.active = 0
+        self.served = 0
+        self.pass_value = 0.0
+        self.waits_ms: deque = deque(maxlen=1000)
+
+
+class DispatchScheduler:
+    """Weighted fair share of a global dispatch budget across priority lanes.
+
+    At most ``max_concurrency`` dispatches run at once, and each lane at most
+    its own cap. When a slot frees up, the waiting lane that has used the
+    least of its share (stride scheduling on ``1 / weight``) goes next, so a
+    flood of bulk jobs cannot hold back interactive ones while bulk still
+    makes progress. Callers on any event loop or thread share one scheduler.
+
+    ``limiters`` holds a DispatchLimiter per Transcoder location. Dispatches
+    to a location run at most its adaptive concurrency window at once and are
+    paced by its token bucket, so quota throttling in one location slows only
+    the jobs sent there; a lane whose next job targets a saturated location
+    lets its later jobs for other locations go first.
+    """
+
+    def __init__(self, lanes: Dict[str, tuple], max_concurrency: int,
+                 limiters: Optional[Dict[str, DispatchLimiter]] = None):
+        self.max_concurrency = max_concurrency
+        self.limiters = limiters or {}
+        self._lanes = {name: _Lane(name, weight, cap) for name, (weight, cap) in lanes.items()}
+        self._active = 0
+        self._location_active: Dict[Optional[str], int] = {}
+        self._virtual_time = 0.0
+        self._lock = threading.Lock()
+
+    def lane(self, name: Optional[str], default: str) -> str:
+        """The lane a request asked for, or ``default`` when it did not pick a known one."""
+        return name if name in self._lanes else default
+
+    @asynccontextmanager
+    async def slot(self, lane_name: str, location: Optional[str] = None) -> AsyncIterator[None]:
+        lane = self._lanes[lane_name]
+        granted: Future = Future()
+        with self._lock:
+            if not lane.waiters:
+                # A lane that was idle does not bank credit for the time it was idle
+                lane.pass_value = max(lane.pass_value, self._virtual_time)
+            lane.waiters.append((granted, time.perf_counter(), location))
+            self._dispatch()
+        try:
+            await asyncio.wrap_future(granted)
+        except asyncio.CancelledError:
+            if granted.done() and not granted.cancelled():
+                self._release(lane, location)
+            raise
+        try:
+            yield
+        finally:
+            self._release(lane, location)
+
+    async def run(self, lane_name: str, location: Optional[str], func: Callable[..., T], *args, **kwargs) -> T:
+        """Runs a blocking dispatch call to ``location`` off the loop once the lane gets a slot."""
+        async with self.slot(lane_name, location):
+            limiter = self.limiters.get(location)
+            if limiter is not None:
+                return await limiter.call(func, *args, **kwargs)
+            return await run_blocking(func, *args, **kwargs)
+
+    def _capacity(self) -> int:
+        if not self.limiters:
+            return self.max_concurrency
+        return min(self.max_concurrency, sum(limiter.window.size for limiter in self.limiters.values()))
+
+    def _has_room(self, location: Optional[str]) -> bool:
+        limiter = self.limiters.get(location)
+        return limiter is None or self._location_active.get(location, 0) < limiter.window.size
+
+    def _release(self, lane: _Lane, location: Optional[str]) -> None:
+        with self._lock:
+            lane.active -= 1
+            self._active -= 1
+            self._location_active[location] -= 1
+            self._dispatch()
+
+    def _next_waiter(self, lane: _Lane) -> Optional[int]:
+        """Index of the lane's oldest waiter whose location has room."""
+        for index, (_, _, location) in enumerate(lane.waiters):
+            if self._has_room(location):
+                return index
+        return None
+
+    def _dispatch(self) -> None:
+        # Caller holds self._lock
+        while self._active < self.max_concurrency:
+            ready = []
+            for lane in self._lanes.values():
+                if lane.waiters and lane.active < lane.max_concurrency:
+                    index = self._next_waiter(lane)
+                    if index is not None:
+                        ready.append((lane, index))
+            if not ready:
+                return
+            lane, index = min(ready, key=lambda candidate: candidate[0].pass_value)
+            granted, enqueued_at, location = lane.waiters[index]
+            del lane.waiters[index]
+            if not granted.set_running_or_notify_cancel():
+                continue
+            lane.active += 1
+            lane.served += 1
+            self._active += 1
+            self._location_active[location] = self._location_active.get(location, 0) + 1
+            self._virtual_time = lane.pass_value
+            lane.pass_value += 1 / lane.weight
+            lane.waits_ms.append((time.perf_counter() - enqueued_at) * 1000)
+            granted.set_result(None)
+
+    def lane_headroom(self, lane_name: str) -> int:
+        """Slots ``lane_name`` can still count on, less the requests already queued in it.
+
+        Other lanes' backlogs only lower this down to the lane's weighted share
+        of the budget, because the scheduler serves busy lanes by weight.
+        """
+        with self._lock:
+            lane = self._lanes[lane_name]
+            busy = [other for other in self._lanes.values() if other is lane or other.active or other.waiters]
+            share = self._capacity() * lane.weight / sum(other.weight for other in busy)
+            return min(lane.max_concurrency, max(1, int(share))) - lane.active - len(lane.waiters)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lanes = {}
+            for lane in self._lanes.values():
+                waits = sorted(lane.waits_ms)
+                lanes[lane.name] = {
+                    "weight": lane.weight,
+                    "max_concurrency": lane.max_concurrency,
+                    "queued": len(lane.waiters),
+                    "active": lane.active,
+                    "served": lane.served,
+                    "wait_ms_p50": waits[int(len(waits) * 0.50)] if waits else None,
+                    "wait_ms_p95": waits[min(len(waits) - 1, int(len(waits) * 0.95))] if waits else None,
+                    "wait_ms_max": waits[-1] if waits else None,
+                }
+            summary = {"max_concurrency": self.max_concurrency, "capacity": self._capacity(),
+                       "active": self._active, "lanes": lanes}
+        if self.limiters:
+            summary["locations"] = {location: {"active": self._location_active.get(location, 0), **limiter.stats()}
+                                    for location, limiter in self.limiters.items()}
+        return summary
+
+
+dispatch_scheduler = DispatchScheduler(
+    {
+        INTERACTIVE: (settings.DISPATCH_INTERACTIVE_WEIGHT, settings.DISPATCH_INTERACTIVE_MAX_CONCURRENCY),
+        STANDARD: (settings.DISPATCH_STANDARD_WEIGHT, settings.DISPATCH_STANDARD_MAX_CONCURRENCY),
+        BULK: (settings.DISPATCH_BULK_WEIGHT, settings.DISPATCH_BULK_MAX_CONCURRENCY),
+    },
+    max_concurrency=settings.DISPATCH_MAX_CONCURRENCY,
+    limiters=dispatch_limiters,
+)
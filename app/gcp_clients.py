@@ -0,0 +1,52 @@
+"""
+Application-scoped Google Cloud clients, built once from one set of credentials
+"""
+from google.cloud import pubsub_v1, secretmanager, storage
+from google.cloud.video.transcoder_v1.services.transcoder_service import (
+    TranscoderServiceClient,
+)
+from google.oauth2 import service_account
+
+from .config import settings
+from .custom_logger import logger
+from .storage_uris import StorageUriValidator
+
+
+class GCPClients:
+    """Long-lived clients shared by the API handlers and the consumers.
+
+    Each client keeps its own connection pool / gRPC channel, so building them
+    once avoids re-reading the service account file and re-doing TLS and
+    channel setup for every job. All of these clients are thread-safe.
+    """
+
+    def __init__(self, credentials: service_account.Credentials):
+        self.credentials = credentials
+        self.storage = storage.Client(project=credentials.project_id, credentials=credentials)
+        self.storage_uris = StorageUriValidator(self.storage, ttl=settings.STORAGE_EXISTS_CACHE_TTL_SECONDS)
+        self.secret_manager = secretmanager.SecretManagerServiceClient(credentials=credentials)
+        # Batched, and ordered per ordering key so notifications of one content arrive in order
+        self.publisher = pubsub_v1.PublisherClient(
+            batch_settings=pubsub_v1.types.BatchSettings(
+                max_messages=settings.PUBLISH_BATCH_MAX_MESSAGES,
+                max_bytes=settings.PUBLISH_BATCH_MAX_BYTES,
+                max_latency=settings.PUBLISH_BATCH_MAX_LATENCY_SECONDS,
+            ),
+            publisher_options=pubsub_v1.types.PublisherOptions(enable_message_ordering=True),
+            credentials=credentials,
+        )
+        self.subscriber = pubsub_v1.SubscriberClient(credentials=credentials)
+        self.transcoder = TranscoderServiceClient(credentials=credentials)
+
+    @classmethod
+    def from_service_account_file(cls, path: str) -> "GCPClients":
+        credentials = service_account.Credentials.from_service_account_file(path)
+        logger.info(f"Loaded GCP credentials from {path}")
+        return cls(credentials)
+
+    def close(self) -> None:
+        self.subscriber.close()
+        self.publisher.stop()
+        self.transcoder.transport.close()
+        self.secret_manager.transport.close()
+        self.storage.close()
@@ -1,6 +1,5 @@
 import json
 import os
-import requests
 from google.cloud import secretmanager
 from google.cloud.video import transcoder_v1
 from google.protobuf import duration_pb2 as duration
@@ -372,18 +371,30 @@ def create_encryption(
     return encryption
 
 
-def create_secret(value):
-    if value is None:
-        return 0
-
-    # Initialize the client.
+def build_job_config(
+        video_quality: list[int],
+        audio_quality: list[int],
+        drm_type: list[str],
+        manifast_type: list[str],
+        version: int,
+        image_uri: str
+) -> transcoder_v1.types.JobConfig:
+    """Builds the full ad-hoc JobConfig for a rendition / DRM / manifest combination."""
+    return transcoder_v1.types.JobConfig(
+        elementary_streams=create_elementary_streams(video_quality, audio_quality),
+        encryptions=create_encryption(drm_type, version),
+        mux_streams=create_mux_stream(drm_type, video_quality, audio_quality),
+        manifests=create_manifest(drm_type, video_quality, audio_quality, manifast_type),
+        overlays=create_overlay(image_uri),
+        pubsub_destination=transcoder_v1.types.PubsubDestination(
+            topic=f"projects/{settings.PROJECT_NAME}/topics/{settings.JOB_COMPLETION_TOPIC}",
+        ),
+    )
 
-    # for local & dev
-    #client = secretmanager.SecretManagerServiceClient().from_service_account_file('./key_stage.json')
-    client = secretmanager.SecretManagerServiceClient().from_service_account_file('./key.json')
 
-    # for stage and prod
-    # client = secretmanager.SecretManagerServiceClient()
+def create_secret(client: secretmanager.SecretManagerServiceClient, value):
+    if value is None:
+        return 0
 
     # Build the parent secret name.
     parent = f"projects/{settings.PROJECT_ID}/secrets/{settings.SECRET_ID}"
@@ -402,9 +413,8 @@ def create_secret(value):
     return version_number
 
 
-def delete_secret(version_number):
+def delete_secret(client: secretmanager.SecretManagerServiceClient, version_number):
     print(version_number)
-    client = secretmanager.SecretManagerServiceClient().from_service_account_file('./key.json')
 
     version_name = f"projects/{settings.PROJECT_ID}/secrets/{settings.SECRET_ID}/versions/{version_number}"
 
@@ -412,7 +422,7 @@ def delete_secret(version_number):
 
     logger.info(f"Destroyed secret version: {response}")
 
-def get_secret_from_key_server(
+async def get_secret_from_key_server(
         content_id: str,
         package_id: str,
         provider_id: str,
@@ -425,7 +435,7 @@ def get_secret_from_key_server(
         return None
     encryption_keys = []
     # keys = get_keys(video_quality, audio_quality, drm_type)
-    keys = call_key_server(package_id, content_id, provider_id, video_quality, audio_quality, drm_type)
+    keys = await call_key_server(package_id, content_id, provider_id, video_quality, audio_quality, drm_type)
     for item in keys:
         for key, value in item.items():
             if key == "AUDIO":
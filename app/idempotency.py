@@ -0,0 +1,156 @@
+"""
+De-duplication of job dispatches across Pub/Sub redeliveries
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from .config import settings
+from .crud import async_claim_dispatch, async_mark_dispatched, async_purge_dispatch_claims, async_release_dispatch_claim
+from .custom_logger import logger
+from .exceptions import CustomException
+from .schemas import AdocJobRequest
+
+
+def request_fingerprint(request: AdocJobRequest) -> str:
+    """Stable hash of everything that determines the Transcoder job a request produces.
+
+    The lane is left out. So is the job's name for storage-triggered requests:
+    triggers name jobs after the time they ran, and the input's generation
+    identifies the upload instead. A job_request naming a new job is a new
+    job, even for an input and config transcoded before.
+    """
+    exclude = {"priority"}
+    if request.input_generation is not None:
+        exclude.add("custom_name")
+    payload = request.model_dump(exclude=exclude)
+    for field in ("video_quality", "audio_quality", "drm_type", "manifast_type"):
+        payload[field] = sorted(set(payload[field] or ()))
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class DispatchClaimHeld(CustomException):
+    """Another worker holds a live claim on the request; retried once that claim's lease has run out.
+
+    The holder may still be dispatching, or may have died; either way the
+    request must come back rather than be acked as a duplicate.
+    """
+
+    def __init__(self, fingerprint: str, retry_after: float):
+        super().__init__(code=503, status_code=20503,
+                         detail=f"Dispatch of {fingerprint} is claimed by another worker")
+        self.retry_after = retry_after
+
+
+class DispatchDeduplicator:
+    """Decides whether a job request may be dispatched, at most once per message and per fingerprint.
+
+    Keys of requests this process dispatched sit in a bounded LRU, so
+    redeliveries are skipped without a database round trip. Otherwise a claim
+    row is inserted with ON CONFLICT DO NOTHING, which settles races between
+    processes and between concurrent deliveries of the same message. A claim
+    held past ``lease_seconds`` without being marked dispatched can be taken
+    over; dispatched claims are purged after ``retention_hours``.
+    """
+
+    def __init__(self, maxsize: int = 10000, lease_seconds: float = 900.0, retention_hours: int = 168):
+        self.maxsize = maxsize
+        self.lease_seconds = lease_seconds
+        self.retention_hours = retention_hours
+        self._seen: "OrderedDict[str, None]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_purge = 0.0
+        self.claimed = 0
+        self.skipped_memory = 0
+        self.skipped_db = 0
+        self.held = 0
+
+    @staticmethod
+    def _keys(message_id: Optional[str], fingerprint: str) -> list:
+        keys = [f"fp:{fingerprint}"]
+        if message_id:
+            keys.append(f"msg:{message_id}")
+        return keys
+
+    def _remember(self, keys: list) -> None:
+        with self._lock:
+            for key in keys:
+                self._seen[key] = None
+                self._seen.move_to_end(key)
+            while len(self._seen) > self.maxsize:
+                self._seen.popitem(last=False)
+
+    def _forget(self, keys: list) -> None:
+        with self._lock:
+            for key in keys:
+                self._seen.pop(key, None)
+
+    async def claim(self, message_id: Optional[str], fingerprint: str, custom_name: Optional[str]) -> bool:
+        """True when this call took the claim, False when the request was already dispatched.
+
+        Raises DispatchClaimHeld while another worker's claim is still leased.
+        """
+        keys = self._keys(message_id, fingerprint)
+        with self._lock:
+            if any(key in self._seen for key in keys):
+                self.skipped_memory += 1
+                return False
+
+        await self._purge_hourly()
+        # Nothing is remembered yet: a claim held elsewhere may still be released after a failed dispatch
+        state = await async_claim_dispatch(message_id, fingerprint, custom_name, self.lease_seconds)
+        with self._lock:
+            if state is None:
+                self.claimed += 1
+            elif state == 'dispatched':
+                self.skipped_db += 1
+            else:
+                self.held += 1
+        if state == 'claimed':
+            raise DispatchClaimHeld(fingerprint, retry_after=self.lease_seconds)
+        return state is None
+
+    async def mark_dispatched(self, message_id: Optional[str], fingerprint: str) -> None:
+        """Keeps the claim of a request whose dispatch succeeded, so later deliveries are skipped for good."""
+        await async_mark_dispatched(fingerprint)
+        self._remember(self._keys(message_id, fingerprint))
+
+    async def release(self, message_id: Optional[str], fingerprint: str) -> None:
+        """Gives up a claim after a failed dispatch, so the next delivery is processed again."""
+        self._forget(self._keys(message_id, fingerprint))
+        await async_release_dispatch_claim(fingerprint)
+
+    async def _purge_hourly(self) -> None:
+        with self._lock:
+            if time.monotonic() - self._last_purge < 3600:
+                return
+            self._last_purge = time.monotonic()
+        try:
+            purged = await async_purge_dispatch_claims(self.retention_hours)
+        except Exception as e:
+            logger.error(f"Purging dispatch claims failed: {e}")
+            return
+        if purged:
+            logger.info(f"Purged {purged} dispatch claims")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._seen),
+                "maxsize": self.maxsize,
+                "claimed": self.claimed,
+                "skipped_memory": self.skipped_memory,
+                "skipped_db": self.skipped_db,
+                "held": self.held,
+            }
+
+
+dispatch_deduplicator = DispatchDeduplicator(
+    maxsize=settings.DISPATCH_DEDUP_CACHE_SIZE,
+    lease_seconds=settings.DISPATCH_CLAIM_LEASE_SECONDS,
+    retention_hours=settings.DISPATCH_CLAIM_RETENTION_HOURS,
+)
@@ -0,0 +1,102 @@
+"""
+Bounded LRU of compiled Transcoder JobConfigs
+"""
+import threading
+from collections import OrderedDict
+from typing import Iterable, Optional, Tuple
+
+from google.cloud.video import transcoder_v1
+
+from .config import settings
+from .gcp_utils import build_job_config
+
+JobConfigKey = Tuple[tuple, tuple, tuple, tuple, str, Optional[str]]
+
+
+def _normalize(values: Optional[Iterable]) -> tuple:
+    # The config builders only test membership, so order and duplicates don't matter
+    return tuple(sorted(set(values or ())))
+
+
+def job_config_key(
+        video_quality: list[int],
+        audio_quality: list[int],
+        drm_type: list[str],
+        manifast_type: list[str],
+        version: int,
+        image_uri: Optional[str]
+) -> JobConfigKey:
+    return (
+        _normalize(video_quality),
+        _normalize(audio_quality),
+        _normalize(drm_type),
+        _normalize(manifast_type),
+        str(version),
+        image_uri,
+    )
+
+
+class JobConfigCache:
+    """Hands out copies of prebuilt JobConfigs keyed by their normalized inputs.
+
+    Nearly every job uses one of a handful of ladder / DRM / manifest
+    combinations, so the protobuf tree is built once per combination and
+    copied afterwards. Callers may mutate the returned copy freely.
+    """
+
+    def __init__(self, maxsize: int = 64):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._configs: "OrderedDict[JobConfigKey, transcoder_v1.types.JobConfig]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(
+            self,
+            video_quality: list[int],
+            audio_quality: list[int],
+            drm_type: list[str],
+            manifast_type: list[str],
+            version: int,
+            image_uri: Optional[str]
+    ) -> transcoder_v1.types.JobConfig:
+        key = job_config_key(video_quality, audio_quality, drm_type, manifast_type, version, image_uri)
+        with self._lock:
+            config = self._configs.get(key)
+            if config is not None:
+                self._configs.move_to_end(key)
+                self.hits += 1
+        if config is None:
+            video, audio, drm, manifests, _, _ = key
+            config = build_job_config(list(video), list(audio), list(drm), list(manifests), version, image_uri)
+            with self._lock:
+                self.misses += 1
+                self._configs[key] = config
+                self._configs.move_to_end(key)
+                while len(self._configs) > self.maxsize:
+                    self._configs.popitem(last=False)
+        return self._copy(config)
+
+    @staticmethod
+    def _copy(config: transcoder_v1.types.JobConfig) -> transcoder_v1.types.JobConfig:
+        pb = transcoder_v1.types.JobConfig.pb()()
+        pb.CopyFrom(transcoder_v1.types.JobConfig.pb(config))
+        return transcoder_v1.types.JobConfig.wrap(pb)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._configs.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._configs),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+job_config_cache = JobConfigCache(maxsize=settings.JOB_CONFIG_CACHE_SIZE)
@@ -0,0 +1,244 @@
+"""
+Pooled async client for the DRM key server
+"""
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+import httpx
+from cachetools import TTLCache
+
+from .config import settings
+from .custom_logger import logger
+from .exceptions import CustomException
+from .loop_local import LoopLocal
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class KeyServerClient:
+    """Keep-alive HTTP client for the key server with timeouts, retries and a concurrency cap.
+
+    Transport errors, timeouts and 429/5xx responses are retried up to
+    ``max_retries`` times with jittered exponential backoff; any other status
+    is returned to the caller. httpx clients and semaphores are loop-bound, so
+    each event loop gets its own connection pool and its own ``max_concurrency``
+    slots.
+    """
+
+    def __init__(
+            self,
+            base_url: str,
+            connect_timeout: float = 3.0,
+            read_timeout: float = 10.0,
+            max_retries: int = 3,
+            backoff_base: float = 0.2,
+            max_concurrency: int = 10,
+            max_connections: int = 20,
+            transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.base_url = base_url
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self._timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self._limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        # Only set to stand in a stub key server
+        self._transport = transport
+        self._http = LoopLocal(self._create_http_client, close=lambda client: client.aclose())
+        self._slots = LoopLocal(lambda: asyncio.Semaphore(max_concurrency))
+
+        self._metrics_lock = threading.Lock()
+        self._requests = 0
+        self._failures = 0
+        self._retries = 0
+        self._latencies_ms = deque(maxlen=1000)
+        self._recent = deque(maxlen=1000)
+
+    @classmethod
+    def from_settings(cls) -> "KeyServerClient":
+        return cls(
+            settings.KEY_SERVER_URL,
+            connect_timeout=settings.KEY_SERVER_CONNECT_TIMEOUT,
+            read_timeout=settings.KEY_SERVER_READ_TIMEOUT,
+            max_retries=settings.KEY_SERVER_MAX_RETRIES,
+            backoff_base=settings.KEY_SERVER_BACKOFF_BASE,
+            max_concurrency=settings.KEY_SERVER_MAX_CONCURRENCY,
+            max_connections=settings.KEY_SERVER_MAX_CONNECTIONS,
+        )
+
+    def _create_http_client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(timeout=self._timeout, limits=self._limits, transport=self._transport)
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter: spreads retries of concurrent callers apart
+        return random.uniform(0, self.backoff_base * (2 ** attempt))
+
+    async def post(self, payload: dict, path: str = "") -> httpx.Response:
+        """POSTs JSON to ``base_url + path``, retrying transient failures."""
+        url = f"{self.base_url}{path}"
+        async with self._slots.get():
+            attempt = 0
+            while True:
+                start = time.perf_counter()
+                try:
+                    response = await self._http.get().post(url, json=payload)
+                except httpx.TransportError as e:
+                    response, error = None, e
+                else:
+                    error = None
+                self._record(time.perf_counter() - start)
+
+                retryable = error is not None or response.status_code in RETRYABLE_STATUS_CODES
+                if not retryable or attempt >= self.max_retries:
+                    break
+                delay = self._backoff(attempt)
+                attempt += 1
+                with self._metrics_lock:
+                    self._retries += 1
+                logger.warning(f"Key server attempt {attempt} failed "
+                               f"({error or response.status_code}), retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+        if error is not None:
+            with self._metrics_lock:
+                self._failures += 1
+            logger.error(f"Key server unreachable: {error}")
+            raise CustomException(code=503, status_code=20503, detail=f"Key server unreachable: {error}")
+        if response.status_code >= 400:
+            with self._metrics_lock:
+                self._failures += 1
+        return response
+
+    def _record(self, seconds: float):
+        with self._metrics_lock:
+            self._requests += 1
+            self._latencies_ms.append(seconds * 1000)
+            self._recent.append((time.monotonic(), seconds * 1000))
+
+    def recent_latency_ms(self, window: float = 30.0) -> Optional[float]:
+        """p95 latency of the calls made in the last ``window`` seconds; None when there were none."""
+        cutoff = time.monotonic() - window
+        with self._metrics_lock:
+            latencies = sorted(ms for at, ms in self._recent if at >= cutoff)
+        return _percentile(latencies, 0.95)
+
+    async def close(self) -> None:
+        """Closes the connection pool of the running loop."""
+        await self._http.close()
+
+    def metrics(self) -> dict:
+        with self._metrics_lock:
+            latencies = sorted(self._latencies_ms)
+            return {
+                "requests": self._requests,
+                "failures": self._failures,
+                "retries": self._retries,
+                "latency_ms_p50": _percentile(latencies, 0.50),
+                "latency_ms_p95": _percentile(latencies, 0.95),
+                "latency_ms_max": latencies[-1] if latencies else None,
+            }
+
+
+KeyRequest = Tuple[str, str, str, Tuple[str, ...], Tuple[str, ...]]
+
+
+class _FetchAbandoned(Exception):
+    """The shared fetch was cancelled before it finished; waiters look up again."""
+
+
+class KeyResponseCache:
+    """Size-bounded TTL cache in front of the key server, with single-flight fetches.
+
+    Entries live in process memory only and expire after ``ttl`` seconds.
+    Concurrent lookups of the same request, from any event loop, share one
+    in-flight fetch instead of each calling the key server. Failures are not
+    cached.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300):
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._in_flight: Dict[KeyRequest, Future] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    @staticmethod
+    def key(package_id: str, content_id: str, provider_id: str, quality: list, drm_scheme: list) -> KeyRequest:
+        return package_id, content_id, provider_id, tuple(quality), tuple(drm_scheme)
+
+    async def get_or_fetch(self, key: KeyRequest, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        while True:
+            with self._lock:
+                if key in self._entries:
+                    self.hits += 1
+                    return self._entries[key]
+                in_flight = self._in_flight.get(key)
+                if in_flight is None:
+                    self.misses += 1
+                    in_flight = self._in_flight[key] = Future()
+                    owner = True
+                else:
+                    self.coalesced += 1
+                    owner = False
+
+            if owner:
+                # The fetch belongs to the cache, not the caller: a cancelled caller (e.g. a sibling
+                # pipeline stage failed) leaves it running for everyone else waiting on it.
+                task = asyncio.ensure_future(fetch())
+                task.add_done_callback(partial(self._settle, key, in_flight))
+                return await asyncio.shield(task)
+            try:
+                return await asyncio.wrap_future(in_flight)
+            except _FetchAbandoned:
+                # The fetch itself was cancelled (its loop shut down); look up again, possibly as the owner
+                continue
+
+    def _settle(self, key: KeyRequest, in_flight: Future, task: asyncio.Task) -> None:
+        error = None if task.cancelled() else task.exception()
+        with self._lock:
+            self._in_flight.pop(key, None)
+            if not task.cancelled() and error is None:
+                self._entries[key] = task.result()
+        if task.cancelled():
+            in_flight.set_exception(_FetchAbandoned())
+        elif error is not None:
+            in_flight.set_exception(error)
+        else:
+            in_flight.set_result(task.result())
+
+    def invalidate(self, key: KeyRequest) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "size": len(self._entries),
+                "maxsize": self._entries.maxsize,
+                "ttl_seconds": self._entries.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+            }
+
+
+def _percentile(values: list, fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+key_server_client = KeyServerClient.from_settings()
+key_response_cache = KeyResponseCache(maxsize=settings.KEY_CACHE_MAX_SIZE, ttl=settings.KEY_CACHE_TTL_SECONDS)
@@ -0,0 +1,58 @@
+"""
+Per-event-loop holder for loop-bound resources
+"""
+import asyncio
+import threading
+import weakref
+from typing import Awaitable, Callable, Generic, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+_registry: List["LoopLocal"] = []
+
+
+class LoopLocal(Generic[T]):
+    """Lazily creates one instance of a resource for each running event loop.
+
+    asyncpg pools, httpx clients and asyncio primitives may only be used from
+    the loop that created them. The API and every consumer runtime run their
+    own loop, so each of them gets its own long-lived instance here.
+    """
+
+    def __init__(self, factory: Callable[[], T], close: Optional[Callable[[T], Awaitable[None]]] = None):
+        self._factory = factory
+        self._close = close
+        self._instances = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def get(self) -> T:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            instance = self._instances.get(loop)
+            if instance is None:
+                instance = self._factory()
+                self._instances[loop] = instance
+            return instance
+
+    def peek(self) -> Optional[T]:
+        """Returns the instance of the running loop without creating one."""
+        with self._lock:
+            return self._instances.get(asyncio.get_running_loop())
+
+    def instances(self) -> List[T]:
+        with self._lock:
+            return list(self._instances.values())
+
+    async def close(self) -> None:
+        """Closes and forgets the instance that belongs to the running loop."""
+        with self._lock:
+            instance = self._instances.pop(asyncio.get_running_loop(), None)
+        if instance is not None and self._close is not None:
+            await self._close(instance)
+
+
+async def close_loop_resources() -> None:
+    """Closes every loop-local resource of the running loop, newest first."""
+    for holder in reversed(_registry):
+        await holder.close()
@@ -1,82 +1,48 @@
 """
 Main Application File for our FastApi Server
 """
-import asyncio
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
-from google.cloud import pubsub_v1
-from google.cloud.video.transcoder_v1.services.transcoder_service import (
-    TranscoderServiceClient,
-)
-from google.oauth2 import service_account
 
-from app.consumers.job_completion import consume_message_on_job_completion
-from app.consumers.process_cloud_storage_trigger import process_cloud_storage_trigger
-from . import models
 from .config import settings
-from .consumers.job_request import consume_job_request
-from .database import engine
+from .database import get_async_engine
 from .exceptions import CustomException
-from .routers import job, job_template
+from .gcp_clients import GCPClients
+from .loop_local import close_loop_resources
+from .routers import dead_letters, job, job_template, metrics
+from .worker import CONSUMERS, start_consumers, stop_consumers
 
 @asynccontextmanager
 async def app_lifespan(application: FastAPI):
     # application.state.super_secret = secrets.token_hex(16)
     print("within lifespan context")
-    #credentials = service_account.Credentials.from_service_account_file('./key_stage.json')
-    credentials = service_account.Credentials.from_service_account_file('./key.json')
-    # credentials = None
-    # application.state.credentials = credentials
-
-    transcoder_client = TranscoderServiceClient(credentials=credentials)
-    # transcoder_client = TranscoderServiceClient()
-
-    application.state.transcoder_client = transcoder_client
-
-
-    # Initialize the subscriber client
-
-    subscriber = pubsub_v1.SubscriberClient(credentials=credentials)
-    # subscriber = pubsub_v1.SubscriberClient()
-
-    subscription_path_job_request = subscriber.subscription_path(settings.PROJECT_NAME,
-                                                                 settings.JOB_REQUEST_SUBSCRIPTION_ID)
-    subscription_path = subscriber.subscription_path(settings.PROJECT_NAME, settings.JOB_COMPLETION_SUBSCRIPTION_ID)
+    # One set of credentials and long-lived clients for the whole process
+    gcp_clients = GCPClients.from_service_account_file(settings.SERVICE_ACCOUNT_FILE)
+    application.state.gcp_clients = gcp_clients
 
-    trigger_path = subscriber.subscription_path(settings.PROJECT_NAME_TOFFEE, settings.CLOUD_STORAGE_TRIGGER_SUBSCRIPTION)
+    # Pooled async engine for the API loop; consumer loops open their own on first use.
+    get_async_engine()
 
-    # Start the background task to consume messages
-    task_listen_for_job_request = asyncio.create_task(
-        consume_job_request(subscriber, subscription_path_job_request, credentials, transcoder_client))
-    task_listen_for_trigger_request = asyncio.create_task(
-        process_cloud_storage_trigger(subscriber, trigger_path, credentials, transcoder_client))
-    task_job_completion_sub = asyncio.create_task(
-        consume_message_on_job_completion(transcoder_client, subscriber, subscription_path, credentials))
-    print("Started the background task to consume messages")
+    # Subscribers, outbox drainer and retry scheduler; with RUN_CONSUMERS=false they run in app.worker instead
+    background_tasks = start_consumers(gcp_clients, CONSUMERS) if settings.RUN_CONSUMERS else {}
     try:
         print("before yield")
         yield  # Application is running
         print("after yield")
     finally:
         print("within finally")
-        task_listen_for_job_request.cancel()
-        task_job_completion_sub.cancel()
-        task_listen_for_trigger_request.cancel()
-        try:
-            # await task_job_completion_sub  # Wait for the task cancellation to complete
-            await asyncio.gather(task_listen_for_job_request, task_job_completion_sub,
-                                 task_listen_for_trigger_request, return_exceptions=True)
-        except asyncio.CancelledError:
-            print("Task was cancelled.")
-        subscriber.close()
+        await stop_consumers(background_tasks)
+        gcp_clients.close()
+        # Engine pool and key-server connections of the API loop
+        await close_loop_resources()
 
 
 app = FastAPI(lifespan=app_lifespan)
 # app = FastAPI()
 
-models.Base.metadata.create_all(bind=engine)
+# The schema is managed by Alembic: run `alembic upgrade head` before starting the app.
 
 # @app.on_event("startup")
 # async def startup_event():
@@ -108,6 +74,8 @@ app.add_middleware(
 
 app.include_router(job.router)
 app.include_router(job_template.router)
+app.include_router(metrics.router)
+app.include_router(dead_letters.router)
 
 @app.exception_handler(CustomException)
 def custom_exception_handler(request: Request, exc: CustomException):
@@ -1,13 +1,15 @@
+from typing import Optional
+
 from .config import settings
 from .models import Jobs
 from .schemas import JobRequest, AdocJobRequest
 from .utils import JobStatusEnum, JobStateEnum
 
 
-def map_into_create_job(request: AdocJobRequest) -> Jobs:
+def map_into_create_job(request: AdocJobRequest, location: Optional[str] = None) -> Jobs:
     return Jobs(
         project_id=settings.PROJECT_ID,
-        location=settings.LOCATION,
+        location=location or settings.LOCATION,
         content_id=request.content_id,
         provider_id=request.provider_id,
         package_id= request.package_id,
@@ -2,7 +2,7 @@
 This File is used to store models for our ORM Models, For Postgres Database
 """
 from typing import Hashable
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, Enum, DateTime
+from sqlalchemy import BigInteger, Column, Integer, String, Boolean, ForeignKey, Enum, DateTime, Index, Numeric, Text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql.expression import text
 from sqlalchemy.sql.sqltypes import TIMESTAMP
@@ -74,7 +74,7 @@ class Jobs(Base):
     __tablename__ = "jobs"
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
-    job_id = Column(String)
+    job_id = Column(String, index=True)
     project_id = Column(String)
     template_id = Column(String)
     package_id = Column(String)
@@ -82,13 +82,18 @@ class Jobs(Base):
     provider_id = Column(String)
     description = Column(String)
     custom_name = Column(String, unique=True)
-    fully_qualified_name = Column(String)
+    fully_qualified_name = Column(String, index=True)
     location = Column(String)
     input_uri = Column(String)
     output_uri = Column(String)
     created_by = Column(String)
     version = Column(Integer)
-    duration_in_sec = Column(String)
+    # Seconds of input video, from the dispatch response or the completion payload
+    duration_in_sec = Column(Numeric(12, 3, asdecimal=False))
+    # Source object generation + job config; see app/transcode_reuse.py
+    content_fingerprint = Column(String)
+    # Job whose output was copied instead of transcoding again
+    reused_from = Column(String)
     status = Column(Enum(JobStatusEnum), default=JobStatusEnum.WAITING)
     state = Column(Enum(JobStateEnum), default=JobStateEnum.INIT)
     created_at = Column(TIMESTAMP(timezone=True),
@@ -97,6 +102,12 @@ class Jobs(Base):
                         nullable=False, server_default=text('now()'))
 
 
+# Listings filter by status and read the most recently updated jobs first
+Index("ix_jobs_status_updated_at", Jobs.status, Jobs.updated_at.desc())
+# Keyset pagination cursor of /job/list: (updated_at, id) descending
+Index("ix_jobs_updated_at_id", Jobs.updated_at.desc(), Jobs.id.desc())
+
+
 class JobTemplates(Base):
     __tablename__ = 'job_templates'
 
@@ -116,3 +127,97 @@ class JobTemplates(Base):
                         nullable=False, server_default=text('now()'))
     updated_at = Column(TIMESTAMP(timezone=True),
                         nullable=False, server_default=text('now()'))
+
+
+class DispatchClaims(Base):
+    """One row per job request that was taken for dispatch to the Transcoder.
+
+    Inserted with ON CONFLICT DO NOTHING before the Transcoder is called, so a
+    redelivered Pub/Sub message or a repeated request finds the claim and is
+    skipped instead of starting a second transcode. A row is 'claimed' while
+    its dispatch runs and 'dispatched' once it succeeded; a 'claimed' row whose
+    lease ran out belongs to a worker that died and may be taken over.
+    """
+    __tablename__ = 'dispatch_claims'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    message_id = Column(String, unique=True)
+    fingerprint = Column(String, nullable=False, unique=True)
+    custom_name = Column(String)
+    state = Column(String, nullable=False, server_default='claimed')
+    leased_until = Column(TIMESTAMP(timezone=True))
+    dispatched_at = Column(TIMESTAMP(timezone=True))
+    created_at = Column(TIMESTAMP(timezone=True),
+                        nullable=False, server_default=text('now()'))
+
+
+class TranscodeResults(Base):
+    """Output of a SUCCEEDED transcode, keyed by the fingerprint of its source object and job config."""
+    __tablename__ = 'transcode_results'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    fingerprint = Column(String, nullable=False, unique=True)
+    fully_qualified_name = Column(String)
+    output_uri = Column(String)
+    duration_in_sec = Column(Numeric(12, 3, asdecimal=False))
+    created_at = Column(TIMESTAMP(timezone=True),
+                        nullable=False, server_default=text('now()'))
+
+
+class NotificationOutbox(Base):
+    """Pub/Sub messages written in the same transaction as the change they announce.
+
+    app/outbox.py publishes pending rows and stamps delivered_at; a row is
+    leased while its publish is in flight so several drainers can share the table.
+    """
+    __tablename__ = 'notification_outbox'
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    topic = Column(String, nullable=False)
+    ordering_key = Column(String, nullable=False, server_default='')
+    payload = Column(Text, nullable=False)
+    attempts = Column(Integer, nullable=False, server_default='0')
+    leased_until = Column(TIMESTAMP(timezone=True))
+    delivered_at = Column(TIMESTAMP(timezone=True))
+    created_at = Column(TIMESTAMP(timezone=True),
+                        nullable=False, server_default=text('now()'))
+
+
+# The drainer only ever scans undelivered rows in id order
+Index("ix_notification_outbox_pending", NotificationOutbox.id,
+      postgresql_where=NotificationOutbox.delivered_at.is_(None))
+
+
+class JobRequestRetries(Base):
+    """Job requests whose processing failed with a retryable error, waiting for their next attempt."""
+    __tablename__ = 'job_request_retries'
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    source = Column(String, nullable=False)
+    message_id = Column(String)
+    payload = Column(Text, nullable=False)
+    attempts = Column(Integer, nullable=False, server_default='0')
+    last_error = Column(Text)
+    next_attempt_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=text('now()'))
+    leased_until = Column(TIMESTAMP(timezone=True))
+    created_at = Column(TIMESTAMP(timezone=True),
+                        nullable=False, server_default=text('now()'))
+    updated_at = Column(TIMESTAMP(timezone=True),
+                        nullable=False, server_default=text('now()'))
+
+
+Index("ix_job_request_retries_next_attempt_at", JobRequestRetries.next_attempt_at)
+
+
+class DeadLetters(Base):
+    """Job requests that failed permanently or ran out of retries; listed and replayed via /dead-letters."""
+    __tablename__ = 'dead_letters'
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    source = Column(String, nullable=False)
+    message_id = Column(String)
+    payload = Column(Text, nullable=False)
+    attempts = Column(Integer, nullable=False, server_default='0')
+    last_error = Column(Text)
+    created_at = Column(TIMESTAMP(timezone=True),
+                        nullable=False, server_default=text('now()'))
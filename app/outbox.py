@@ -0,0 +1,133 @@
+"""
+Background publisher for the notification outbox
+"""
+import asyncio
+import threading
+import time
+from typing import List, Optional
+
+from google.cloud import pubsub_v1
+
+from .config import settings
+from .crud import async_lease_outbox, async_mark_outbox_delivered, async_outbox_lag, async_purge_outbox
+from .custom_logger import logger
+from .models import NotificationOutbox
+
+
+class OutboxDrainer:
+    """Publishes pending notification_outbox rows and marks them delivered in bulk.
+
+    Rows are leased in id order, published through the shared publisher with
+    their ordering key, and every row whose publish succeeded is stamped
+    delivered in one UPDATE. Failed rows stay leased until the lease expires
+    and are retried then; the paused ordering key is resumed so later rows of
+    the same content can follow. Several processes may drain the same table.
+    """
+
+    def __init__(self, publisher: pubsub_v1.PublisherClient, batch_size: int = 500, poll_interval: float = 0.5,
+                 lease_seconds: float = 60.0, retention_hours: int = 72):
+        self.publisher = publisher
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.retention_hours = retention_hours
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        self._metrics_lock = threading.Lock()
+        self._published = 0
+        self._failed = 0
+        self._last_drain: Optional[float] = None
+
+    def wake(self) -> None:
+        """Starts the next drain right away; safe to call from any thread or loop."""
+        if self._loop is not None and self._wakeup is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def run(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        last_purge = 0.0
+        logger.info("Notification outbox drainer started")
+        while True:
+            try:
+                drained = await self.drain_once()
+                if time.monotonic() - last_purge > 3600:
+                    purged = await async_purge_outbox(self.retention_hours)
+                    last_purge = time.monotonic()
+                    if purged:
+                        logger.info(f"Purged {purged} delivered outbox rows")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Outbox drain failed: {e}")
+                drained = 0
+            if drained < self.batch_size:
+                # Caught up: sleep until the poll interval passes or a writer wakes us
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+
+    async def drain_once(self) -> int:
+        rows = await async_lease_outbox(self.batch_size, self.lease_seconds)
+        if not rows:
+            return 0
+        futures = [
+            asyncio.wrap_future(self.publisher.publish(row.topic, row.payload.encode('utf-8'),
+                                                       ordering_key=row.ordering_key))
+            for row in rows
+        ]
+        results = await asyncio.gather(*futures, return_exceptions=True)
+
+        delivered: List[int] = []
+        failed: List[NotificationOutbox] = []
+        for row, result in zip(rows, results):
+            if isinstance(result, Exception):
+                failed.append(row)
+            else:
+                delivered.append(row.id)
+        await async_mark_outbox_delivered(delivered)
+
+        for row in failed:
+            logger.error(f"Publishing outbox row {row.id} (attempt {row.attempts}) failed")
+            if row.ordering_key:
+                self.publisher.resume_publish(row.topic, row.ordering_key)
+
+        with self._metrics_lock:
+            self._published += len(delivered)
+            self._failed += len(failed)
+            self._last_drain = time.time()
+        return len(rows)
+
+    async def metrics(self) -> dict:
+        lag = await async_outbox_lag()
+        with self._metrics_lock:
+            lag.update({
+                "published": self._published,
+                "failed": self._failed,
+                "last_drain_at": self._last_drain,
+            })
+        return lag
+
+
+outbox_drainer: Optional[OutboxDrainer] = None
+
+
+def start_outbox_drainer(publisher: pubsub_v1.PublisherClient) -> asyncio.Task:
+    """Creates the process-wide drainer and runs it on the current loop."""
+    global outbox_drainer
+    outbox_drainer = OutboxDrainer(
+        publisher,
+        batch_size=settings.OUTBOX_BATCH_SIZE,
+        poll_interval=settings.OUTBOX_POLL_INTERVAL_SECONDS,
+        lease_seconds=settings.OUTBOX_LEASE_SECONDS,
+        retention_hours=settings.OUTBOX_RETENTION_HOURS,
+    )
+    return asyncio.create_task(outbox_drainer.run())
+
+
+def wake_outbox_drainer() -> None:
+    if outbox_drainer is not None:
+        outbox_drainer.wake()
@@ -0,0 +1,113 @@
+"""
+Staged async pipelines with fail-fast fan-out, compensation and per-stage timings
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from .custom_logger import logger
+
+Compensation = Callable[[Any], Awaitable[None]]
+
+
+class StageTimings:
+    """Rolling per-stage latency samples, shared by every run of one pipeline."""
+
+    def __init__(self, window: int = 1000):
+        self._window = window
+        self._samples: Dict[str, deque] = {}
+        self._failures: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float, failed: bool = False) -> None:
+        with self._lock:
+            samples = self._samples.get(stage)
+            if samples is None:
+                samples = self._samples[stage] = deque(maxlen=self._window)
+            samples.append(seconds * 1000)
+            if failed:
+                self._failures[stage] = self._failures.get(stage, 0) + 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            result = {}
+            for stage, samples in self._samples.items():
+                latencies = sorted(samples)
+                result[stage] = {
+                    "count": len(latencies),
+                    "failures": self._failures.get(stage, 0),
+                    "latency_ms_p50": latencies[int(len(latencies) * 0.50)],
+                    "latency_ms_p95": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+                    "latency_ms_max": latencies[-1],
+                }
+            return result
+
+
+class StagePipeline:
+    """One run of a staged pipeline.
+
+    ``stage`` awaits a single step and times it; ``fan_out`` runs independent
+    steps concurrently and, as soon as one of them fails, cancels the rest.
+    Steps that succeeded may register a compensation which receives their
+    result; when the ``async with`` block exits with an error, compensations
+    run newest first and their own failures are only logged.
+    """
+
+    def __init__(self, name: str, timings: StageTimings):
+        self.name = name
+        self.timings = timings
+        self._compensations: List[Tuple[str, Compensation, Any]] = []
+        self._started: Optional[float] = None
+
+    async def __aenter__(self) -> "StagePipeline":
+        self._started = time.perf_counter()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        failed = exc_type is not None
+        if failed:
+            await self._compensate()
+        self.timings.record("total", time.perf_counter() - self._started, failed=failed)
+
+    async def stage(self, name: str, step: Awaitable, compensate: Optional[Compensation] = None) -> Any:
+        start = time.perf_counter()
+        try:
+            result = await step
+        except BaseException:
+            self.timings.record(name, time.perf_counter() - start, failed=True)
+            raise
+        self.timings.record(name, time.perf_counter() - start)
+        if compensate is not None:
+            self._compensations.append((name, compensate, result))
+        return result
+
+    async def fan_out(self, *stages: Tuple[str, Awaitable, Optional[Compensation]]) -> List[Any]:
+        """Runs ``(name, awaitable, compensate)`` stages concurrently; returns results in order."""
+        tasks = [asyncio.ensure_future(self.stage(name, step, compensate)) for name, step, compensate in stages]
+        try:
+            done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        if pending:
+            for task in pending:
+                task.cancel()
+            # Let cancelled stages finish unwinding so successful ones have registered compensation
+            await asyncio.gather(*pending, return_exceptions=True)
+        for task in tasks:
+            if task.done() and not task.cancelled() and task.exception() is not None:
+                raise task.exception()
+        return [task.result() for task in tasks]
+
+    async def _compensate(self) -> None:
+        while self._compensations:
+            name, compensate, result = self._compensations.pop()
+            try:
+                await compensate(result)
+                logger.info(f"{self.name}: compensated stage '{name}'")
+            except Exception as e:
+                logger.error(f"{self.name}: compensation of stage '{name}' failed: {e}")
@@ -0,0 +1,172 @@
+"""
+Durable retries with backoff, and dead-lettering, for failed job requests
+"""
+import asyncio
+import json
+import random
+import threading
+from typing import Awaitable, Callable, Optional
+
+import httpx
+from google.api_core import exceptions as google_exceptions
+from pydantic import ValidationError
+from sqlalchemy.exc import DBAPIError, IntegrityError, OperationalError
+
+from .config import settings
+from .crud import (
+    async_add_dead_letter,
+    async_complete_retry,
+    async_dead_letter_retry,
+    async_lease_due_retries,
+    async_reschedule_retry,
+    async_retry_backlog,
+    async_schedule_retry,
+)
+from .custom_logger import logger
+from .exceptions import CustomException
+
+RETRYABLE_GOOGLE_ERRORS = (
+    google_exceptions.ServerError,
+    google_exceptions.TooManyRequests,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.ServiceUnavailable,
+)
+
+# Handles one job request payload (a JSON string); raises on failure
+RetryHandler = Callable[[str, Optional[str]], Awaitable[None]]
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Transient infrastructure failures are retried; bad requests and conflicts are not."""
+    if isinstance(error, CustomException):
+        return error.code >= 500 or error.code == 429
+    if isinstance(error, (ValidationError, json.JSONDecodeError, KeyError, IntegrityError)):
+        return False
+    if isinstance(error, (OperationalError, httpx.TransportError, asyncio.TimeoutError, ConnectionError)):
+        return True
+    if isinstance(error, DBAPIError):
+        return error.connection_invalidated
+    return isinstance(error, RETRYABLE_GOOGLE_ERRORS)
+
+
+def backoff_delay(attempt: int) -> float:
+    """Exponential backoff with full jitter, never below RETRY_MIN_DELAY_SECONDS so nothing hot-loops."""
+    ceiling = min(settings.RETRY_MAX_DELAY_SECONDS, settings.RETRY_BASE_DELAY_SECONDS * (2 ** (attempt - 1)))
+    return max(settings.RETRY_MIN_DELAY_SECONDS, random.uniform(0, ceiling))
+
+
+def retry_delay(error: BaseException, attempt: int) -> float:
+    """Backoff for ``attempt``, but no sooner than an error's ``retry_after`` (e.g. a dispatch claim's lease)."""
+    return max(backoff_delay(attempt), getattr(error, "retry_after", None) or 0.0)
+
+
+def describe(error: BaseException) -> str:
+    detail = error.detail if isinstance(error, CustomException) else str(error)
+    return f"{type(error).__name__}: {detail}"[:2000]
+
+
+async def handle_failed_request(source: str, message_id: Optional[str], payload: str, error: BaseException) -> None:
+    """Hands a request that failed on first delivery to the retry table, or to dead_letters if it can't succeed.
+
+    Raises if neither could be stored, so the caller can nack and let Pub/Sub redeliver.
+    """
+    if is_retryable(error):
+        delay = retry_delay(error, 1)
+        await async_schedule_retry(source, message_id, payload, describe(error), delay)
+        logger.warning(f"{source} request {message_id} failed ({describe(error)}), retrying in {delay:.1f}s")
+    else:
+        await async_add_dead_letter(source, message_id, payload, 1, describe(error))
+        logger.error(f"{source} request {message_id} dead-lettered: {describe(error)}")
+
+
+class RetryScheduler:
+    """Re-runs due retries with bounded concurrency until they succeed or run out of attempts.
+
+    Rows are leased while they run, so a crashed worker's retries become due
+    again after the lease and several processes can share the table.
+    """
+
+    def __init__(self, handlers: dict, max_attempts: int = 5, batch_size: int = 20, max_concurrency: int = 4,
+                 poll_interval: float = 5.0, lease_seconds: float = 600.0):
+        self.handlers = handlers
+        self.max_attempts = max_attempts
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self._slots = asyncio.Semaphore(max_concurrency)
+
+        self._metrics_lock = threading.Lock()
+        self._succeeded = 0
+        self._rescheduled = 0
+        self._dead_lettered = 0
+
+    async def run(self) -> None:
+        logger.info("Job request retry scheduler started")
+        while True:
+            try:
+                ran = await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Retry scheduler failed: {e}")
+                ran = 0
+            if ran < self.batch_size:
+                await asyncio.sleep(self.poll_interval)
+
+    async def run_once(self) -> int:
+        retries = await async_lease_due_retries(self.batch_size, self.lease_seconds)
+        await asyncio.gather(*(self._attempt(retry) for retry in retries))
+        return len(retries)
+
+    async def _attempt(self, retry) -> None:
+        handler = self.handlers.get(retry.source)
+        async with self._slots:
+            try:
+                if handler is None:
+                    raise ValueError(f"No retry handler for source '{retry.source}'")
+                await handler(retry.payload, retry.message_id)
+            except Exception as e:
+                attempt = retry.attempts + 1
+                if not is_retryable(e) or attempt >= self.max_attempts:
+                    await async_dead_letter_retry(retry.id, describe(e))
+                    self._count("_dead_lettered")
+                    logger.error(f"Retry {retry.id} dead-lettered after {attempt} attempts: {describe(e)}")
+                else:
+                    delay = retry_delay(e, attempt)
+                    await async_reschedule_retry(retry.id, describe(e), delay)
+                    self._count("_rescheduled")
+                    logger.warning(f"Retry {retry.id} attempt {attempt} failed, next in {delay:.1f}s")
+                return
+            await async_complete_retry(retry.id)
+            self._count("_succeeded")
+
+    def _count(self, counter: str) -> None:
+        with self._metrics_lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    async def metrics(self) -> dict:
+        backlog = await async_retry_backlog()
+        with self._metrics_lock:
+            backlog.update({
+                "succeeded": self._succeeded,
+                "rescheduled": self._rescheduled,
+                "dead_lettered": self._dead_lettered,
+            })
+        return backlog
+
+
+retry_scheduler: Optional[RetryScheduler] = None
+
+
+def start_retry_scheduler(handlers: dict) -> asyncio.Task:
+    """Creates the process-wide scheduler for ``{source: handler}`` and runs it on the current loop."""
+    global retry_scheduler
+    retry_scheduler = RetryScheduler(
+        handlers,
+        max_attempts=settings.RETRY_MAX_ATTEMPTS,
+        batch_size=settings.RETRY_BATCH_SIZE,
+        max_concurrency=settings.RETRY_MAX_CONCURRENCY,
+        poll_interval=settings.RETRY_POLL_INTERVAL_SECONDS,
+        lease_seconds=settings.RETRY_LEASE_SECONDS,
+    )
+    return asyncio.create_task(retry_scheduler.run())
@@ -0,0 +1,64 @@
+from typing import Annotated, Optional
+
+from fastapi import APIRouter, Query, Request
+
+from ..config import settings
+from ..crud import async_get_dead_letters, async_replay_dead_letter
+from ..exceptions import CustomException
+from ..schemas import DeadLetterListResponse, TranscoderResponse
+from ..utils import async_db_dependency, check_custom_header
+
+router = APIRouter(
+    prefix=f"{settings.ROUTE_PREFIX}/{settings.API_VERSION}/dead-letters",
+    tags=['Dead Letters']
+)
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+@router.get("/list", response_model=DeadLetterListResponse)
+async def list_dead_letters(
+        db: async_db_dependency,
+        request: Request,
+        cursor: Optional[int] = None,
+        limit: Annotated[int, Query(ge=1, le=MAX_PAGE_SIZE)] = DEFAULT_PAGE_SIZE,
+        source: Optional[str] = None,
+):
+    check_custom_header(request)
+    dead_letters = await async_get_dead_letters(db, cursor, limit, source)
+    next_cursor = dead_letters[limit - 1].id if len(dead_letters) > limit else None
+
+    response_data = {
+        "success": True,
+        "message": "List of dead-lettered job requests",
+        "data": [
+            {
+                "id": dead_letter.id,
+                "source": dead_letter.source,
+                "message_id": dead_letter.message_id,
+                "payload": dead_letter.payload,
+                "attempts": dead_letter.attempts,
+                "last_error": dead_letter.last_error,
+                "created_at": dead_letter.created_at,
+            }
+            for dead_letter in dead_letters[:limit]
+        ],
+        "next_cursor": next_cursor,
+    }
+    return DeadLetterListResponse(**response_data)
+
+
+@router.post("/{dead_letter_id}/replay", response_model=TranscoderResponse)
+async def replay_dead_letter(dead_letter_id: int, request: Request):
+    check_custom_header(request)
+    retry_id = await async_replay_dead_letter(dead_letter_id)
+    if retry_id is None:
+        raise CustomException(code=404, status_code=20404, detail="Dead letter not found")
+
+    response_data = {
+        "success": True,
+        "message": "Dead letter queued for retry",
+        "data": [{"dead_letter_id": dead_letter_id, "retry_id": retry_id}]
+    }
+    return TranscoderResponse(**response_data)
@@ -1,35 +1,51 @@
-from typing import Annotated
+import asyncio
+from datetime import datetime
+from typing import Annotated, Literal, Optional
 from google.cloud.video import transcoder_v1
 from google.cloud.video.transcoder_v1.services.transcoder_service import TranscoderServiceClient
-from fastapi import APIRouter, Depends, Request
+from fastapi import APIRouter, Depends, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..exceptions import CustomException
-from ..schemas import TranscoderResponse, JobRequest, GetJobRequest, AdocJobRequest
+from ..mapper import map_into_create_job
+from ..models import JobStatusEnum, JobStateEnum, TranscodeResults
+from ..schemas import TranscoderResponse, JobListResponse, JobRequest, GetJobRequest, AdocJobRequest
+from ..gcp_clients import GCPClients
 from ..utils import (
+    get_gcp_clients,
     get_transcoder_client,
     create_job_from_template,
-    db_dependency,
+    async_db_dependency,
+    job_duration_seconds,
     build_jobs_data,
     check_custom_header,
+    decode_job_cursor,
+    rows_to_csv,
+    rows_to_ndjson,
     get_job_details
 )
 from ..config import settings
 from ..crud import (
-    create_job,
-    update_job_id,
-    get_jobs,
-    get_job_by_job_id,
-    get_job_by_custom_name
+    EXPORT_COLUMNS,
+    async_add_finished_job,
+    async_stream_jobs,
+    async_create_job_from_request,
+    async_update_job_id,
+    async_get_jobs_page,
+    async_get_job_by_job_id,
+    async_get_job_by_custom_name
 )
 from ..gcp_utils import (
-    create_mux_stream,
-    create_overlay,
-    create_elementary_streams,
-    create_manifest,
-    create_encryption,
     get_secret_from_key_server,
     create_secret
 )
+from ..consumers.notifications import completion_outbox_entry
+from ..dispatch_scheduler import INTERACTIVE, dispatch_scheduler
+from ..job_config_cache import job_config_cache
+from ..outbox import wake_outbox_drainer
+from ..transcoder_locations import location_pool
+from ..transcode_reuse import compute_result_fingerprint, minutes_saved, transcode_reuse
 
 import argparse
 
@@ -40,52 +56,56 @@ router = APIRouter(
 )
 
 t_client_dependency = Annotated[TranscoderServiceClient, Depends(get_transcoder_client)]
+gcp_clients_dependency = Annotated[GCPClients, Depends(get_gcp_clients)]
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
 
 
 @router.post("/create", response_model=TranscoderResponse)
-async def transcode_job(db: db_dependency, request: AdocJobRequest, t_client: t_client_dependency,
+async def transcode_job(db: async_db_dependency, request: AdocJobRequest, gcp_clients: gcp_clients_dependency,
                         request_header: Request):
     # logic to process the transcode request
-
-    # input_uri = "gs://{source-bucket-name}/%s" % name  # Source bucket name
-    # output_uri = "gs://{output-bucket-name}/%s/" % filename  # Output bucket name
-    # template_id = "hd-h264-hls-dash"  # Template ID
-    #
-    # client = TranscoderServiceClient()
-    #
-    # parent = f"projects/{project - id}/locations/{location}"  # project id and preferred location
-    # job = transcoder_v1.types.Job()
-    # job.input_uri = input_uri
-    # job.output_uri = output_uri
-    # job.template_id = template_id
-    #
-    # response = client.create_job(parent=parent, job=job)
-    # print(f"Job: {response.name}")
     check_custom_header(request_header)
 
-    value = get_secret_from_key_server(request.content_id, request.package_id, request.provider_id,
-                                       request.video_quality, request.audio_quality, request.drm_type)
-
     #version = create_secret(value)
 
     version = settings.SECRET_VERSION
 
     print(f"version: {version}")
 
-    # Add job into database
-    jobs = create_job(request, db, version)
+    if request.reuse_existing:
+        fingerprint = await compute_result_fingerprint(gcp_clients.storage_uris, request, version)
+        result = await transcode_reuse.find(fingerprint)
+        if result is not None:
+            return await reuse_transcode_result(db, request, version, gcp_clients, result, fingerprint)
 
-    # Dispatch Job to GCP Transcoder API
-    # transcoding_response = create_job_from_template(t_client, settings.PROJECT_ID, settings.LOCATION, jobs.input_uri,jobs.output_uri, jobs.template_id)
+    key_request = get_secret_from_key_server(request.content_id, request.package_id, request.provider_id,
+                                             request.video_quality, request.audio_quality, request.drm_type)
+    if request.reuse_existing:
+        value = await key_request
+    else:
+        # The fingerprint only needs the input object's metadata, so fetch it alongside the keys
+        value, fingerprint = await asyncio.gather(
+            key_request, compute_result_fingerprint(gcp_clients.storage_uris, request, version))
 
-    transcoding_response = create_job_from_ad_hoc(t_client, settings.PROJECT_ID, settings.LOCATION,
-                                                  jobs.input_uri, jobs.output_uri, version, request.image_uri,
-                                                  request.video_quality, request.audio_quality, request.drm_type,
-                                                  request.manifast_type)
+    # Least-loaded Transcoder location the buckets' residency allows; stored on the job row
+    location = await location_pool.choose(request.input_uri, request.output_uri)
+
+    # Add job into database
+    jobs = await async_create_job_from_request(request, db, version, gcp_clients.storage_uris, location)
+
+    # Dispatch Job to GCP Transcoder API through the request's priority lane; API callers default to interactive
+    transcoding_response = await dispatch_scheduler.run(dispatch_scheduler.lane(request.priority, INTERACTIVE),
+                                                        jobs.location, create_job_from_ad_hoc, gcp_clients.transcoder,
+                                                        settings.PROJECT_ID, jobs.location, jobs.input_uri,
+                                                        jobs.output_uri, version, request.image_uri,
+                                                        request.video_quality, request.audio_quality,
+                                                        request.drm_type, request.manifast_type)
 
-    #print(transcoding_response)
     # Update job status and job state
-    job = update_job_id(db, request, transcoding_response.name)
+    job = await async_update_job_id(transcoding_response.name, request, job_duration_seconds(transcoding_response),
+                                    fingerprint)
 
     # Mocking a response
     # logic to handle the transcoding process
@@ -115,49 +135,129 @@ async def transcode_job(db: db_dependency, request: AdocJobRequest, t_client: t_
 
 
 
-@router.get("/list", response_model=TranscoderResponse)
-async def get_all_jobs(db: db_dependency, request: Request):
-    try:
-        check_custom_header(request)
-        # Get all jobs from database
+async def reuse_transcode_result(db: AsyncSession, request: AdocJobRequest, version: int, gcp_clients: GCPClients,
+                                 result: TranscodeResults, fingerprint: str) -> TranscoderResponse:
+    """Answers /create from an identical SUCCEEDED transcode instead of dispatching a new one."""
+    jobs = map_into_create_job(request)
+    jobs.version = version
+    jobs.output_uri = await transcode_reuse.copy_output(gcp_clients.storage_uris, result, request.output_uri)
+    # Nothing will complete on the Transcoder, so the final status is announced right away
+    job = await async_add_finished_job(transcode_reuse.mark_reused(jobs, result, fingerprint),
+                                       notify=completion_outbox_entry)
+    wake_outbox_drainer()
 
-        jobs = get_jobs(db)
+    response_data = {
+        "success": True,
+        "message": f"Reused the output of {result.fully_qualified_name}, "
+                   f"saving {minutes_saved(result):.1f} transcode minutes",
+        "data": [
+            {
+                "fully_qualified_name": job.fully_qualified_name,
+                "job_id": job.job_id,
+                "url": job.input_uri,
+                "description": job.description,
+                "status": job.status,
+                "state": job.state,
+                "custom_name": job.custom_name,
+                "output_location": job.output_uri,
+                "job_start_time": job.created_at,
+                "reused_from": job.reused_from,
+                "duration": job.duration_in_sec
+            }
+        ]
+    }
+    return TranscoderResponse(**response_data)
+
+
+@router.get("/list", response_model=JobListResponse)
+async def get_all_jobs(db: async_db_dependency, request: Request,
+                       cursor: Optional[str] = None,
+                       limit: Annotated[int, Query(ge=1, le=MAX_PAGE_SIZE)] = DEFAULT_PAGE_SIZE,
+                       status: Optional[JobStatusEnum] = None,
+                       state: Optional[JobStateEnum] = None,
+                       content_id: Optional[str] = None,
+                       provider_id: Optional[str] = None,
+                       created_by: Optional[str] = None,
+                       from_date: Optional[datetime] = None,
+                       to_date: Optional[datetime] = None):
+    check_custom_header(request)
+    # Validate the cursor before the generic error handler below can turn it into a 500
+    page_cursor = decode_job_cursor(cursor) if cursor else None
+    try:
+        # Get one page of jobs, ordered and limited by the database
+        jobs, next_cursor = await async_get_jobs_page(db, page_cursor, limit, status=status, state=state,
+                                                      content_id=content_id, provider_id=provider_id,
+                                                      created_by=created_by, from_date=from_date,
+                                                      to_date=to_date)
 
         # Bind jobs into Dictionary
 
         job_data = build_jobs_data(jobs)
-        # Mocking a response
 
-        # Mock response
         response_data = {
             "success": True,
             "message": "List of all jobs",
-            "data": job_data
+            "data": job_data,
+            "next_cursor": next_cursor
         }
 
-        # Create a TranscoderResponse object
-        return TranscoderResponse(**response_data)
+        # Create a JobListResponse object
+        return JobListResponse(**response_data)
 
     except Exception as e:
         # In case of an error, raise an Exception
         raise CustomException(code= 500, status_code=20500, detail=str(e))
 
 
+@router.get("/export")
+async def export_jobs(request: Request,
+                      format: Literal["ndjson", "csv"] = "ndjson",
+                      status: Optional[JobStatusEnum] = None,
+                      state: Optional[JobStateEnum] = None,
+                      content_id: Optional[str] = None,
+                      provider_id: Optional[str] = None,
+                      created_by: Optional[str] = None,
+                      from_date: Optional[datetime] = None,
+                      to_date: Optional[datetime] = None):
+    check_custom_header(request)
+    filters = dict(status=status, state=state, content_id=content_id, provider_id=provider_id,
+                   created_by=created_by, from_date=from_date, to_date=to_date)
+    columns = [column.key for column in EXPORT_COLUMNS]
+
+    # Rows go from the server-side cursor straight to the client, one batch at a time.
+    async def ndjson_body():
+        async for rows in async_stream_jobs(EXPORT_COLUMNS, **filters):
+            yield rows_to_ndjson(rows, columns)
+
+    async def csv_body():
+        yield rows_to_csv([columns])
+        async for rows in async_stream_jobs(EXPORT_COLUMNS, **filters):
+            yield rows_to_csv(rows)
+
+    if format == "csv":
+        body, media_type = csv_body(), "text/csv"
+    else:
+        body, media_type = ndjson_body(), "application/x-ndjson"
+
+    return StreamingResponse(body, media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="jobs.{format}"'})
+
+
 @router.post("/list/details", response_model=TranscoderResponse)
-async def get_job(db: db_dependency, request: GetJobRequest, request_header: Request):
+async def get_job(db: async_db_dependency, request: GetJobRequest, request_header: Request):
     check_custom_header(request_header)
     if request.custom_name:
-        job = get_job_by_custom_name(request.custom_name, db)
+        job = await async_get_job_by_custom_name(request.custom_name, db)
 
         if job is None:  # If job not found by custom name, try fetching by job ID
             if request.job_id:
-                job = get_job_by_job_id(request.job_id, db)
+                job = await async_get_job_by_job_id(request.job_id, db)
 
             else:
                 raise CustomException(code=404, status_code=20404, detail="Job not found by custom name or job ID")
 
     elif request.job_id:
-        job = get_job_by_job_id(request.job_id, db)
+        job = await async_get_job_by_job_id(request.job_id, db)
 
         if job is None:  # If job not found by job ID, raise an error
             print("Job not found by job ID")
@@ -230,16 +330,8 @@ def create_job_from_ad_hoc(
     job = transcoder_v1.types.Job()
     job.input_uri = input_uri
     job.output_uri = output_uri
-    job.config = transcoder_v1.types.JobConfig(
-        elementary_streams=create_elementary_streams(video_quality, audio_quality),
-        encryptions=create_encryption(drm_type, version),
-        mux_streams=create_mux_stream(drm_type, video_quality, audio_quality),
-        manifests=create_manifest(drm_type, video_quality, audio_quality, manifast_type),
-        overlays=create_overlay(image_uri),
-        pubsub_destination=transcoder_v1.types.PubsubDestination(
-            topic=f"projects/{settings.PROJECT_NAME}/topics/{settings.JOB_COMPLETION_TOPIC}",
-        ),
-    )
+    # Copy of a prebuilt config for this ladder / DRM / manifest combination
+    job.config = job_config_cache.get(video_quality, audio_quality, drm_type, manifast_type, version, image_uri)
     response = client.create_job(parent=parent, job=job)
     print(f"Job: {response.name}")
     return response
@@ -0,0 +1,40 @@
+from fastapi import APIRouter, Request
+
+from ..config import settings
+from ..consumers import job_completion
+from ..consumers.job_request import job_request_timings
+from ..consumers.runtime import subscriptions
+from ..dispatch_scheduler import dispatch_scheduler
+from ..idempotency import dispatch_deduplicator
+from ..job_config_cache import job_config_cache
+from .. import outbox, retries
+from ..transcoder_locations import location_pool
+from ..transcode_reuse import transcode_reuse
+from ..key_server import key_response_cache, key_server_client
+from ..utils import check_custom_header
+
+router = APIRouter(
+    prefix=f"{settings.ROUTE_PREFIX}/{settings.API_VERSION}/metrics",
+    tags=['Metrics']
+)
+
+
+@router.get("")
+async def get_metrics(request: Request):
+    check_custom_header(request)
+    return {
+        "key_server": key_server_client.metrics(),
+        "key_response_cache": key_response_cache.stats(),
+        "job_config_cache": job_config_cache.stats(),
+        "job_request_stages": job_request_timings.stats(),
+        "job_completion_batches": (job_completion.completion_batches.stats()
+                                   if job_completion.completion_batches is not None else None),
+        "dispatch_dedup": dispatch_deduplicator.stats(),
+        "dispatch_lanes": dispatch_scheduler.stats(),
+        "transcoder_locations": location_pool.stats(),
+        "transcode_reuse": transcode_reuse.stats(),
+        "notification_outbox": await outbox.outbox_drainer.metrics() if outbox.outbox_drainer else None,
+        "job_request_retries": await retries.retry_scheduler.metrics() if retries.retry_scheduler else None,
+        "subscriptions": {name: runtime.stats() for name, runtime in list(subscriptions.items())},
+        "storage_uri_cache": request.app.state.gcp_clients.storage_uris.stats(),
+    }
@@ -3,7 +3,7 @@ Pydantic Models are used as Schema Validation
 for request and responses parameters
 """
 from pydantic import BaseModel, field_validator, AnyUrl, validator, ValidationError
-from typing import Optional, Any, List
+from typing import Optional, Any, List, Literal
 
 
 class MediaSpecs(BaseModel):
@@ -131,6 +131,14 @@ class TranscoderResponse(BaseModel):
     data: List[dict]  # This can be further detailed based on the structure of package details
 
 
+class JobListResponse(TranscoderResponse):
+    next_cursor: Optional[str] = None  # Pass back as `cursor` to fetch the next page
+
+
+class DeadLetterListResponse(TranscoderResponse):
+    next_cursor: Optional[int] = None  # Pass back as `cursor` to fetch the next page
+
+
 class JobTemplateRequest(BaseModel):
     template_id: Optional[str]
 
@@ -157,6 +165,12 @@ class AdocJobRequest(BaseModel):
     audio_quality: Optional[list[int]]
     drm_type: Optional[list[str]]
     manifast_type: Optional[list[str]]
+    # Copy the output of an identical, already SUCCEEDED transcode instead of running it again
+    reuse_existing: Optional[bool] = False
+    # Dispatch lane; defaults to interactive for /job/create, standard for job-request messages
+    priority: Optional[Literal["interactive", "standard", "bulk"]] = None
+    # GCS generation of input_uri for storage-triggered requests, so a re-upload is a new job
+    input_generation: Optional[str] = None
 
     class Config:
         extra = "forbid"
@@ -0,0 +1,144 @@
+"""
+Cached Cloud Storage lookups for validating job input / output URIs
+"""
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from cachetools import TTLCache
+from google.cloud import storage
+
+from .custom_logger import logger
+from .exceptions import CustomException
+
+
+def parse_storage_url(url: str, code: int = 404, status_code: int = 20404) -> Tuple[str, str]:
+    """Splits a gs:// or storage.cloud.google.com URL into (bucket name, object path)."""
+    # Determine if the URL is a GCS or HTTPS URL and adjust accordingly
+    if url.startswith("https://storage.cloud.google.com/"):
+        url_without_scheme = url.replace('https://storage.cloud.google.com/', '')
+    elif url.startswith("gs://"):
+        url_without_scheme = url.replace('gs://', '')
+    else:
+        print("Invalid URL schema")
+        raise CustomException(code=code, status_code=status_code, detail="Invalid URL scheme")
+
+    # Split the URL into bucket name and file path
+    parts = url_without_scheme.split('/', 1)
+    if len(parts) < 2:
+        print("Invalid URL schema")
+        raise CustomException(code=code, status_code=status_code, detail="Invalid URL scheme")
+
+    return parts[0], parts[1]
+
+
+class StorageUriValidator:
+    """Existence checks and directory markers backed by process-wide caches.
+
+    Bucket handles are fetched once per bucket for the life of the process.
+    Objects / prefixes that were seen to exist are remembered for ``ttl``
+    seconds, so repeated checks of the same output prefix and the marker
+    upload that follows cost no RPC. Missing objects are never cached.
+    Methods are blocking and thread-safe; call them through run_blocking
+    from async code.
+    """
+
+    def __init__(self, client: storage.Client, ttl: float = 300, maxsize: int = 4096):
+        self.client = client
+        self._buckets: Dict[str, storage.Bucket] = {}
+        self._existing = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def bucket(self, bucket_name: str) -> storage.Bucket:
+        with self._lock:
+            bucket = self._buckets.get(bucket_name)
+        if bucket is None:
+            bucket = self.client.get_bucket(bucket_name)
+            with self._lock:
+                self._buckets[bucket_name] = bucket
+        return bucket
+
+    def _seen(self, bucket_name: str, path: str) -> bool:
+        with self._lock:
+            seen = (bucket_name, path) in self._existing
+            if seen:
+                self.hits += 1
+            else:
+                self.misses += 1
+            return seen
+
+    def _remember(self, bucket_name: str, path: str) -> None:
+        with self._lock:
+            self._existing[(bucket_name, path)] = True
+
+    def exists(self, url: str) -> bool:
+        bucket_name, file_path = parse_storage_url(url)
+        if self._seen(bucket_name, file_path):
+            return True
+        try:
+            blob = self.bucket(bucket_name).blob(file_path)
+        except Exception as e:
+            print(e)
+            raise CustomException(code=500, status_code=20500, detail=str(e))
+        found = blob.exists()
+        if found:
+            self._remember(bucket_name, file_path)
+        return found
+
+    def ensure_directory(self, url: str) -> str:
+        """Makes sure the zero-byte marker object for an output prefix exists; returns its gs:// URL."""
+        bucket_name, directory_blob_name = parse_storage_url(url, code=400, status_code=20400)
+        if self._seen(bucket_name, directory_blob_name):
+            return f"gs://{bucket_name}/{directory_blob_name}"
+        try:
+            with self._lock:
+                bucket = self._buckets.get(bucket_name)
+            if bucket is None:
+                bucket = self.client.bucket(bucket_name)
+
+            # Create an empty blob (zero-byte object) representing the directory
+            blob = bucket.blob(directory_blob_name)
+            blob.upload_from_string('')  # Upload an empty string
+        except Exception as e:
+            print(e)
+            raise CustomException(code=500, status_code=20500, detail=str(e))
+        self._remember(bucket_name, directory_blob_name)
+        logger.info(f"Created directory marker gs://{bucket_name}/{directory_blob_name}")
+        return f"gs://{bucket_name}/{directory_blob_name}"
+
+    def object_identity(self, url: str) -> Optional[Tuple[int, str]]:
+        """Returns (generation, md5) of an object, or None when it does not exist. Never cached."""
+        bucket_name, file_path = parse_storage_url(url)
+        blob = self.bucket(bucket_name).get_blob(file_path)
+        if blob is None:
+            return None
+        return blob.generation, blob.md5_hash
+
+    def list_objects(self, url: str) -> List[str]:
+        """Names of all objects under a gs:// prefix."""
+        bucket_name, prefix = parse_storage_url(url)
+        return [blob.name for blob in self.client.list_blobs(bucket_name, prefix=prefix)]
+
+    def copy_object(self, source_bucket: str, source_name: str, destination_url: str) -> None:
+        """Server-side copy of one object to a gs:// URL."""
+        bucket_name, path = parse_storage_url(destination_url, code=400, status_code=20400)
+        source = self.bucket(source_bucket)
+        source.copy_blob(source.blob(source_name), self.bucket(bucket_name), path)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._existing.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "buckets": len(self._buckets),
+                "size": len(self._existing),
+                "maxsize": self._existing.maxsize,
+                "ttl_seconds": self._existing.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,150 @@
+"""
+Runs several worker processes per subscription and restarts the ones that crash
+
+    python -m app.supervisor --processes job_request=4,completion=2,trigger=1 --max-messages 100
+"""
+import argparse
+import signal
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+from .custom_logger import logger
+from .worker import CONSUMERS
+
+# Child exits within this many seconds of starting count as crash loops and back off
+STABLE_AFTER_SECONDS = 60.0
+MAX_RESTART_DELAY_SECONDS = 30.0
+
+
+def parse_processes(value: str) -> Dict[str, int]:
+    """``job_request=4,completion=2`` into {subscription: process count}."""
+    processes = {}
+    for entry in value.split(","):
+        if not entry.strip():
+            continue
+        name, _, count = entry.partition("=")
+        name = name.strip()
+        if name not in CONSUMERS:
+            raise ValueError(f"Unknown consumer '{name}'; choose from {', '.join(CONSUMERS)}")
+        processes[name] = int(count or 1)
+    return processes
+
+
+class WorkerProcess:
+    """One ``python -m app.worker`` child and its restart backoff."""
+
+    def __init__(self, name: str, args: List[str]):
+        self.name = name
+        self.args = args
+        self.process: Optional[subprocess.Popen] = None
+        self.started_at = 0.0
+        self.restart_at = 0.0
+        self.restart_delay = 1.0
+        self.restarts = 0
+
+    def start(self) -> None:
+        self.process = subprocess.Popen([sys.executable, "-m", "app.worker", *self.args])
+        self.started_at = time.monotonic()
+        logger.info(f"Started worker {self.name} (pid {self.process.pid})")
+
+    def check(self) -> None:
+        """Starts the child again once its backoff has passed if it exited."""
+        now = time.monotonic()
+        if self.process is not None:
+            code = self.process.poll()
+            if code is None:
+                return
+            # A child that ran for a while gets restarted right away; a crash loop backs off
+            if now - self.started_at >= STABLE_AFTER_SECONDS:
+                self.restart_delay = 1.0
+            logger.error(f"Worker {self.name} (pid {self.process.pid}) exited with {code}, "
+                         f"restarting in {self.restart_delay:.0f}s")
+            self.process = None
+            self.restart_at = now + self.restart_delay
+            self.restart_delay = min(MAX_RESTART_DELAY_SECONDS, self.restart_delay * 2)
+            self.restarts += 1
+        if now >= self.restart_at:
+            self.start()
+
+    def terminate(self) -> None:
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+
+    def wait(self, timeout: float) -> None:
+        if self.process is None:
+            return
+        try:
+            self.process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            logger.error(f"Worker {self.name} (pid {self.process.pid}) did not stop, killing it")
+            self.process.kill()
+            self.process.wait()
+
+
+class Supervisor:
+    """Keeps ``processes[name]`` workers running for each subscription.
+
+    Every worker has its own streaming pull, flow control, event loops and
+    GIL. Outbox draining and retries run in one extra maintenance worker so
+    their work is not repeated by every subscription process.
+    """
+
+    def __init__(self, processes: Dict[str, int], max_messages: Optional[int] = None, max_bytes: Optional[int] = None,
+                 maintenance: bool = True, poll_interval: float = 1.0, shutdown_timeout: float = 30.0):
+        flow = []
+        if max_messages is not None:
+            flow += ["--max-messages", str(max_messages)]
+        if max_bytes is not None:
+            flow += ["--max-bytes", str(max_bytes)]
+        self.workers = [
+            WorkerProcess(f"{name}-{index}", ["--consumers", name, "--no-outbox", "--no-retries", *flow])
+            for name, count in processes.items()
+            for index in range(count)
+        ]
+        if maintenance:
+            self.workers.append(WorkerProcess("maintenance", ["--consumers", ""]))
+        self.poll_interval = poll_interval
+        self.shutdown_timeout = shutdown_timeout
+        self._stopping = False
+
+    def stop(self, *_) -> None:
+        self._stopping = True
+
+    def run(self) -> None:
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        logger.info(f"Supervising {len(self.workers)} worker processes")
+        try:
+            while not self._stopping:
+                for worker in self.workers:
+                    worker.check()
+                time.sleep(self.poll_interval)
+        finally:
+            for worker in self.workers:
+                worker.terminate()
+            deadline = time.monotonic() + self.shutdown_timeout
+            for worker in self.workers:
+                worker.wait(max(0.0, deadline - time.monotonic()))
+            logger.info("Supervisor stopped")
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Runs N worker processes per Pub/Sub subscription.")
+    parser.add_argument("--processes", default=",".join(f"{name}=1" for name in CONSUMERS),
+                        help="comma-separated name=count, e.g. job_request=4,completion=2")
+    parser.add_argument("--max-messages", type=int, help="outstanding messages per process and subscription")
+    parser.add_argument("--max-bytes", type=int, help="outstanding bytes per process and subscription")
+    parser.add_argument("--no-maintenance", action="store_true",
+                        help="run no outbox drainer / retry scheduler worker (they run elsewhere)")
+    args = parser.parse_args(argv)
+    try:
+        processes = parse_processes(args.processes)
+    except ValueError as e:
+        parser.error(str(e))
+    Supervisor(processes, args.max_messages, args.max_bytes, maintenance=not args.no_maintenance).run()
+
+
+if __name__ == "__main__":
+    main()
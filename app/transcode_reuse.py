@@ -0,0 +1,107 @@
+"""
+Reuse of SUCCEEDED transcodes for identical source objects and job configs
+"""
+import asyncio
+import hashlib
+import json
+import threading
+from typing import Optional, Tuple
+
+from .crud import async_get_transcode_result
+from .custom_logger import logger
+from .job_config_cache import job_config_key
+from .models import Jobs, JobStateEnum, JobStatusEnum, TranscodeResults
+from .schemas import AdocJobRequest
+from .storage_uris import StorageUriValidator, parse_storage_url
+from .utils import run_blocking
+
+
+def result_fingerprint(identity: Tuple[int, str], request: AdocJobRequest, version: int) -> str:
+    """Hash of the source object (generation, md5) and everything that shapes the output."""
+    generation, md5 = identity
+    config = job_config_key(request.video_quality, request.audio_quality, request.drm_type,
+                            request.manifast_type, version, request.image_uri)
+    canonical = json.dumps([generation, md5, config], separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+async def compute_result_fingerprint(storage_uris: StorageUriValidator, request: AdocJobRequest,
+                                     version: int) -> Optional[str]:
+    """Fingerprint of a request's source object and config; None if the object can't be read."""
+    try:
+        identity = await run_blocking(storage_uris.object_identity, request.input_uri)
+    except Exception as e:
+        logger.warning(f"Could not fingerprint {request.input_uri}: {e}")
+        return None
+    if identity is None:
+        return None
+    return result_fingerprint(identity, request, version)
+
+
+class TranscodeReuse:
+    """Looks up and copies earlier results, counting the transcode time this saves."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.objects_copied = 0
+        self.seconds_saved = 0.0
+
+    async def find(self, fingerprint: Optional[str]) -> Optional[TranscodeResults]:
+        result = await async_get_transcode_result(fingerprint) if fingerprint else None
+        with self._lock:
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return result
+
+    async def copy_output(self, storage_uris: StorageUriValidator, result: TranscodeResults,
+                          output_uri: str) -> str:
+        """Copies the earlier output below ``output_uri`` unless it already lives there; returns the gs:// URL."""
+        source_bucket, source_prefix = parse_storage_url(result.output_uri)
+        bucket_name, prefix = parse_storage_url(output_uri, code=400, status_code=20400)
+        destination = f"gs://{bucket_name}/{prefix}"
+        if (source_bucket, source_prefix) == (bucket_name, prefix):
+            return destination
+
+        names = await run_blocking(storage_uris.list_objects, result.output_uri)
+        await asyncio.gather(*(
+            run_blocking(storage_uris.copy_object, source_bucket, name, destination + name[len(source_prefix):])
+            for name in names
+        ))
+        with self._lock:
+            self.objects_copied += len(names)
+        return destination
+
+    def mark_reused(self, jobs: Jobs, result: TranscodeResults, fingerprint: str) -> Jobs:
+        """Turns a new job row into a finished copy of ``result``."""
+        jobs.status = JobStatusEnum.COMPLETE
+        jobs.state = JobStateEnum.SUCCESS
+        jobs.duration_in_sec = result.duration_in_sec
+        jobs.content_fingerprint = fingerprint
+        jobs.reused_from = result.fully_qualified_name
+        with self._lock:
+            self.seconds_saved += result.duration_in_sec or 0.0
+        logger.info(f"Reused {result.fully_qualified_name} for {jobs.custom_name}, "
+                    f"saving {minutes_saved(result):.1f} transcode minutes")
+        return jobs
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "objects_copied": self.objects_copied,
+                "transcode_minutes_saved": self.seconds_saved / 60,
+            }
+
+
+def minutes_saved(result: TranscodeResults) -> float:
+    return (result.duration_in_sec or 0.0) / 60
+
+
+transcode_reuse = TranscodeReuse()
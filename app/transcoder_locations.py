@@ -0,0 +1,113 @@
+"""
+Least-loaded Transcoder location selection within per-bucket residency limits
+"""
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from .config import settings
+from .crud import async_in_flight_by_location
+from .custom_logger import logger
+from .exceptions import CustomException
+from .storage_uris import parse_storage_url
+
+
+def parse_locations(value: str, default: str) -> List[str]:
+    """Comma-separated location list; the single default location when empty."""
+    locations = [location.strip() for location in value.split(",") if location.strip()]
+    return locations or [default]
+
+
+def parse_bucket_locations(value: str) -> Dict[str, Tuple[str, ...]]:
+    """``bucket=loc1|loc2,other-bucket=loc3`` into {bucket: (allowed locations)}."""
+    constraints = {}
+    for entry in value.split(","):
+        if not entry.strip():
+            continue
+        bucket, _, locations = entry.partition("=")
+        constraints[bucket.strip()] = tuple(location.strip() for location in locations.split("|") if location.strip())
+    return constraints
+
+
+class LocationPool:
+    """Spreads job dispatch across Transcoder locations by in-flight count.
+
+    In-flight counts (jobs waiting or processing) are read from the jobs
+    table at most every ``refresh_interval`` seconds, so every process sees
+    the same load; choices made since the last read are added on top, so a
+    burst is spread out rather than sent to whichever location was emptiest
+    at the last read. Buckets listed in ``bucket_locations`` restrict the
+    locations their input or output may be processed in.
+    """
+
+    def __init__(self, locations: List[str], bucket_locations: Dict[str, Tuple[str, ...]],
+                 max_in_flight: int = 0, refresh_interval: float = 5.0, window_hours: int = 24):
+        self.locations = locations
+        self.bucket_locations = bucket_locations
+        self.max_in_flight = max_in_flight
+        self.refresh_interval = refresh_interval
+        self.window_hours = window_hours
+        self._in_flight: Dict[str, int] = {}
+        self._chosen: Dict[str, int] = {}
+        self._refreshed_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self.dispatched: Dict[str, int] = {location: 0 for location in locations}
+
+    def allowed(self, *uris: str) -> List[str]:
+        """Locations every bucket of ``uris`` may be processed in, in configured order."""
+        allowed = list(self.locations)
+        for uri in uris:
+            bucket_name, _ = parse_storage_url(uri, code=400, status_code=20400)
+            constraint = self.bucket_locations.get(bucket_name)
+            if constraint is not None:
+                allowed = [location for location in allowed if location in constraint]
+        if not allowed:
+            raise CustomException(code=400, status_code=40400,
+                                  detail="No Transcoder location satisfies the data residency of the given buckets.")
+        return allowed
+
+    async def _refresh(self) -> None:
+        with self._lock:
+            if self._refreshed_at is not None and time.monotonic() - self._refreshed_at < self.refresh_interval:
+                return
+        try:
+            in_flight = await async_in_flight_by_location(settings.LOCATION, self.window_hours)
+        except Exception as e:
+            # Keep dispatching on the last known counts rather than failing the request
+            logger.error(f"Could not read in-flight jobs per location: {e}")
+            return
+        with self._lock:
+            self._in_flight = in_flight
+            self._chosen = {}
+            self._refreshed_at = time.monotonic()
+
+    async def choose(self, input_uri: str, output_uri: str) -> str:
+        """Least-loaded allowed location, preferring ones under ``max_in_flight``; ties go to the earlier one."""
+        allowed = self.allowed(input_uri, output_uri)
+        await self._refresh()
+        with self._lock:
+            load = {loc: self._in_flight.get(loc, 0) + self._chosen.get(loc, 0) for loc in allowed}
+            location = min(allowed, key=lambda loc: (bool(self.max_in_flight) and load[loc] >= self.max_in_flight,
+                                                     load[loc]))
+            self._chosen[location] = self._chosen.get(location, 0) + 1
+            self.dispatched[location] = self.dispatched.get(location, 0) + 1
+        return location
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                location: {
+                    "in_flight": self._in_flight.get(location, 0) + self._chosen.get(location, 0),
+                    "max_in_flight": self.max_in_flight or None,
+                    "dispatched": self.dispatched.get(location, 0),
+                }
+                for location in self.locations
+            }
+
+
+location_pool = LocationPool(
+    parse_locations(settings.TRANSCODER_LOCATIONS, settings.LOCATION),
+    parse_bucket_locations(settings.BUCKET_ALLOWED_LOCATIONS),
+    max_in_flight=settings.TRANSCODER_LOCATION_MAX_IN_FLIGHT,
+    refresh_interval=settings.LOCATION_LOAD_REFRESH_SECONDS,
+)
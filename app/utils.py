@@ -1,8 +1,14 @@
+import asyncio
+import base64
+import csv
+import io
+import itertools
 import json
 #import logging
-import requests
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from enum import Enum
+from functools import partial
 from fastapi import Request, Depends, HTTPException
 from google.cloud import storage
 from google.cloud.video import transcoder_v1
@@ -11,16 +17,29 @@ from google.cloud.video.transcoder_v1.services.transcoder_service import (
     TranscoderServiceClient,
 )
 from google.cloud.video.transcoder_v1.types import JobTemplate
-from google.oauth2 import service_account
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List, Any, Annotated
+from typing import List, Any, Annotated, Callable, Dict, Optional, Sequence, Tuple, TypeVar
 
 from .config import settings
-from .database import get_db
+from .database import get_db, get_async_db
 from .exceptions import CustomException
+from .gcp_clients import GCPClients
+from .key_server import RETRYABLE_STATUS_CODES, key_response_cache, key_server_client
 from .custom_logger import logger
 
 db_dependency = Annotated[Session, Depends(get_db)]
+async_db_dependency = Annotated[AsyncSession, Depends(get_async_db)]
+
+T = TypeVar("T")
+
+# Bounded pool for blocking SDK / HTTP calls made from async code
+blocking_executor = ThreadPoolExecutor(max_workers=settings.BLOCKING_IO_WORKERS, thread_name_prefix="blocking-io")
+
+
+async def run_blocking(func: Callable[..., T], *args, **kwargs) -> T:
+    """Runs a blocking call on the bounded executor so the event loop stays responsive."""
+    return await asyncio.get_running_loop().run_in_executor(blocking_executor, partial(func, *args, **kwargs))
 
 
 class JobStatusEnum(Enum):
@@ -46,20 +65,20 @@ class DrmTypeEnum(Enum):
     FAIRPLAY = "fairplay"
 
 
-def get_gcp_transcoder_client() -> TranscoderServiceClient:
-    #credentials = service_account.Credentials.from_service_account_file('../key_stage.json')
-    credentials = service_account.Credentials.from_service_account_file('../key.json')
-    client = TranscoderServiceClient(credentials=credentials)
-    # client = TranscoderServiceClient()
-    return client
+def get_gcp_clients(request: Request) -> GCPClients:
+    return request.app.state.gcp_clients
 
 
 def get_transcoder_client(request: Request) -> TranscoderServiceClient:
-    return request.app.state.transcoder_client
+    return request.app.state.gcp_clients.transcoder
+
+
+def get_storage_client(request: Request) -> storage.Client:
+    return request.app.state.gcp_clients.storage
 
 
 def get_gcp_credentials(request: Request):
-    return request.app.state.credentials
+    return request.app.state.gcp_clients.credentials
 
 
 def pager_to_dict(pager: pagers.ListJobTemplatesPager) -> List[Any]:
@@ -88,14 +107,8 @@ def pager_to_list(pager: pagers.ListJobTemplatesPager) -> List[dict]:
 def build_jobs_data(jobs):
     """
     Construct a list of dictionaries representing job data.
+    Jobs are expected to arrive already ordered by the query.
     """
-    for job in jobs:
-        if isinstance(job.updated_at, str):
-            job.updated_at = datetime.fromisoformat(job.updated_at)
-
-    # Sort data by updated_time
-    jobs.sort(key=lambda job: job.updated_at, reverse=True)
-
     jobs_data = [{
         "job_start_time": job.created_at,
         "job_end_time": job.updated_at,
@@ -120,6 +133,43 @@ def build_jobs_data(jobs):
     return jobs_data
 
 
+def encode_job_cursor(updated_at: datetime, job_pk: int) -> str:
+    """Builds the opaque keyset cursor pointing after the given job."""
+    raw = f"{updated_at.isoformat()}|{job_pk}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_job_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Parses a cursor produced by encode_job_cursor into (updated_at, id)."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        updated_at, job_pk = raw.rsplit('|', 1)
+        return datetime.fromisoformat(updated_at), int(job_pk)
+    except (ValueError, UnicodeError):
+        raise CustomException(code=400, status_code=20400, detail="Invalid cursor")
+
+
+def export_value(value):
+    """Converts a column value into a plain JSON / CSV friendly value."""
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def rows_to_ndjson(rows, columns: List[str]) -> str:
+    return "".join(json.dumps(dict(zip(columns, map(export_value, row)))) + "\n" for row in rows)
+
+
+def rows_to_csv(rows) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([export_value(value) for value in row])
+    return buffer.getvalue()
+
+
 def remove_bucket_name(url: str):
     if url.startswith("https://storage.cloud.google.com/"):
         url_without_scheme = url.replace('https://storage.cloud.google.com/', '')
@@ -218,11 +268,48 @@ def get_job_details(
     return response.config.edit_list[0].end_time_offset
 
 
-def get_video_duration(client: TranscoderServiceClient, job_id: str):
-    response = get_job_details(client, settings.PROJECT_ID, settings.LOCATION, job_id)
+def job_duration_seconds(job: transcoder_v1.types.resources.Job) -> Optional[float]:
+    """Reads the input duration from a Job resource; None until the Transcoder has probed the input."""
+    if not job.config.edit_list:
+        return None
+    seconds = job.config.edit_list[0].end_time_offset.total_seconds()
+    return seconds or None
+
+
+def payload_duration_seconds(job_data: dict) -> Optional[float]:
+    """Reads the input duration from the job of a Transcoder Pub/Sub notification, if it carries one."""
+    edit_list = (job_data.get("config") or {}).get("editList") or []
+    if not edit_list:
+        return None
+    # Durations are JSON-encoded as e.g. "123.456s"
+    offset = str(edit_list[0].get("endTimeOffset") or "").rstrip("s")
+    try:
+        return float(offset) or None
+    except ValueError:
+        return None
+
+
+def get_video_duration(client: TranscoderServiceClient, name: str) -> Optional[float]:
+    """Fetches the job by its fully qualified name; blocking, call through run_blocking."""
+    return job_duration_seconds(client.get_job(name=name))
+
+
+def list_video_durations(client: TranscoderServiceClient, parent: str, names: Sequence[str],
+                         limit: int) -> Dict[str, Optional[float]]:
+    """Durations of those of ``names`` among the newest ``limit`` jobs of ``parent``, from one ListJobs page.
+
+    Jobs not in that page are left out of the result. Blocking, call through run_blocking.
+    """
+    wanted = set(names)
+    found = {}
+    jobs = client.list_jobs(request={"parent": parent, "page_size": limit, "order_by": "createTime desc"})
+    for job in itertools.islice(jobs, limit):
+        if job.name in wanted:
+            found[job.name] = job_duration_seconds(job)
+            if len(found) == len(wanted):
+                break
+    return found
 
-    time = response.total_seconds()
-    return str(time)
 
 def get_job_state(
         client: TranscoderServiceClient,
@@ -300,122 +387,6 @@ def delete_job(
     return None
 
 
-def check_file_or_directory(url: str):
-    # bucket_name = ""
-    # file_name = ""
-    # # Remove 'gs://' from the beginning
-    # if url.startswith("https://"):
-    #     url_without_gs = url.replace('https://', '')
-    #     # Split the remaining string at the first '/'
-    #     parts = url_without_gs.split('/')
-    #
-    #     # The first part will be the bucket name, and the second part will be the file path
-    #     bucket_name = parts[1]
-    #     file_name = parts[2]
-    #     # client = storage.Client.from_service_account_json('./key.json')
-    #     client = storage.Client()
-    #     bucket = client.get_bucket(bucket_name)
-    #     blob = bucket.blob(file_name)
-    #     return blob.exists()
-    # else:
-    #     url_without_gs = url.replace('gs://', '')
-    #     parts = url_without_gs.split('/')
-    #     # The first part will be the bucket name, and the second part will be the file path
-    #     bucket_name = parts[0]
-    #     file_name = parts[1]
-    #     # client = storage.Client.from_service_account_json('./key.json')
-    #     client = storage.Client()
-    #     bucket = client.get_bucket(bucket_name)
-    #     blob = bucket.blob(file_name)
-    #     return blob.exists()
-
-    # client = storage.Client.from_service_account_json('./key.json')
-    # client = storage.Client()
-    # bucket = client.get_bucket(bucket_name)
-    # blob = bucket.blob(file_name)
-    # return blob.exists()
-
-    # Determine if the URL is a GCS or HTTPS URL and adjust accordingly
-    if url.startswith("https://storage.cloud.google.com/"):
-        url_without_scheme = url.replace('https://storage.cloud.google.com/', '')
-    elif url.startswith("gs://"):
-        url_without_scheme = url.replace('gs://', '')
-    else:
-        print("Invalid URL schema")
-        raise CustomException(code=404, status_code=20404, detail="Invalid URL scheme")
-
-    # Split the URL into bucket name and file path
-    parts = url_without_scheme.split('/', 1)
-    if len(parts) < 2:
-        print("Invalid URL schema")
-        raise CustomException(code=404, status_code=20404, detail="Invalid URL scheme")
-
-    bucket_name, file_path = parts[0], parts[1]
-
-    # Initialize the storage client
-    # client = storage.Client()
-    #client = storage.Client.from_service_account_json('./key_stage.json')
-    client = storage.Client.from_service_account_json('./key.json')
-    try:
-        bucket = client.get_bucket(bucket_name)
-        blob = bucket.blob(file_path)
-    except Exception as e:
-        print(e)
-        raise CustomException(code=500, status_code=20500, detail=str(e))
-    return blob.exists()
-
-
-def create_directory(url: str, custom_name: str, content_id: str):
-    current_datetime = datetime.now().strftime('%Y%m%d%H%M')
-    # url_without_gs = url.replace('gs://', '')
-    #
-    # # Split the remaining string at the first '/'
-    # parts = url_without_gs.split('/', 1)
-    #
-    # # The first part will be the bucket name, and the second part will be the file path
-    # bucket_name = parts[0]
-    # file_name = parts[1]
-
-    if url.startswith("https://storage.cloud.google.com/"):
-        url_without_scheme = url.replace('https://storage.cloud.google.com/', '')
-    elif url.startswith("gs://"):
-        url_without_scheme = url.replace('gs://', '')
-    else:
-        print("Invalid URL scheme")
-        raise CustomException(code=400, status_code=20400, detail="Invalid URL scheme")
-
-    # Split the URL into bucket name and file path
-    parts = url_without_scheme.split('/', 1)
-    if len(parts) < 2:
-        print("Invalid URL")
-        raise CustomException(code=400, status_code=20400, detail="Invalid URL format")
-
-    bucket_name, file_path = parts[0], parts[1]
-
-    #client = storage.Client.from_service_account_json('./key_stage.json')
-    client = storage.Client.from_service_account_json('./key.json')
-    # client = storage.Client()
-
-    # Get the bucket
-    try:
-        bucket = client.bucket(bucket_name)
-
-        # Define the directory name with a trailing slash
-        #directory_blob_name = file_path + content_id + '/' + f"{current_datetime}-{custom_name}/"
-
-        directory_blob_name = file_path
-
-        # Create an empty blob (zero-byte object) representing the directory
-        blob = bucket.blob(directory_blob_name)
-        blob.upload_from_string('')  # Upload an empty string
-
-        # print(f"gs://{bucket_name}/{directory_blob_name}")
-        return f"gs://{bucket_name}/{directory_blob_name}"
-    except Exception as e:
-        print(e)
-        raise CustomException(code=500, status_code=20500, detail=str(e))
-
-
 def delete_job_template(
         client: TranscoderServiceClient,
         project_id: str,
@@ -465,7 +436,7 @@ def get_drm_schema(
     return drm_schema
 
 
-def call_key_server(
+async def call_key_server(
         package_id: str,
         content_id: str,
         provider_id: str,
@@ -481,30 +452,37 @@ def call_key_server(
         'drmScheme': get_drm_schema(drm_type)
     }
     print(data)
-    url = settings.KEY_SERVER_URL
-    inp_post_response = requests.post(url, json=data)
 
-    if inp_post_response.status_code == 201:
-        return extract_keys(json.loads(inp_post_response.content.decode('utf-8')))
-    else:
-        logger.error(inp_post_response.json())
-        raise CustomException(code=404, status_code=20404, detail=f"{inp_post_response.json()}")
+    async def fetch():
+        inp_post_response = await key_server_client.post(data)
+
+        if inp_post_response.status_code == 201:
+            return extract_keys(inp_post_response.json())
+        else:
+            logger.error(inp_post_response.text)
+            if inp_post_response.status_code in RETRYABLE_STATUS_CODES:
+                # Still failing after the client's own retries: transient, worth retrying later
+                raise CustomException(code=503, status_code=20503, detail=f"{inp_post_response.text}")
+            raise CustomException(code=404, status_code=20404, detail=f"{inp_post_response.text}")
+
+    # Identical requests (re-uploads, re-transcodes) are answered from memory for KEY_CACHE_TTL_SECONDS
+    key = key_response_cache.key(package_id, content_id, provider_id, data['quality'], data['drmScheme'])
+    return await key_response_cache.get_or_fetch(key, fetch)
 
 
-def get_keys(
+async def get_keys(
         video_quality: list[int],
         audio_quality: list[int],
         drm_type: list[str]
 ):
-    url = f"{settings.KEY_SERVER_URL}/1/1"
     data = {
         'quality': get_quality(video_quality, audio_quality),
         'drmScheme': get_drm_schema(drm_type)
     }
-    inp_post_response = requests.post(url, json=data)
+    inp_post_response = await key_server_client.post(data, "/1/1")
 
     if inp_post_response.status_code == 200:
-        return extract_keys(json.loads(inp_post_response.content.decode('utf-8')))
+        return extract_keys(inp_post_response.json())
     else:
         raise CustomException(code=402, status_code=20402, detail="Error to get keys from key server")
 
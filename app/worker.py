@@ -0,0 +1,126 @@
+"""
+Consumer worker entry point, scaled separately from the HTTP API
+
+    python -m app.worker --consumers job_request,completion,trigger
+"""
+import argparse
+import asyncio
+import signal
+from typing import Dict, Iterable, List, Optional
+
+from .config import settings
+from .consumers.job_completion import consume_message_on_job_completion
+from .consumers.job_request import consume_job_request, job_request_retry_handler
+from .consumers.process_cloud_storage_trigger import process_cloud_storage_trigger, trigger_retry_handler
+from .consumers.runtime import subscriptions
+from .custom_logger import logger
+from .database import get_async_engine
+from .gcp_clients import GCPClients
+from .loop_local import close_loop_resources
+from .outbox import start_outbox_drainer
+from .retries import start_retry_scheduler
+
+CONSUMERS = ("job_request", "completion", "trigger")
+
+
+def parse_consumers(value: str) -> List[str]:
+    consumers = [name.strip() for name in value.split(",") if name.strip()]
+    unknown = sorted(set(consumers) - set(CONSUMERS))
+    if unknown:
+        raise ValueError(f"Unknown consumers {', '.join(unknown)}; choose from {', '.join(CONSUMERS)}")
+    return consumers
+
+
+def start_consumers(gcp_clients: GCPClients, consumers: Iterable[str], outbox: bool = True, retries: bool = True,
+                    flow_overrides: Optional[dict] = None) -> Dict[str, asyncio.Task]:
+    """Starts the given subscribers, plus the outbox drainer and retry scheduler, on the current loop."""
+    subscriber = gcp_clients.subscriber
+    tasks = {}
+    for name in consumers:
+        if name == "job_request":
+            path = subscriber.subscription_path(settings.PROJECT_NAME, settings.JOB_REQUEST_SUBSCRIPTION_ID)
+            tasks[name] = asyncio.create_task(consume_job_request(subscriber, path, gcp_clients, flow_overrides))
+        elif name == "completion":
+            path = subscriber.subscription_path(settings.PROJECT_NAME, settings.JOB_COMPLETION_SUBSCRIPTION_ID)
+            tasks[name] = asyncio.create_task(
+                consume_message_on_job_completion(gcp_clients, subscriber, path, flow_overrides))
+        elif name == "trigger":
+            path = subscriber.subscription_path(settings.PROJECT_NAME_TOFFEE,
+                                                settings.CLOUD_STORAGE_TRIGGER_SUBSCRIPTION)
+            tasks[name] = asyncio.create_task(
+                process_cloud_storage_trigger(subscriber, path, gcp_clients, flow_overrides))
+    if outbox:
+        # Publishes the notifications the consumers commit to the outbox
+        tasks["outbox_drainer"] = start_outbox_drainer(gcp_clients.publisher)
+    if retries:
+        # Re-runs failed job requests from the retry table
+        tasks["retry_scheduler"] = start_retry_scheduler({
+            "job_request": job_request_retry_handler(gcp_clients),
+            "trigger": trigger_retry_handler(gcp_clients),
+        })
+    logger.info(f"Started background tasks: {', '.join(tasks) or 'none'}")
+    return tasks
+
+
+async def log_subscription_stats(interval: float) -> None:
+    """Logs what /metrics reports under ``subscriptions``; a worker serves no HTTP, so this is how they surface."""
+    while True:
+        await asyncio.sleep(interval)
+        for name, runtime in list(subscriptions.items()):
+            logger.info(f"Subscription '{name}' stats: {runtime.stats()}")
+
+
+async def stop_consumers(tasks: Dict[str, asyncio.Task]) -> None:
+    for task in tasks.values():
+        task.cancel()
+    await asyncio.gather(*tasks.values(), return_exceptions=True)
+
+
+async def run_worker(consumers: List[str], outbox: bool = True, retries: bool = True,
+                     flow_overrides: Optional[dict] = None) -> None:
+    """Runs the consumers until SIGTERM / SIGINT, then shuts them down like the API lifespan does."""
+    gcp_clients = GCPClients.from_service_account_file(settings.SERVICE_ACCOUNT_FILE)
+    get_async_engine()
+
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stopping.set)
+
+    tasks = start_consumers(gcp_clients, consumers, outbox=outbox, retries=retries, flow_overrides=flow_overrides)
+    if consumers and settings.WORKER_STATS_INTERVAL_SECONDS > 0:
+        tasks["subscription_stats"] = asyncio.create_task(
+            log_subscription_stats(settings.WORKER_STATS_INTERVAL_SECONDS))
+    try:
+        # A subscription that stops on its own ends the worker, so the orchestrator restarts it
+        waiter = asyncio.create_task(stopping.wait())
+        await asyncio.wait([waiter, *tasks.values()], return_when=asyncio.FIRST_COMPLETED)
+        waiter.cancel()
+    finally:
+        logger.info("Worker shutting down")
+        await stop_consumers(tasks)
+        gcp_clients.close()
+        await close_loop_resources()
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Runs Pub/Sub consumers without the HTTP API.")
+    parser.add_argument("--consumers", default=",".join(CONSUMERS),
+                        help=f"comma-separated subset of {', '.join(CONSUMERS)} (default: all)")
+    parser.add_argument("--no-outbox", action="store_true", help="do not drain the notification outbox here")
+    parser.add_argument("--no-retries", action="store_true", help="do not run the job request retry scheduler here")
+    parser.add_argument("--max-messages", type=int, help="outstanding messages per streaming pull")
+    parser.add_argument("--max-bytes", type=int, help="outstanding bytes per streaming pull")
+    args = parser.parse_args(argv)
+    try:
+        consumers = parse_consumers(args.consumers)
+    except ValueError as e:
+        parser.error(str(e))
+    # Unset flags fall back to the SUBSCRIBER_* settings of each subscription
+    flow_overrides = {"max_messages": args.max_messages, "max_bytes": args.max_bytes}
+    asyncio.run(run_worker(consumers, outbox=not args.no_outbox, retries=not args.no_retries,
+                           flow_overrides=flow_overrides))
+
+
+if __name__ == "__main__":
+    main()
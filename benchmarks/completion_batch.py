@@ -0,0 +1,84 @@
+"""
+Completion updates/sec of the bulk UPDATE ... FROM (VALUES ...) at several batch sizes.
+
+Needs a local Postgres with the schema migrated (``alembic upgrade head``) and
+the usual DB_* settings in the environment. Seeds ``--jobs`` throwaway rows,
+pushes them through MicroBatcher + async_update_job_states with
+max(``--concurrency``, batch size) concurrent submitters, and deletes the
+rows afterwards. Batch size 1 matches the old one-transaction-per-message
+path. Run from the repository root:
+
+    python -m benchmarks.completion_batch --jobs 2000 --batch-sizes 1,10,50,100,250
+"""
+import argparse
+import asyncio
+import time
+import uuid
+
+from sqlalchemy import delete, insert
+
+from app.consumers.batcher import MicroBatcher
+from app.crud import async_update_job_states
+from app.database import async_session
+from app.loop_local import close_loop_resources
+from app.models import Jobs, JobStatusEnum
+
+
+async def seed(prefix: str, count: int) -> list:
+    names = [f"{prefix}/jobs/{i}" for i in range(count)]
+    async with async_session() as session:
+        async with session.begin():
+            await session.execute(insert(Jobs), [
+                {"fully_qualified_name": name, "custom_name": name, "status": JobStatusEnum.PROCESSING}
+                for name in names
+            ])
+    return names
+
+
+async def cleanup(prefix: str) -> None:
+    async with async_session() as session:
+        async with session.begin():
+            await session.execute(delete(Jobs).where(Jobs.fully_qualified_name.like(f"{prefix}/%")))
+
+
+async def run(names: list, batch_size: int, concurrency: int, max_wait: float) -> float:
+    async def flush(batch):
+        await async_update_job_states([(name, "SUCCEEDED", 42.0) for name in batch])
+
+    batcher = MicroBatcher("bench", flush, max_size=batch_size, max_wait=max_wait)
+    queue = iter(names)
+
+    async def submitter():
+        for name in queue:
+            await batcher.submit(name)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(submitter() for _ in range(concurrency)))
+    await batcher.close()
+    return len(names) / (time.perf_counter() - start)
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--jobs", type=int, default=2000)
+    parser.add_argument("--batch-sizes", default="1,10,50,100,250")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--max-wait-ms", type=float, default=200.0)
+    args = parser.parse_args()
+
+    prefix = f"projects/bench-{uuid.uuid4().hex[:8]}/locations/local"
+    names = await seed(prefix, args.jobs)
+    try:
+        baseline = None
+        for batch_size in (int(size) for size in args.batch_sizes.split(",")):
+            # Same admission rule as the completion runtime: max(MAX_WORKERS, batch size)
+            rate = await run(names, batch_size, max(batch_size, args.concurrency), args.max_wait_ms / 1000)
+            baseline = baseline or rate
+            print(f"batch size {batch_size:5d}: {rate:10.1f} updates/s ({rate / baseline:.2f}x)")
+    finally:
+        await cleanup(prefix)
+        await close_loop_resources()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
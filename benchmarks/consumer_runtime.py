@@ -0,0 +1,104 @@
+"""
+Messages/sec of the consumer callback path under a fake subscriber.
+
+Compares the old ``asyncio.run`` per message wrapper with ConsumerRuntime,
+which keeps one loop per subscription. Each callback needs a loop-bound
+resource (standing in for an engine pool or HTTP session) that costs
+``--setup-ms`` to open; only the long-lived loop can keep it between messages.
+Run from the repository root:
+
+    python -m benchmarks.consumer_runtime --messages 5000 --threads 10
+"""
+import argparse
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.consumers.runtime import ConsumerRuntime
+
+
+class FakeMessage:
+    def __init__(self, payload: bytes, done: threading.Semaphore):
+        self.data = payload
+        self._done = done
+
+    def ack(self):
+        self._done.release()
+
+
+class FakeSubscriber:
+    """Invokes the callback from a thread pool, like the Pub/Sub streaming pull does."""
+
+    def __init__(self, threads: int):
+        self.threads = threads
+
+    def deliver(self, callback, messages):
+        with ThreadPoolExecutor(max_workers=self.threads) as executor:
+            for message in messages:
+                executor.submit(callback, message)
+
+
+SETUP_SECONDS = 0.005
+_resources = {}
+
+
+async def get_resource():
+    loop = asyncio.get_running_loop()
+    if loop not in _resources:
+        await asyncio.sleep(SETUP_SECONDS)
+        _resources[loop] = object()
+    return _resources[loop]
+
+
+async def callback(message: FakeMessage) -> None:
+    try:
+        json.loads(message.data.decode('utf-8'))
+        await get_resource()
+        # Stands in for awaiting the DB / key server.
+        await asyncio.sleep(0.001)
+    finally:
+        message.ack()
+
+
+def run(wrapper, messages: int, threads: int) -> float:
+    _resources.clear()
+    done = threading.Semaphore(0)
+    payload = json.dumps({"custom_name": "bench", "video_quality": [360, 480, 720, 1080]}).encode('utf-8')
+    batch = [FakeMessage(payload, done) for _ in range(messages)]
+
+    start = time.perf_counter()
+    FakeSubscriber(threads).deliver(wrapper, batch)
+    for _ in range(messages):
+        done.acquire()
+    return messages / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--threads", type=int, default=10)
+    parser.add_argument("--max-in-flight", type=int, default=10)
+    parser.add_argument("--setup-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    global SETUP_SECONDS
+    SETUP_SECONDS = args.setup_ms / 1000
+
+    def asyncio_run_wrapper(message):
+        asyncio.run(callback(message))
+
+    before = run(asyncio_run_wrapper, args.messages, args.threads)
+    print(f"asyncio.run per message: {before:10.1f} msg/s")
+
+    runtime = ConsumerRuntime("bench", max_in_flight=args.max_in_flight).start()
+    try:
+        after = run(runtime.wrap(callback), args.messages, args.threads)
+    finally:
+        runtime.stop()
+    print(f"ConsumerRuntime:         {after:10.1f} msg/s ({after / before:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
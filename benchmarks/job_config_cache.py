@@ -0,0 +1,50 @@
+"""
+Micro-benchmark: building a Transcoder JobConfig vs copying it from JobConfigCache.
+
+Needs the application requirements and a .env (or environment) with the
+service settings. Run from the repository root:
+
+    python -m benchmarks.job_config_cache --iterations 2000
+"""
+import argparse
+import time
+
+from app.gcp_utils import build_job_config
+from app.job_config_cache import JobConfigCache
+
+# The storage-trigger profile from prepare_job_request
+PROFILE = dict(
+    video_quality=[360, 480, 720, 1080],
+    audio_quality=[64],
+    drm_type=["both"],
+    manifast_type=["dash", "hls"],
+    version=1,
+    image_uri="gs://bucket/images/toffee-vertical-logo-high-res.png",
+)
+
+
+def per_second(func, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return iterations / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    cache = JobConfigCache(maxsize=8)
+    assert cache.get(**PROFILE) == build_job_config(**PROFILE)
+
+    built = per_second(lambda: build_job_config(**PROFILE), args.iterations)
+    cached = per_second(lambda: cache.get(**PROFILE), args.iterations)
+
+    print(f"build_job_config:   {built:10.1f} configs/s")
+    print(f"JobConfigCache.get: {cached:10.1f} configs/s ({cached / built:.2f}x)")
+    print(f"cache stats: {cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
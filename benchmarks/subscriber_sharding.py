@@ -0,0 +1,136 @@
+"""
+Messages/sec of one subscription consumed by 1..N worker processes.
+
+Needs a local Pub/Sub emulator (``gcloud beta emulators pubsub start``) with
+PUBSUB_EMULATOR_HOST exported, and the usual app settings in the
+environment. Publishes ``--messages`` job requests to a throwaway topic,
+then drains them with each process count in turn. Every process runs its
+own streaming pull through ConsumerRuntime / run_subscription, and its
+callback does the CPU-bound part of a job request: JSON decode, pydantic
+validation and building the Transcoder Job protobuf. The topic and
+subscription are deleted afterwards. Run from the repository root:
+
+    python -m benchmarks.subscriber_sharding --messages 20000 --processes 1,2,4
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import time
+import uuid
+
+from google.cloud import pubsub_v1
+from google.cloud.video import transcoder_v1
+
+from app.consumers.runtime import ConsumerRuntime, run_subscription
+from app.job_config_cache import job_config_cache
+from app.schemas import AdocJobRequest
+
+PAYLOAD = {
+    "content_id": "bench",
+    "package_id": "bench",
+    "provider_id": "bench",
+    "created_by": "benchmark",
+    "description": "subscriber sharding benchmark",
+    "input_uri": "gs://bench-input/video.mp4",
+    "output_uri": "gs://bench-output/video/",
+    "image_uri": "gs://bench-input/images/logo.png",
+    "video_quality": [360, 480, 720, 1080],
+    "audio_quality": [64],
+    "drm_type": ["both"],
+    "manifast_type": ["dash", "hls"],
+}
+
+
+def consume(subscription_path: str, max_messages: int, processed, ready, go, stop) -> None:
+    async def callback(message) -> None:
+        request = AdocJobRequest(**json.loads(message.data.decode('utf-8')))
+        job = transcoder_v1.types.Job(input_uri=request.input_uri, output_uri=request.output_uri)
+        job.config = job_config_cache.get(request.video_quality, request.audio_quality, request.drm_type,
+                                          request.manifast_type, 1, request.image_uri)
+        message.ack()
+        with processed.get_lock():
+            processed.value += 1
+
+    async def main() -> None:
+        subscriber = pubsub_v1.SubscriberClient()
+        runtime = ConsumerRuntime("bench", max_in_flight=max_messages)
+        with ready.get_lock():
+            ready.value += 1
+        await asyncio.get_running_loop().run_in_executor(None, go.wait)
+        task = asyncio.create_task(run_subscription(subscriber, subscription_path, callback, runtime,
+                                                    {"max_messages": max_messages}))
+        await asyncio.get_running_loop().run_in_executor(None, stop.wait)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        subscriber.close()
+
+    asyncio.run(main())
+
+
+def publish(publisher: pubsub_v1.PublisherClient, topic_path: str, messages: int) -> None:
+    futures = []
+    for i in range(messages):
+        payload = dict(PAYLOAD, custom_name=f"bench_{i}")
+        futures.append(publisher.publish(topic_path, json.dumps(payload).encode('utf-8')))
+    for future in futures:
+        future.result()
+
+
+def run(subscription_path: str, processes: int, messages: int, max_messages: int) -> float:
+    context = multiprocessing.get_context("spawn")
+    processed, ready = context.Value("i", 0), context.Value("i", 0)
+    go, stop = context.Event(), context.Event()
+    children = [context.Process(target=consume, args=(subscription_path, max_messages, processed, ready, go, stop))
+                for _ in range(processes)]
+    for child in children:
+        child.start()
+    while ready.value < processes:
+        time.sleep(0.05)
+
+    start = time.perf_counter()
+    go.set()
+    while processed.value < messages:
+        time.sleep(0.01)
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    for child in children:
+        child.join(30)
+    return messages / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--processes", default="1,2,4")
+    parser.add_argument("--max-messages", type=int, default=100)
+    parser.add_argument("--project", default="bench-project")
+    args = parser.parse_args()
+
+    if "PUBSUB_EMULATOR_HOST" not in os.environ:
+        parser.error("PUBSUB_EMULATOR_HOST is not set; start the Pub/Sub emulator first")
+
+    publisher = pubsub_v1.PublisherClient()
+    subscriber = pubsub_v1.SubscriberClient()
+    name = f"bench-sharding-{uuid.uuid4().hex[:8]}"
+    topic_path = publisher.topic_path(args.project, name)
+    subscription_path = subscriber.subscription_path(args.project, name)
+    publisher.create_topic(name=topic_path)
+    subscriber.create_subscription(name=subscription_path, topic=topic_path, ack_deadline_seconds=60)
+    try:
+        baseline = None
+        for processes in [int(p) for p in args.processes.split(",")]:
+            publish(publisher, topic_path, args.messages)
+            rate = run(subscription_path, processes, args.messages, args.max_messages)
+            baseline = baseline or rate
+            print(f"{processes:3d} processes: {rate:10.1f} msg/s ({rate / baseline:.2f}x)")
+    finally:
+        subscriber.delete_subscription(subscription=subscription_path)
+        publisher.delete_topic(topic=topic_path)
+        subscriber.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""initial schema
+
+Matches the tables previously created by Base.metadata.create_all at import
+time. Databases that were created that way should be stamped with
+`alembic stamp 0001_initial_schema` before running `alembic upgrade head`.
+
+Revision ID: 0001_initial_schema
+Revises:
+Create Date: 2024-06-10 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001_initial_schema'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+job_status_enum = sa.Enum('WAITING', 'PROCESSING', 'COMPLETE', name='jobstatusenum')
+job_state_enum = sa.Enum('INIT', 'SUCCESS', 'FAILED', name='jobstateenum')
+protection_type_enum = sa.Enum('AES128', 'DRM', 'BOTH', name='protectiontypeenum')
+drm_type_enum = sa.Enum('WIDEVINE', 'FAIRPLAY', name='drmtypeenum')
+
+
+def upgrade() -> None:
+    op.create_table(
+        'users',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('email', sa.String(), nullable=False),
+        sa.Column('password', sa.String(), nullable=False),
+        sa.Column('created_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('phone_number', sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('email'),
+    )
+    op.create_table(
+        'posts',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('title', sa.String(), nullable=False),
+        sa.Column('content', sa.String(), nullable=False),
+        sa.Column('published', sa.Boolean(), server_default='FALSE', nullable=False),
+        sa.Column('created_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('owner_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['owner_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_table(
+        'votes',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('post_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['post_id'], ['posts.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id', 'post_id'),
+    )
+    op.create_table(
+        'admin_users',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('email', sa.String(), nullable=True),
+        sa.Column('username', sa.String(), nullable=True),
+        sa.Column('first_name', sa.String(), nullable=True),
+        sa.Column('last_name', sa.String(), nullable=True),
+        sa.Column('hashed_password', sa.String(), nullable=True),
+        sa.Column('is_active', sa.Boolean(), nullable=True),
+        sa.Column('role', sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('email'),
+        sa.UniqueConstraint('username'),
+    )
+    op.create_index('ix_admin_users_id', 'admin_users', ['id'])
+    op.create_table(
+        'todos',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('title', sa.String(), nullable=True),
+        sa.Column('description', sa.String(), nullable=True),
+        sa.Column('priority', sa.Integer(), nullable=True),
+        sa.Column('complete', sa.Boolean(), nullable=True),
+        sa.Column('owner_id', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['owner_id'], ['admin_users.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_todos_id', 'todos', ['id'])
+    op.create_table(
+        'jobs',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('job_id', sa.String(), nullable=True),
+        sa.Column('project_id', sa.String(), nullable=True),
+        sa.Column('template_id', sa.String(), nullable=True),
+        sa.Column('package_id', sa.String(), nullable=True),
+        sa.Column('content_id', sa.String(), nullable=True),
+        sa.Column('provider_id', sa.String(), nullable=True),
+        sa.Column('description', sa.String(), nullable=True),
+        sa.Column('custom_name', sa.String(), nullable=True),
+        sa.Column('fully_qualified_name', sa.String(), nullable=True),
+        sa.Column('location', sa.String(), nullable=True),
+        sa.Column('input_uri', sa.String(), nullable=True),
+        sa.Column('output_uri', sa.String(), nullable=True),
+        sa.Column('created_by', sa.String(), nullable=True),
+        sa.Column('version', sa.Integer(), nullable=True),
+        sa.Column('duration_in_sec', sa.String(), nullable=True),
+        sa.Column('status', job_status_enum, nullable=True),
+        sa.Column('state', job_state_enum, nullable=True),
+        sa.Column('created_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('updated_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('custom_name'),
+    )
+    op.create_index('ix_jobs_id', 'jobs', ['id'])
+    op.create_table(
+        'job_templates',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('project_id', sa.Integer(), nullable=True),
+        sa.Column('template_id', sa.String(), nullable=True),
+        sa.Column('description', sa.String(), nullable=True),
+        sa.Column('location', sa.String(), nullable=True),
+        sa.Column('topic', sa.String(), nullable=True),
+        sa.Column('custom_name', sa.String(), nullable=True),
+        sa.Column('fully_qualified_name', sa.String(), nullable=True),
+        sa.Column('protection_type', protection_type_enum, nullable=True),
+        sa.Column('drm_type', drm_type_enum, nullable=True),
+        sa.Column('num_manifest_file', sa.String(), nullable=True),
+        sa.Column('container_format', sa.String(), nullable=True),
+        sa.Column('created_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('updated_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('custom_name'),
+    )
+    op.create_index('ix_job_templates_id', 'job_templates', ['id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_job_templates_id', table_name='job_templates')
+    op.drop_table('job_templates')
+    op.drop_index('ix_jobs_id', table_name='jobs')
+    op.drop_table('jobs')
+    op.drop_index('ix_todos_id', table_name='todos')
+    op.drop_table('todos')
+    op.drop_index('ix_admin_users_id', table_name='admin_users')
+    op.drop_table('admin_users')
+    op.drop_table('votes')
+    op.drop_table('posts')
+    op.drop_table('users')
+    drm_type_enum.drop(op.get_bind(), checkfirst=True)
+    protection_type_enum.drop(op.get_bind(), checkfirst=True)
+    job_state_enum.drop(op.get_bind(), checkfirst=True)
+    job_status_enum.drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,39 @@
+"""index jobs lookup columns
+
+job_id and fully_qualified_name are looked up on every API read and every
+completion message; listings filter by status ordered by updated_at.
+The indexes are built CONCURRENTLY so existing tables stay writable.
+
+Revision ID: 0002_jobs_lookup_indexes
+Revises: 0001_initial_schema
+Create Date: 2024-06-10 10:05:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002_jobs_lookup_indexes'
+down_revision: Union[str, None] = '0001_initial_schema'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index('ix_jobs_job_id', 'jobs', ['job_id'],
+                        postgresql_concurrently=True, if_not_exists=True)
+        op.create_index('ix_jobs_fully_qualified_name', 'jobs', ['fully_qualified_name'],
+                        postgresql_concurrently=True, if_not_exists=True)
+        op.create_index('ix_jobs_status_updated_at', 'jobs', ['status', sa.text('updated_at DESC')],
+                        postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_jobs_status_updated_at', table_name='jobs', postgresql_concurrently=True)
+        op.drop_index('ix_jobs_fully_qualified_name', table_name='jobs', postgresql_concurrently=True)
+        op.drop_index('ix_jobs_job_id', table_name='jobs', postgresql_concurrently=True)
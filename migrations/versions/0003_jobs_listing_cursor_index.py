@@ -0,0 +1,31 @@
+"""index jobs listing cursor
+
+/job/list pages with a keyset cursor on (updated_at, id) in descending order.
+
+Revision ID: 0003_jobs_listing_cursor_index
+Revises: 0002_jobs_lookup_indexes
+Create Date: 2024-06-12 09:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003_jobs_listing_cursor_index'
+down_revision: Union[str, None] = '0002_jobs_lookup_indexes'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index('ix_jobs_updated_at_id', 'jobs', [sa.text('updated_at DESC'), sa.text('id DESC')],
+                        postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_jobs_updated_at_id', table_name='jobs', postgresql_concurrently=True)
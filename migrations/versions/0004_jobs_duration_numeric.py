@@ -0,0 +1,42 @@
+"""store jobs duration as numeric
+
+duration_in_sec held str(float) values; it becomes NUMERIC(12, 3) so it can
+be written from the dispatch response / completion payload as a number.
+Values that do not parse as a number become NULL.
+
+Revision ID: 0004_jobs_duration_numeric
+Revises: 0003_jobs_listing_cursor_index
+Create Date: 2024-06-18 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004_jobs_duration_numeric'
+down_revision: Union[str, None] = '0003_jobs_listing_cursor_index'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.alter_column(
+        'jobs', 'duration_in_sec',
+        existing_type=sa.String(),
+        type_=sa.Numeric(12, 3),
+        postgresql_using=(
+            "CASE WHEN duration_in_sec ~ '^[0-9]+(\\.[0-9]+)?$' THEN duration_in_sec::numeric(12, 3) END"
+        ),
+    )
+
+
+def downgrade() -> None:
+    op.alter_column(
+        'jobs', 'duration_in_sec',
+        existing_type=sa.Numeric(12, 3),
+        type_=sa.String(),
+        postgresql_using='duration_in_sec::text',
+    )
@@ -0,0 +1,39 @@
+"""add dispatch claims
+
+Claim rows keyed by Pub/Sub message_id and by a request fingerprint; the job
+request consumer takes one before dispatching to the Transcoder.
+
+Revision ID: 0005_dispatch_claims
+Revises: 0004_jobs_duration_numeric
+Create Date: 2024-06-20 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005_dispatch_claims'
+down_revision: Union[str, None] = '0004_jobs_duration_numeric'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'dispatch_claims',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('message_id', sa.String(), nullable=True),
+        sa.Column('fingerprint', sa.String(), nullable=False),
+        sa.Column('custom_name', sa.String(), nullable=True),
+        sa.Column('created_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('message_id'),
+        sa.UniqueConstraint('fingerprint'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('dispatch_claims')
@@ -0,0 +1,43 @@
+"""add transcode results
+
+Successful outputs keyed by a fingerprint of the source object generation and
+the normalized job config, so identical requests can reuse them.
+
+Revision ID: 0006_transcode_results
+Revises: 0005_dispatch_claims
+Create Date: 2024-06-24 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0006_transcode_results'
+down_revision: Union[str, None] = '0005_dispatch_claims'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('jobs', sa.Column('content_fingerprint', sa.String(), nullable=True))
+    op.add_column('jobs', sa.Column('reused_from', sa.String(), nullable=True))
+    op.create_table(
+        'transcode_results',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('fingerprint', sa.String(), nullable=False),
+        sa.Column('fully_qualified_name', sa.String(), nullable=True),
+        sa.Column('output_uri', sa.String(), nullable=True),
+        sa.Column('duration_in_sec', sa.Numeric(12, 3), nullable=True),
+        sa.Column('created_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('fingerprint'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('transcode_results')
+    op.drop_column('jobs', 'reused_from')
+    op.drop_column('jobs', 'content_fingerprint')
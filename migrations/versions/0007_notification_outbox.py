@@ -0,0 +1,43 @@
+"""add notification outbox
+
+Job status notifications are written to notification_outbox in the same
+transaction as the job update and published by a background drainer.
+
+Revision ID: 0007_notification_outbox
+Revises: 0006_transcode_results
+Create Date: 2024-06-26 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0007_notification_outbox'
+down_revision: Union[str, None] = '0006_transcode_results'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'notification_outbox',
+        sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column('topic', sa.String(), nullable=False),
+        sa.Column('ordering_key', sa.String(), server_default='', nullable=False),
+        sa.Column('payload', sa.Text(), nullable=False),
+        sa.Column('attempts', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('leased_until', sa.TIMESTAMP(timezone=True), nullable=True),
+        sa.Column('delivered_at', sa.TIMESTAMP(timezone=True), nullable=True),
+        sa.Column('created_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_notification_outbox_pending', 'notification_outbox', ['id'],
+                    postgresql_where=sa.text('delivered_at IS NULL'))
+
+
+def downgrade() -> None:
+    op.drop_index('ix_notification_outbox_pending', table_name='notification_outbox')
+    op.drop_table('notification_outbox')
@@ -0,0 +1,36 @@
+"""add state and lease to dispatch claims
+
+A claim is 'claimed' until its dispatch succeeds and 'dispatched' after;
+claimed rows carry a lease so the claim of a crashed worker can be taken
+over. Existing claims are taken as dispatched.
+
+Revision ID: 0009_dispatch_claim_leases
+Revises: 0008_retries_and_dead_letters
+Create Date: 2024-07-02 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0009_dispatch_claim_leases'
+down_revision: Union[str, None] = '0008_retries_and_dead_letters'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('dispatch_claims',
+                  sa.Column('state', sa.String(), server_default='claimed', nullable=False))
+    op.add_column('dispatch_claims', sa.Column('leased_until', sa.TIMESTAMP(timezone=True), nullable=True))
+    op.add_column('dispatch_claims', sa.Column('dispatched_at', sa.TIMESTAMP(timezone=True), nullable=True))
+    op.execute("UPDATE dispatch_claims SET state = 'dispatched', dispatched_at = created_at")
+
+
+def downgrade() -> None:
+    op.drop_column('dispatch_claims', 'dispatched_at')
+    op.drop_column('dispatch_claims', 'leased_until')
+    op.drop_column('dispatch_claims', 'state')
@@ -0,0 +1,50 @@
+import logging
+import os
+import tempfile
+
+# Required settings without defaults; nothing here is contacted by the tests
+TEST_SETTINGS = {
+    "DB_HOSTNAME": "localhost",
+    "DB_PORT": "5432",
+    "DB_USER": "transcoder",
+    "DB_PASSWORD": "transcoder",
+    "DB_NAME": "transcoder",
+    "PROJECT_ID": "test-project",
+    "LOCATION": "asia-south1",
+    "JOB_REQUEST_SUBSCRIPTION_ID": "job-request",
+    "JOB_START_TOPIC_PATH": "projects/test-project/topics/job-start",
+    "JOB_COMPLETION_SUBSCRIPTION": "job-completion",
+    "JOB_COMPLETION_TOPIC": "job-completion",
+    "CUSTOM_HEADER_FIELD": "x-user",
+    "JOB_COMPLETION_SUBSCRIPTION_ID": "job-completion",
+    "ALLOWED_ROLES": "admin",
+    "PROJECT_NAME": "test-project",
+    "MAX_WORKERS": "4",
+    "ROUTE_PREFIX": "/api",
+    "API_VERSION": "v1",
+    "SECRET_ID": "secret",
+    "KEY_SERVER_URL": "http://key-server.test",
+    "SECRET_VERSION": "1",
+    "ENV": "test",
+    "CLOUD_STORAGE_TRIGGER_SUBSCRIPTION": "storage-trigger",
+    "PROJECT_NAME_TOFFEE": "test-project",
+    "OUTPUT_BUCKET_TOFFEE": "output-bucket",
+    "MEDIA_CDN_BASE": "https://cdn.test",
+}
+
+for key, value in TEST_SETTINGS.items():
+    os.environ.setdefault(key, value)
+
+# app.custom_logger opens "<date>-log.log" in the working directory on import;
+# let it do so in a throwaway directory, then drop the file handler
+with tempfile.TemporaryDirectory() as log_dir:
+    cwd = os.getcwd()
+    os.chdir(log_dir)
+    try:
+        from app.custom_logger import logger
+    finally:
+        os.chdir(cwd)
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+        handler.close()
+logger.addHandler(logging.NullHandler())
@@ -0,0 +1,57 @@
+import asyncio
+import time
+
+from app.consumers.runtime import ConsumerRuntime
+
+
+def test_stop_waits_for_a_running_callback():
+    runtime = ConsumerRuntime("test", max_in_flight=2).start()
+    finished = []
+
+    async def callback():
+        await asyncio.sleep(0.1)
+        finished.append(True)
+
+    future = runtime.submit(callback())
+    runtime.stop(timeout=5.0)
+
+    assert finished == [True]
+    assert future.done() and not future.cancelled()
+
+
+def test_stop_cancels_callbacks_still_running_after_the_timeout():
+    runtime = ConsumerRuntime("test", max_in_flight=2).start()
+    cancelled = []
+
+    async def callback():
+        try:
+            await asyncio.sleep(30)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    future = runtime.submit(callback())
+    start = time.monotonic()
+    runtime.stop(timeout=0.1)
+
+    assert time.monotonic() - start < 5.0
+    assert cancelled == [True]
+    assert future.cancelled()
+
+
+def test_shutdown_hooks_run_once_no_callback_is_in_flight():
+    runtime = ConsumerRuntime("test", max_in_flight=2).start()
+    in_flight_at_hook = []
+
+    async def hook():
+        in_flight_at_hook.append(runtime.in_flight)
+
+    async def callback():
+        await asyncio.sleep(0.1)
+
+    runtime.add_shutdown_hook(hook)
+    runtime.submit(callback())
+    runtime.submit(callback())
+    runtime.stop(timeout=5.0)
+
+    assert in_flight_at_hook == [0]
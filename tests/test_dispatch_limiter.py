@@ -0,0 +1,84 @@
+import asyncio
+import time
+
+import pytest
+from google.api_core import exceptions as google_exceptions
+
+from app.dispatch_limiter import AimdWindow, DispatchLimiter, TokenBucket
+
+
+class FakeTranscoder:
+    """create_job raises ResourceExhausted for the first ``throttles`` calls, then succeeds."""
+
+    def __init__(self, throttles: int = 0):
+        self.throttles = throttles
+        self.calls = 0
+
+    def create_job(self, parent: str) -> str:
+        self.calls += 1
+        if self.calls <= self.throttles:
+            raise google_exceptions.ResourceExhausted("Quota exceeded for create_job")
+        return f"{parent}/jobs/{self.calls}"
+
+
+def limiter(window: AimdWindow, rate: float = 1000.0, burst: int = 1000, max_retries: int = 3) -> DispatchLimiter:
+    return DispatchLimiter(TokenBucket(rate, burst), window, max_retries=max_retries, backoff=0.0)
+
+
+def test_throttling_halves_the_window_and_successes_grow_it_back():
+    window = AimdWindow(initial=8, minimum=1, maximum=8, cooldown=0.0)
+    transcoder = FakeTranscoder(throttles=1)
+    dispatch = limiter(window)
+
+    async def scenario():
+        await dispatch.call(transcoder.create_job, "parent")
+        halved = window.size
+        for _ in range(30):
+            await dispatch.call(transcoder.create_job, "parent")
+        return halved
+
+    assert asyncio.run(scenario()) == 4
+    assert window.size == 8
+    assert dispatch.stats()["throttled"] == 1
+
+
+def test_throttles_within_the_cooldown_shrink_the_window_once():
+    window = AimdWindow(initial=8, minimum=1, maximum=8, cooldown=60.0)
+    dispatch = limiter(window)
+
+    asyncio.run(dispatch.call(FakeTranscoder(throttles=3).create_job, "parent"))
+    assert window.size == 4
+    assert window.stats()["decreases"] == 1
+
+
+def test_quota_errors_reach_the_caller_once_retries_are_used_up():
+    window = AimdWindow(initial=8, minimum=1, maximum=8, cooldown=0.0)
+    transcoder = FakeTranscoder(throttles=10)
+
+    with pytest.raises(google_exceptions.ResourceExhausted):
+        asyncio.run(limiter(window, max_retries=2).call(transcoder.create_job, "parent"))
+    assert transcoder.calls == 3
+    assert window.size == 1
+
+
+def test_token_bucket_paces_a_burst_beyond_its_size():
+    bucket = TokenBucket(rate=20.0, burst=2)
+    delays = [bucket.reserve() for _ in range(5)]
+
+    assert delays[:2] == [0.0, 0.0]
+    assert delays[2:] == pytest.approx([0.05, 0.10, 0.15], abs=0.01)
+
+
+def test_dispatches_beyond_the_burst_wait_for_tokens():
+    window = AimdWindow(initial=8, minimum=1, maximum=8)
+    transcoder = FakeTranscoder()
+    dispatch = limiter(window, rate=20.0, burst=2)
+
+    async def scenario():
+        start = time.monotonic()
+        await asyncio.gather(*(dispatch.call(transcoder.create_job, "parent") for _ in range(6)))
+        return time.monotonic() - start
+
+    # Two calls go out at once, the other four at 20/s
+    assert asyncio.run(scenario()) >= 0.18
+    assert transcoder.calls == 6
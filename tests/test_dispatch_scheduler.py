@@ -0,0 +1,74 @@
+import asyncio
+
+from app.dispatch_limiter import AimdWindow, DispatchLimiter, TokenBucket
+from app.dispatch_scheduler import BULK, DispatchScheduler, STANDARD
+
+
+def limiter(window: int) -> DispatchLimiter:
+    return DispatchLimiter(TokenBucket(1000.0, 1000), AimdWindow(initial=window, minimum=1, maximum=window))
+
+
+def scheduler(**limiters) -> DispatchScheduler:
+    return DispatchScheduler({STANDARD: (3, 6), BULK: (1, 4)}, max_concurrency=10,
+                             limiters={location: limiter(window) for location, window in limiters.items()})
+
+
+def test_a_saturated_location_does_not_hold_back_other_locations():
+    dispatch = scheduler(**{"asia-south1": 1, "us-central1": 4})
+
+    async def scenario():
+        release = asyncio.Event()
+        granted = []
+
+        async def hold(location: str) -> None:
+            async with dispatch.slot(STANDARD, location):
+                granted.append(location)
+                await release.wait()
+
+        tasks = [asyncio.create_task(hold(location))
+                 for location in ("asia-south1", "asia-south1", "us-central1")]
+        await asyncio.sleep(0.01)
+        before = list(granted)
+        release.set()
+        await asyncio.gather(*tasks)
+        return before, granted
+
+    before, after = asyncio.run(scenario())
+    assert before == ["asia-south1", "us-central1"]
+    assert sorted(after) == ["asia-south1", "asia-south1", "us-central1"]
+
+
+def test_calls_are_paced_by_their_own_location():
+    dispatch = scheduler(**{"asia-south1": 2, "us-central1": 2})
+
+    async def scenario():
+        return await dispatch.run(STANDARD, "us-central1", lambda: "created")
+
+    assert asyncio.run(scenario()) == "created"
+    locations = dispatch.stats()["locations"]
+    assert locations["us-central1"]["calls"] == 1
+    assert locations["asia-south1"]["calls"] == 0
+    assert dispatch.stats()["capacity"] == 4
+
+
+def test_a_bulk_backlog_leaves_headroom_for_the_standard_lane():
+    dispatch = scheduler(**{"asia-south1": 10})
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def hold() -> None:
+            async with dispatch.slot(BULK, "asia-south1"):
+                await release.wait()
+
+        tasks = [asyncio.create_task(hold()) for _ in range(20)]
+        await asyncio.sleep(0.01)
+        headroom = dispatch.lane_headroom(BULK), dispatch.lane_headroom(STANDARD)
+        release.set()
+        await asyncio.gather(*tasks)
+        return headroom
+
+    bulk, standard = asyncio.run(scenario())
+    assert bulk < 0
+    # Standard's weighted share of the 10 slots next to a busy bulk lane (weights 3:1), within its cap of 6
+    assert standard == 6
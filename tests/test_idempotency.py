@@ -0,0 +1,166 @@
+import asyncio
+import json
+
+import pytest
+
+from app import idempotency
+from app.consumers import job_request
+from app.consumers import process_cloud_storage_trigger as trigger
+from app.idempotency import DispatchClaimHeld, DispatchDeduplicator, request_fingerprint
+from app.retries import is_retryable, retry_delay
+from app.schemas import AdocJobRequest
+
+ATTRIBUTES = {"eventType": "OBJECT_FINALIZE"}
+
+
+def notification(generation: str = "1700000000000001") -> str:
+    return json.dumps({"name": "input/toffee/movie/movie.mp4", "bucket": "input-bucket",
+                       "contentType": "video/mp4", "generation": generation})
+
+
+def test_duplicate_storage_notifications_share_a_fingerprint(monkeypatch):
+    monkeypatch.setattr(trigger.time, "time", lambda: 1700000000.0)
+    first = trigger.trigger_job_request(notification(), ATTRIBUTES)
+    monkeypatch.setattr(trigger.time, "time", lambda: 1700000042.0)
+    second = trigger.trigger_job_request(notification(), ATTRIBUTES)
+
+    assert first.custom_name != second.custom_name
+    assert request_fingerprint(first) == request_fingerprint(second)
+
+
+def test_a_new_generation_of_the_input_is_a_new_job():
+    first = trigger.trigger_job_request(notification("1700000000000001"), ATTRIBUTES)
+    reupload = trigger.trigger_job_request(notification("1700000000000002"), ATTRIBUTES)
+
+    assert request_fingerprint(first) != request_fingerprint(reupload)
+
+
+class FakeClaims:
+    """dispatch_claims keyed by fingerprint: {fingerprint: (state, leased_until)}, on a clock set by the test."""
+
+    def __init__(self):
+        self.rows = {}
+        self.calls = 0
+        self.now = 0.0
+
+    async def claim(self, message_id, fingerprint, custom_name, lease_seconds):
+        self.calls += 1
+        state, leased_until = self.rows.get(fingerprint, (None, None))
+        if state == "claimed" and leased_until < self.now:
+            del self.rows[fingerprint]
+        elif state is not None:
+            return state
+        self.rows[fingerprint] = ("claimed", self.now + lease_seconds)
+        return None
+
+    async def mark_dispatched(self, fingerprint):
+        self.rows[fingerprint] = ("dispatched", None)
+
+    async def release(self, fingerprint):
+        if self.rows.get(fingerprint, ("",))[0] == "claimed":
+            del self.rows[fingerprint]
+
+    async def purge(self, retention_hours):
+        return 0
+
+
+@pytest.fixture
+def claims(monkeypatch):
+    store = FakeClaims()
+    monkeypatch.setattr(idempotency, "async_claim_dispatch", store.claim)
+    monkeypatch.setattr(idempotency, "async_mark_dispatched", store.mark_dispatched)
+    monkeypatch.setattr(idempotency, "async_release_dispatch_claim", store.release)
+    monkeypatch.setattr(idempotency, "async_purge_dispatch_claims", store.purge)
+    return store
+
+
+def test_a_lost_claim_is_not_remembered(claims):
+    ours, theirs = DispatchDeduplicator(), DispatchDeduplicator()
+
+    async def scenario():
+        assert await theirs.claim("msg-1", "fp", "job")
+        with pytest.raises(DispatchClaimHeld):
+            await ours.claim("msg-2", "fp", "job")
+        # Their dispatch fails, so the next delivery to us must reach the database and win
+        await theirs.release("msg-1", "fp")
+        return await ours.claim("msg-2", "fp", "job")
+
+    assert asyncio.run(scenario())
+    assert claims.calls == 3
+
+
+def test_only_dispatched_claims_are_skipped_from_memory(claims):
+    dedup = DispatchDeduplicator()
+
+    async def scenario():
+        assert await dedup.claim("msg-1", "fp", "job")
+        await dedup.mark_dispatched("msg-1", "fp")
+        return await dedup.claim("msg-1", "fp", "job")
+
+    assert not asyncio.run(scenario())
+    assert claims.rows == {"fp": ("dispatched", None)}
+    assert claims.calls == 1
+    assert dedup.stats()["skipped_memory"] == 1
+
+
+def job_request_message(custom_name: str) -> AdocJobRequest:
+    return AdocJobRequest(content_id="movie", provider_id="provider", package_id="movie",
+                          input_uri="gs://input-bucket/input/movie.mp4", output_uri="gs://output-bucket/movie/",
+                          custom_name=custom_name, created_by="cms", description="Movie",
+                          image_uri="gs://input-bucket/images/logo.png", video_quality=[360, 1080],
+                          audio_quality=[64], drm_type=["both"], manifast_type=["dash", "hls"])
+
+
+@pytest.fixture
+def dispatched(claims, monkeypatch):
+    names = []
+
+    async def dispatch_job_request(request, clients):
+        names.append(request.custom_name)
+
+    monkeypatch.setattr(job_request, "dispatch_deduplicator", DispatchDeduplicator())
+    monkeypatch.setattr(job_request, "dispatch_job_request", dispatch_job_request)
+    return names
+
+
+def test_job_requests_naming_different_jobs_both_dispatch(dispatched):
+    async def scenario():
+        await job_request.process_job_request(job_request_message("movie_1080p"), None, "job_request:1")
+        await job_request.process_job_request(job_request_message("movie_rerun"), None, "job_request:2")
+
+    asyncio.run(scenario())
+    assert dispatched == ["movie_1080p", "movie_rerun"]
+
+
+def test_a_redelivery_after_a_crash_mid_dispatch_is_retried_not_dropped(dispatched, claims):
+    crashed = DispatchDeduplicator(lease_seconds=900.0)
+    request = job_request_message("movie_1080p")
+
+    async def scenario():
+        # The first worker claims the request and dies before dispatching or releasing it
+        assert await crashed.claim("job_request:1", request_fingerprint(request), request.custom_name)
+        # Pub/Sub redelivers well within the lease: the message must come back, not be acked as a duplicate
+        with pytest.raises(DispatchClaimHeld) as held:
+            await job_request.process_job_request(request, None, "job_request:1")
+        assert is_retryable(held.value)
+        assert retry_delay(held.value, 1) >= 900.0
+        # By the time the retry runs the lease has run out, so the claim is taken over
+        claims.now += retry_delay(held.value, 1) + 1
+        await job_request.process_job_request(request, None, "job_request:1")
+
+    asyncio.run(scenario())
+    assert dispatched == ["movie_1080p"]
+    assert claims.rows[request_fingerprint(request)] == ("dispatched", None)
+
+
+def test_a_redelivery_of_a_dispatched_request_is_skipped(dispatched, monkeypatch):
+    request = job_request_message("movie_1080p")
+
+    async def scenario():
+        await job_request.process_job_request(request, None, "job_request:1")
+        # Redelivered to another worker, which only has the database to go by
+        monkeypatch.setattr(job_request, "dispatch_deduplicator", DispatchDeduplicator())
+        await job_request.process_job_request(request, None, "job_request:1")
+
+    asyncio.run(scenario())
+    assert dispatched == ["movie_1080p"]
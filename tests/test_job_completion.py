@@ -0,0 +1,66 @@
+import asyncio
+import datetime
+from types import SimpleNamespace
+
+from google.cloud.video import transcoder_v1
+
+from app.consumers import job_completion
+
+PARENT = "projects/test-project/locations/asia-south1"
+
+
+def job(name: str, seconds: float) -> transcoder_v1.types.Job:
+    resource = transcoder_v1.types.Job(name=f"{PARENT}/jobs/{name}")
+    resource.config.edit_list.append(
+        transcoder_v1.types.EditAtom(key="atom", end_time_offset=datetime.timedelta(seconds=seconds)))
+    return resource
+
+
+class FakeTranscoder:
+    """Serves ListJobs from ``recent`` (newest first) and GetJob from ``recent`` plus ``older``."""
+
+    def __init__(self, recent, older=()):
+        self.recent = list(recent)
+        self.jobs = {resource.name: resource for resource in [*self.recent, *older]}
+        self.list_calls = []
+        self.get_calls = []
+
+    def list_jobs(self, request):
+        self.list_calls.append(request["parent"])
+        return iter(self.recent[:request["page_size"]])
+
+    def get_job(self, name):
+        self.get_calls.append(name)
+        return self.jobs[name]
+
+
+def lookup(transcoder: FakeTranscoder, monkeypatch, completions):
+    async def names_missing_duration(names):
+        return list(names)
+
+    monkeypatch.setattr(job_completion, "async_get_names_missing_duration", names_missing_duration)
+    return asyncio.run(job_completion.lookup_missing_durations(SimpleNamespace(transcoder=transcoder), completions))
+
+
+def test_missing_durations_are_listed_once_per_location(monkeypatch):
+    transcoder = FakeTranscoder([job(f"j{i}", 10.0 + i) for i in range(5)])
+    completions = [(f"{PARENT}/jobs/j{i}", "SUCCEEDED", None) for i in range(5)]
+
+    result = lookup(transcoder, monkeypatch, completions)
+
+    assert [duration for _, _, duration in result] == [10.0, 11.0, 12.0, 13.0, 14.0]
+    assert transcoder.list_calls == [PARENT]
+    assert transcoder.get_calls == []
+
+
+def test_jobs_older_than_the_listed_page_fall_back_to_get_job(monkeypatch):
+    monkeypatch.setattr(job_completion.settings, "DURATION_LIST_PAGE_SIZE", 2)
+    transcoder = FakeTranscoder([job("new", 1.0), job("newer", 2.0)], older=[job("old", 3.0)])
+    completions = [(f"{PARENT}/jobs/new", "SUCCEEDED", None),
+                   (f"{PARENT}/jobs/old", "FAILED", None),
+                   (f"{PARENT}/jobs/known", "SUCCEEDED", 7.0)]
+
+    result = lookup(transcoder, monkeypatch, completions)
+
+    assert [duration for _, _, duration in result] == [1.0, 3.0, 7.0]
+    assert transcoder.get_calls == [f"{PARENT}/jobs/old"]
@@ -0,0 +1,163 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from app import utils
+from app.exceptions import CustomException
+from app.key_server import KeyResponseCache, KeyServerClient
+
+KEYS = [{"keyId": "k1", "key": "secret"}]
+
+
+class StubKeyServer:
+    """Answers key requests like the key server, counting calls; ``statuses`` are replied in order."""
+
+    def __init__(self, statuses=(201,), delay: float = 0.0):
+        self.statuses = list(statuses)
+        self.delay = delay
+        self.calls = 0
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        self.calls += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        status = self.statuses.pop(0) if len(self.statuses) > 1 else self.statuses[0]
+        if status == 201:
+            return httpx.Response(201, json={"data": {"keys": KEYS}})
+        return httpx.Response(status, text="key server error")
+
+
+@pytest.fixture
+def key_server(monkeypatch):
+    def install(stub: StubKeyServer, ttl: float = 300) -> KeyResponseCache:
+        client = KeyServerClient("http://key-server.test", max_retries=0,
+                                 transport=httpx.MockTransport(stub.handle))
+        cache = KeyResponseCache(maxsize=16, ttl=ttl)
+        monkeypatch.setattr(utils, "key_server_client", client)
+        monkeypatch.setattr(utils, "key_response_cache", cache)
+        return cache
+
+    return install
+
+
+def call_key_server(package_id: str = "pkg"):
+    return utils.call_key_server(package_id, "content", "provider", [360, 1080], [64], ["both"])
+
+
+def test_identical_requests_within_ttl_hit_the_key_server_once(key_server):
+    stub = StubKeyServer()
+    cache = key_server(stub)
+
+    async def scenario():
+        first = await call_key_server()
+        second = await call_key_server()
+        return first, second
+
+    assert asyncio.run(scenario()) == (KEYS, KEYS)
+    assert stub.calls == 1
+    assert cache.stats()["hits"] == 1
+
+
+def test_entries_expire_after_ttl(key_server):
+    stub = StubKeyServer()
+    key_server(stub, ttl=0.05)
+
+    async def scenario():
+        await call_key_server()
+        await asyncio.sleep(0.1)
+        await call_key_server()
+
+    asyncio.run(scenario())
+    assert stub.calls == 2
+
+
+def test_concurrent_identical_requests_share_one_fetch(key_server):
+    stub = StubKeyServer(delay=0.05)
+    cache = key_server(stub)
+
+    async def scenario():
+        return await asyncio.gather(*(call_key_server() for _ in range(5)))
+
+    assert asyncio.run(scenario()) == [KEYS] * 5
+    assert stub.calls == 1
+    assert cache.stats()["coalesced"] == 4
+
+
+def test_different_requests_are_fetched_separately(key_server):
+    stub = StubKeyServer()
+    key_server(stub)
+
+    async def scenario():
+        await asyncio.gather(call_key_server("pkg-a"), call_key_server("pkg-b"))
+
+    asyncio.run(scenario())
+    assert stub.calls == 2
+
+
+def test_failed_fetch_is_not_cached(key_server):
+    stub = StubKeyServer(statuses=(503, 201))
+    cache = key_server(stub)
+
+    async def scenario():
+        with pytest.raises(CustomException) as failure:
+            await call_key_server()
+        assert failure.value.code == 503
+        return await call_key_server()
+
+    assert asyncio.run(scenario()) == KEYS
+    assert stub.calls == 2
+    assert cache.stats()["size"] == 1
+
+
+def test_failed_fetch_reaches_every_coalesced_caller(key_server):
+    stub = StubKeyServer(statuses=(404,), delay=0.05)
+    key_server(stub)
+
+    async def scenario():
+        return await asyncio.gather(*(call_key_server() for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(result, CustomException) and result.code == 404 for result in results)
+    assert stub.calls == 1
+
+
+def test_cancelled_caller_does_not_cancel_the_shared_fetch(key_server):
+    stub = StubKeyServer(delay=0.05)
+    key_server(stub)
+
+    async def scenario():
+        owner = asyncio.create_task(call_key_server())
+        await asyncio.sleep(0.01)
+        waiter = asyncio.create_task(call_key_server())
+        await asyncio.sleep(0.01)
+        owner.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await owner
+        return await waiter
+
+    assert asyncio.run(scenario()) == KEYS
+    assert stub.calls == 1
+
+
+def test_waiters_fetch_again_when_the_shared_fetch_is_cancelled():
+    cache = KeyResponseCache(maxsize=16, ttl=300)
+    key = ("pkg", "content", "provider", ("360",), ("64",))
+    fetches = []
+
+    async def fetch():
+        fetches.append(time.monotonic())
+        await asyncio.sleep(0.05)
+        if len(fetches) == 1:
+            raise asyncio.CancelledError()
+        return KEYS
+
+    async def scenario():
+        return await asyncio.gather(cache.get_or_fetch(key, fetch), cache.get_or_fetch(key, fetch),
+                                    return_exceptions=True)
+
+    owner, waiter = asyncio.run(scenario())
+    assert isinstance(owner, asyncio.CancelledError)
+    assert waiter == KEYS
+    assert len(fetches) == 2